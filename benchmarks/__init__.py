@@ -0,0 +1 @@
+# benchmarks and synthetic load, not imported by the bot
@@ -0,0 +1,73 @@
+"""
+Run the history backfill against fake channels and a throwaway database.
+
+    python -m benchmarks.backfill [--channels 8] [--messages 3000] [--rate 20]
+
+Half of each channel's history is stored up front (as if the bot went
+down halfway), then the backfill has to fill in the rest. Checks that
+every message ends up stored exactly once and prints the run's numbers.
+"""
+
+import argparse
+import asyncio
+import time
+from benchmarks.harness import scratch_database, emit
+
+scratch_database('backfill')
+
+from benchmarks.synthetic import FakeChannel  # noqa: E402
+from db import aio  # noqa: E402
+from db.backfill import HistoryBackfiller  # noqa: E402
+from db.database import init_db, get_message_count  # noqa: E402
+from db.ingest import message_row  # noqa: E402
+
+
+async def run(args) -> dict:
+    init_db()
+    start_ms = int(time.time() * 1000) - args.messages * 2000
+    channels = [FakeChannel(100 + i, args.messages, latency=args.latency, start_ms=start_ms)
+                for i in range(args.channels)]
+
+    # pretend we were online for the first half
+    for channel in channels:
+        await aio.store_messages([message_row(m) for m in channel.messages[:args.messages // 2]])
+
+    backfiller = HistoryBackfiller(concurrency=args.concurrency, rate=args.rate, burst=args.rate,
+                                   max_messages=args.messages,
+                                   lookback_hours=args.messages * 2 // 3600 + 1)
+    await backfiller.snapshot()
+    started = time.perf_counter()
+    summary = await backfiller.backfill_channels(channels)
+    seconds = time.perf_counter() - started
+
+    missing = sum(args.messages - get_message_count(1, c.id) for c in channels)
+    await aio.shutdown()
+    return {
+        **summary,
+        'pages': backfiller.stats['pages'],
+        'seconds': round(seconds, 2),
+        'pages_per_sec': round(backfiller.stats['pages'] / seconds, 1),
+        'stored_per_sec': round(summary['stored'] / seconds),
+        'rate_limited_seconds': round(backfiller.limiter.waited, 2),
+        'missing': missing,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--channels', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=3000, help="history per channel")
+    parser.add_argument('--concurrency', type=int, default=3)
+    parser.add_argument('--rate', type=float, default=20, help="page requests per second")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per history() call")
+    parser.add_argument('--output', help="write the JSON result here instead of printing it")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    emit(result, args.output)
+    if result['missing']:
+        raise SystemExit(f"{result['missing']} message(s) were not backfilled")
+
+
+if __name__ == "__main__":
+    main()
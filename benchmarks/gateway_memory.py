@@ -0,0 +1,161 @@
+"""
+RSS of the bot's discord.py state under each gateway profile.
+
+    python -m benchmarks.gateway_memory [--guilds 100 1000] [--messages 20000]
+
+For every (profile, guild count) pair a fresh child process builds
+commands.Bot with that profile's options, feeds its connection state
+synthetic GUILD_CREATE payloads and MESSAGE_CREATE events (no network),
+and reports resident memory before and after. This drives discord.py
+internals (ConnectionState), so expect to touch it up across major
+discord.py releases.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+
+os.environ.setdefault('DISCORD_TOKEN', 'benchmark')
+
+CHANNELS_PER_GUILD = 20
+ROLES_PER_GUILD = 15
+MEMBERS_PER_GUILD = 50
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux), falls back to peak RSS elsewhere"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def user_payload(user_id: int) -> dict:
+    return {'id': str(user_id), 'username': f"user{user_id}", 'discriminator': '0',
+            'global_name': f"User {user_id}", 'avatar': None}
+
+
+def guild_payload(guild_id: int) -> dict:
+    base = guild_id * 10000
+    return {
+        'id': str(guild_id),
+        'name': f"guild {guild_id}",
+        'owner_id': str(base + 1),
+        'member_count': MEMBERS_PER_GUILD,
+        'large': False,
+        'features': [],
+        'roles': [{'id': str(guild_id if i == 0 else base + 100 + i), 'name': f"role{i}", 'color': 0,
+                   'hoist': False, 'position': i, 'permissions': '0', 'managed': False,
+                   'mentionable': False} for i in range(ROLES_PER_GUILD)],
+        'channels': [{'id': str(base + 1000 + i), 'type': 0, 'name': f"channel-{i}", 'position': i,
+                      'guild_id': str(guild_id), 'permission_overwrites': [], 'nsfw': False,
+                      'parent_id': None, 'topic': "synthetic channel", 'rate_limit_per_user': 0,
+                      'last_message_id': None} for i in range(CHANNELS_PER_GUILD)],
+        'members': [{'user': user_payload(base + 5000 + i), 'roles': [], 'joined_at': TIMESTAMP,
+                     'deaf': False, 'mute': False} for i in range(MEMBERS_PER_GUILD)],
+        'emojis': [],
+        'stickers': [],
+        'threads': [],
+        'voice_states': [],
+        'presences': [],
+    }
+
+
+def message_payload(message_id: int, guild_id: int) -> dict:
+    base = guild_id * 10000
+    author = base + 5000 + message_id % MEMBERS_PER_GUILD
+    return {
+        'id': str(message_id),
+        'channel_id': str(base + 1000 + message_id % CHANNELS_PER_GUILD),
+        'guild_id': str(guild_id),
+        'author': user_payload(author),
+        'member': {'roles': [], 'joined_at': TIMESTAMP, 'deaf': False, 'mute': False},
+        'content': f"synthetic message {message_id} " + "lorem ipsum " * 8,
+        'timestamp': TIMESTAMP,
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': [],
+        'pinned': False,
+        'type': 0,
+    }
+
+
+async def measure(profile: str, guilds: int, messages: int) -> dict:
+    """Runs in the child process"""
+    from discord.ext import commands
+    from utils.gateway import gateway_options
+
+    gc.collect()
+    before = rss_bytes()
+    bot = commands.Bot(command_prefix='!', **gateway_options(profile))
+    state = bot._connection
+    for guild_id in range(1, guilds + 1):
+        state._add_guild_from_data(guild_payload(guild_id))
+    after_guilds = rss_bytes()
+
+    for i in range(messages):
+        state.parse_message_create(message_payload(10**12 + i, i % guilds + 1))
+        if i % 1000 == 0:
+            # let the dispatched on_message tasks finish
+            await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    gc.collect()
+    after = rss_bytes()
+
+    return {
+        'profile': profile,
+        'guilds': guilds,
+        'messages': messages,
+        'cached_messages': len(state._messages) if state._messages is not None else 0,
+        'rss_mib': round(after / 1048576, 1),
+        'guilds_mib': round((after_guilds - before) / 1048576, 1),
+        'messages_mib': round((after - after_guilds) / 1048576, 1),
+        'kib_per_guild': round((after - before) / guilds / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--guilds', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--profiles', nargs='+', default=['default', 'lean'])
+    parser.add_argument('--child', nargs=3, metavar=('PROFILE', 'GUILDS', 'MESSAGES'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        profile, guilds, messages = args.child
+        print(json.dumps(asyncio.run(measure(profile, int(guilds), int(messages)))))
+        return
+
+    results = []
+    for guilds in args.guilds:
+        for profile in args.profiles:
+            # a fresh interpreter per run so earlier runs don't inflate RSS
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.gateway_memory', '--child',
+                                  profile, str(guilds), str(args.messages)],
+                                 capture_output=True, text=True, check=True)
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            print(json.dumps(results[-1]))
+
+    for guilds in args.guilds:
+        rows = {r['profile']: r for r in results if r['guilds'] == guilds}
+        if 'default' in rows and 'lean' in rows:
+            saved = rows['default']['rss_mib'] - rows['lean']['rss_mib']
+            print(f"{guilds} guilds: lean saves {saved:.1f} MiB "
+                  f"({rows['default']['kib_per_guild']} -> {rows['lean']['kib_per_guild']} KiB/guild)")
+
+
+if __name__ == "__main__":
+    main()
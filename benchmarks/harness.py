@@ -0,0 +1,52 @@
+"""
+Shared bits for the benchmark scripts: a throwaway database, latency
+percentiles and JSON output. Nothing here imports config or db, so
+scratch_database() can run before they are first imported.
+"""
+
+import json
+import os
+import statistics
+import tempfile
+
+
+def scratch_database(prefix: str) -> str:
+    """Point DATABASE_URL at a fresh temp file (call before importing anything from db/)"""
+    folder = tempfile.mkdtemp(prefix=f"{prefix}-bench-")
+    path = os.path.join(folder, 'bench.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    os.environ.setdefault('DISCORD_TOKEN', 'benchmark')
+    return path
+
+
+def percentile(sorted_samples: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return None
+    rank = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+def latency_summary(seconds: list) -> dict:
+    """count / mean / p50 / p90 / p99 / max in milliseconds"""
+    samples = sorted(seconds)
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p90_ms': round(percentile(samples, 90) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def emit(result: dict, output: str = None):
+    """Write the result to `output` as JSON, or print it"""
+    text = json.dumps(result, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,129 @@
+"""
+Ingestion throughput and latency on synthetic firehose traffic.
+
+    python -m benchmarks.ingest [--messages 20000] [--rate 0] [--guilds 10]
+
+Two runs over the same kind of traffic, in separate guilds:
+
+- store_message: one insert + commit per message, inline, the way
+  messages were stored before the write-behind queue.
+- on_message: the firehose goes through bot.on_message, so the monitored
+  channel check and the ingest queue are included. Throughput counts until
+  the queue is drained and every row is committed.
+"""
+
+import argparse
+import asyncio
+import time
+from benchmarks.harness import scratch_database, latency_summary, emit
+
+scratch_database('ingest')
+
+from benchmarks.synthetic import firehose, firehose_channels  # noqa: E402
+from db import aio, database  # noqa: E402
+from db.ingest import message_row  # noqa: E402
+
+
+def traffic(args, first_guild: int, **extra) -> dict:
+    return dict(guilds=args.guilds, channels_per_guild=args.channels, first_guild=first_guild,
+                long_ratio=args.long_ratio, reply_ratio=args.reply_ratio, **extra)
+
+
+def stored(args, first_guild: int) -> int:
+    return sum(database.get_message_count(c.guild.id, c.id)
+               for c in firehose_channels(args.guilds, args.channels, first_guild))
+
+
+async def run_store_message(args) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    async for message in firehose(args.store_messages, **traffic(args, 1)):
+        call = time.perf_counter()
+        database.store_message(**message_row(message))
+        latencies.append(time.perf_counter() - call)
+    seconds = time.perf_counter() - started
+    return {
+        'messages': args.store_messages,
+        'stored': stored(args, 1),
+        'seconds': round(seconds, 3),
+        'messages_per_sec': round(args.store_messages / seconds),
+        'latency': latency_summary(latencies),
+    }
+
+
+async def run_on_message(args) -> dict:
+    import bot  # the real handler, registry and ingestor
+
+    for channel in firehose_channels(args.guilds, args.channels, 100):
+        database.add_monitored_channel(channel.guild.id, channel.id, channel.name, 1, 'benchmark')
+
+    # time each batch write as well as each on_message call
+    flushes = []
+    flush = bot.ingestor._flush
+
+    async def timed_flush(batch):
+        started = time.perf_counter()
+        await flush(batch)
+        flushes.append(time.perf_counter() - started)
+
+    bot.ingestor._flush = timed_flush
+    bot.ingestor.start()
+
+    latencies, lag = [], []
+    started = time.perf_counter()
+    async for message in firehose(args.messages, **traffic(args, 100, rate=args.rate, lag=lag)):
+        call = time.perf_counter()
+        await bot.on_message(message)
+        latencies.append(time.perf_counter() - call)
+    produced = time.perf_counter() - started
+    await bot.ingestor.close()
+    seconds = time.perf_counter() - started
+
+    return {
+        'messages': args.messages,
+        'stored': stored(args, 100),
+        'target_rate': args.rate,
+        'offered_per_sec': round(args.messages / produced),
+        'seconds': round(seconds, 3),
+        'messages_per_sec': round(args.messages / seconds),
+        'latency': latency_summary(latencies),
+        'flush_latency': latency_summary(flushes),
+        'schedule_lag': latency_summary(lag) if args.rate else None,
+        'ingestor': dict(bot.ingestor.stats),
+    }
+
+
+async def run(args) -> dict:
+    database.init_db()
+    database.load_monitored_channels()
+    try:
+        return {
+            'store_message': await run_store_message(args),
+            'on_message': await run_on_message(args),
+        }
+    finally:
+        await aio.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--messages', type=int, default=20000, help="messages through on_message")
+    parser.add_argument('--store-messages', type=int, default=2000,
+                        help="messages through inline store_message (slow, one commit each)")
+    parser.add_argument('--rate', type=float, default=0, help="messages per second, 0 = as fast as possible")
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--channels', type=int, default=5, help="channels per guild")
+    parser.add_argument('--long-ratio', type=float, default=0.1, help="fraction of long messages")
+    parser.add_argument('--reply-ratio', type=float, default=0.15, help="fraction of replies")
+    parser.add_argument('--output', help="write the JSON result here instead of printing it")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    emit({'args': vars(args), **result}, args.output)
+    missing = result['on_message']['messages'] - result['on_message']['stored']
+    if missing:
+        raise SystemExit(f"{missing} message(s) from on_message were not stored")
+
+
+if __name__ == "__main__":
+    main()
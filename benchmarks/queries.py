@@ -0,0 +1,102 @@
+"""
+Read query latency as the database grows.
+
+    python -m benchmarks.queries [--sizes 10000,100000,1000000,10000000]
+
+Fills one database through store_messages up to each size in turn
+(messages spread evenly over the last --days days and --channels
+channels), and at every size times get_messages_by_timeframe,
+get_message_stats and get_message_count on random channels.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from benchmarks.harness import scratch_database, latency_summary, emit
+
+DB_PATH = scratch_database('queries')
+
+from benchmarks.synthetic import make_messages  # noqa: E402
+from db import database  # noqa: E402
+
+BATCH = 5000
+GUILD_ID = 1
+
+
+def fill(start: int, end: int, total: int, args, now_ms: int):
+    """Insert messages start..end of a total-message timeline ending at now_ms"""
+    interval_ms = max(1, args.days * 86400000 // total)
+    first_ms = now_ms - total * interval_ms
+    for offset in range(start, end, BATCH):
+        count = min(BATCH, end - offset)
+        # same ids/timestamps no matter how the timeline is cut into batches
+        database.store_messages(make_messages(
+            count, guild_id=GUILD_ID, channels=args.channels, start_ms=first_ms + offset * interval_ms,
+            interval_ms=interval_ms, long_ratio=args.long_ratio, seed=offset))
+
+
+def time_query(call, args, rng: random.Random) -> dict:
+    samples = []
+    for _ in range(args.repeat):
+        channel_id = 100 + rng.randrange(args.channels)
+        started = time.perf_counter()
+        call(channel_id)
+        samples.append(time.perf_counter() - started)
+    return latency_summary(samples)
+
+
+def measure(args) -> dict:
+    rng = random.Random(0)
+    queries = {
+        'get_message_count': lambda c: database.get_message_count(GUILD_ID, c),
+        'get_message_stats': lambda c: database.get_message_stats(GUILD_ID, c),
+        'get_message_stats_24h': lambda c: database.get_message_stats(GUILD_ID, c, 24),
+        'get_messages_by_timeframe_1h': lambda c: database.get_messages_by_timeframe(GUILD_ID, c, 1),
+        'get_messages_by_timeframe_24h': lambda c: database.get_messages_by_timeframe(GUILD_ID, c, 24),
+    }
+    return {name: time_query(call, args, rng) for name, call in queries.items()}
+
+
+def run(args) -> list:
+    database.init_db()
+    sizes = sorted(args.sizes)
+    # one timeline sized for the biggest run, filled from its newest end
+    # so every checkpoint has the same recent traffic per hour
+    total = sizes[-1]
+    now_ms = int(time.time() * 1000)
+    results = []
+    filled = 0
+    for size in sizes:
+        started = time.perf_counter()
+        fill(total - size, total - filled, total, args, now_ms)
+        fill_seconds = time.perf_counter() - started
+        filled = size
+        results.append({
+            'rows': size,
+            'db_bytes': sum(os.path.getsize(p) for p in (DB_PATH, DB_PATH + '-wal') if os.path.exists(p)),
+            'fill_seconds': round(fill_seconds, 2),
+            'queries': measure(args),
+        })
+        print(f"{size} rows: filled in {fill_seconds:.1f}s", file=sys.stderr)
+    database.close_db()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',')],
+                        default=[10000, 100000, 1000000, 10000000])
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30, help="how far back the messages go")
+    parser.add_argument('--repeat', type=int, default=50, help="timed calls per query and size")
+    parser.add_argument('--long-ratio', type=float, default=0.1, help="fraction of long messages")
+    parser.add_argument('--output', help="write the JSON result here instead of printing it")
+    args = parser.parse_args()
+
+    emit({'args': vars(args), 'sizes': run(args)}, args.output)
+
+
+if __name__ == "__main__":
+    main()
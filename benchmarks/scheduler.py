@@ -0,0 +1,107 @@
+"""
+Fairness of the summary scheduler with one guild flooding it.
+
+    python -m benchmarks.scheduler [--noisy 40] [--quiet 8] [--concurrency 4] [--model-latency 0.5]
+
+One guild asks for --noisy summaries at once, then --quiet other guilds
+ask for one each. Every generation is a stub model call that takes
+--model-latency seconds (plus up to --model-jitter). The same load runs
+through a plain FIFO queue (one shared guild) and the fair scheduler, so
+the numbers show how long the quiet guilds wait behind the flood, and a
+last phase turns the per-guild quota on to see how much of the flood
+gets refused.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from benchmarks.harness import scratch_database, latency_summary, emit
+
+# nothing is stored, but importing config needs the environment set up
+scratch_database('scheduler')
+
+from summarizer.scheduler import SummaryScheduler, QuotaExceeded  # noqa: E402
+
+
+class StubModel:
+    """Stands in for a Gemini call, takes latency plus random jitter seconds"""
+
+    def __init__(self, latency: float, jitter: float, seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    async def generate(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+
+
+async def request(scheduler, model, guild_id: int, queue_guild: int, positions: list) -> tuple:
+    """One summary request, returns (guild_id, seconds until done or None if refused)"""
+    started = time.perf_counter()
+
+    async def on_position(position: int):
+        positions.append(position)
+
+    try:
+        await scheduler.run(queue_guild, model.generate, on_position=on_position)
+    except QuotaExceeded:
+        return guild_id, None
+    return guild_id, time.perf_counter() - started
+
+
+async def phase(args, fair: bool, per_hour: float = 0) -> dict:
+    scheduler = SummaryScheduler(args.concurrency, per_hour, args.burst)
+    model = StubModel(args.model_latency, args.model_jitter)
+    positions = []
+    started = time.perf_counter()
+    # FIFO = everyone in the same guild as far as the scheduler can tell
+    tasks = [asyncio.create_task(request(scheduler, model, 0, 0, positions))
+             for _ in range(args.noisy)]
+    await asyncio.sleep(args.quiet_delay)
+    tasks += [asyncio.create_task(request(scheduler, model, guild_id, guild_id if fair else 0, positions))
+              for guild_id in range(1, args.quiet + 1)]
+    results = await asyncio.gather(*tasks)
+
+    noisy = [seconds for guild_id, seconds in results if guild_id == 0 and seconds is not None]
+    quiet = [seconds for guild_id, seconds in results if guild_id != 0 and seconds is not None]
+    return {
+        'quiet': latency_summary(quiet),
+        'noisy': latency_summary(noisy),
+        'refused': sum(1 for _, seconds in results if seconds is None),
+        'max_position': max(positions, default=0),
+        'model_calls': model.calls,
+        'wall_seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+async def run(args) -> dict:
+    return {
+        'phases': {
+            'fifo': await phase(args, fair=False),
+            'fair': await phase(args, fair=True),
+            'fair_quota': await phase(args, fair=True, per_hour=args.per_hour),
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--noisy', type=int, default=40, help="requests from the flooding guild")
+    parser.add_argument('--quiet', type=int, default=8, help="other guilds, one request each")
+    parser.add_argument('--quiet-delay', type=float, default=0.05, help="seconds after the flood they arrive")
+    parser.add_argument('--concurrency', type=int, default=4, help="generations at once")
+    parser.add_argument('--per-hour', type=float, default=30, help="per-guild quota in the last phase")
+    parser.add_argument('--burst', type=int, default=5, help="per-guild burst in the last phase")
+    parser.add_argument('--model-latency', type=float, default=0.5, help="stub model call time, seconds")
+    parser.add_argument('--model-jitter', type=float, default=0.1, help="extra random seconds per call")
+    parser.add_argument('--output', help="write the JSON result here instead of printing it")
+    args = parser.parse_args()
+
+    emit({'args': vars(args), **asyncio.run(run(args))}, args.output)
+
+
+if __name__ == "__main__":
+    main()
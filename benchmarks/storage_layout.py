@@ -0,0 +1,120 @@
+"""
+Compare the legacy stored_messages layout (schema v5: author_name and
+timestamp text on every row, plain content) against the compact one
+(v6: interned authors, compressed content, no timestamp text).
+
+    python -m benchmarks.storage_layout [--messages 200000]
+
+Prints file size per message and insert/read throughput for both.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from db.codec import encode_content, decode_content
+from db.migrations import migrate, to_epoch_ms
+from benchmarks.synthetic import make_messages
+
+BATCH = 500
+
+
+def insert_legacy(conn: sqlite3.Connection, batch: list):
+    conn.executemany('''
+        INSERT OR IGNORE INTO stored_messages
+        (guild_id, channel_id, message_id, author_id, author_name,
+         content, timestamp, ts, has_attachments, reply_to)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(m['guild_id'], m['channel_id'], m['message_id'], m['author_id'], m['author_name'],
+           m['content'], str(m['timestamp']), to_epoch_ms(m['timestamp']),
+           m['has_attachments'], m['reply_to']) for m in batch])
+
+
+def insert_compact(conn: sqlite3.Connection, batch: list):
+    conn.executemany('''
+        INSERT INTO authors (author_id, author_name, last_message_id)
+        VALUES (?, ?, ?)
+        ON CONFLICT(author_id) DO UPDATE SET
+            author_name = excluded.author_name,
+            last_message_id = excluded.last_message_id
+        WHERE excluded.last_message_id > authors.last_message_id
+    ''', [(m['author_id'], m['author_name'], m['message_id']) for m in batch])
+    rows = []
+    for m in batch:
+        content, codec = encode_content(m['content'])
+        rows.append((m['channel_id'], m['message_id'], m['guild_id'], m['author_id'], content,
+                     codec, to_epoch_ms(m['timestamp']), m['has_attachments'], m['reply_to']))
+    conn.executemany('''
+        INSERT OR IGNORE INTO stored_messages
+        (channel_id, message_id, guild_id, author_id, content, content_codec,
+         ts, has_attachments, reply_to)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def read_legacy(conn: sqlite3.Connection, channel_id: int) -> int:
+    rows = conn.execute('''
+        SELECT author_name, content, timestamp FROM stored_messages
+        WHERE channel_id = ? ORDER BY message_id
+    ''', (channel_id,)).fetchall()
+    return sum(len(r[1]) for r in rows)
+
+
+def read_compact(conn: sqlite3.Connection, channel_id: int) -> int:
+    rows = conn.execute('''
+        SELECT COALESCE(a.author_name, CAST(m.author_id AS TEXT)), m.content, m.content_codec, m.ts
+        FROM stored_messages m LEFT JOIN authors a ON a.author_id = m.author_id
+        WHERE m.channel_id = ? ORDER BY m.message_id
+    ''', (channel_id,)).fetchall()
+    return sum(len(decode_content(r[1], r[2])) for r in rows)
+
+
+def run(layout: str, messages: list, folder: str) -> dict:
+    path = os.path.join(folder, f"{layout}.db")
+    conn = sqlite3.connect(path)
+    migrate(conn, target=5 if layout == 'legacy' else 6)
+    insert = insert_legacy if layout == 'legacy' else insert_compact
+    read = read_legacy if layout == 'legacy' else read_compact
+
+    started = time.perf_counter()
+    for i in range(0, len(messages), BATCH):
+        insert(conn, messages[i:i + BATCH])
+        conn.commit()
+    insert_seconds = time.perf_counter() - started
+
+    conn.execute('VACUUM')
+    channels = sorted({m['channel_id'] for m in messages})
+    started = time.perf_counter()
+    for channel_id in channels:
+        read(conn, channel_id)
+    read_seconds = time.perf_counter() - started
+    conn.close()
+
+    size = os.path.getsize(path)
+    return {
+        'layout': layout,
+        'bytes': size,
+        'bytes_per_message': round(size / len(messages), 1),
+        'insert_per_sec': round(len(messages) / insert_seconds),
+        'read_per_sec': round(len(messages) / read_seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--long-ratio', type=float, default=0.1,
+                        help="fraction of long (compressible) messages")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, long_ratio=args.long_ratio)
+    with tempfile.TemporaryDirectory() as folder:
+        results = [run('legacy', messages, folder), run('compact', messages, folder)]
+    print(json.dumps(results, indent=2))
+    print(f"compact/legacy size: {results[1]['bytes'] / results[0]['bytes']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Run the benchmark suite and save one JSON file per run.
+
+    python -m benchmarks.suite [--only ingest,queries] [--quick] [--output bench.json]
+    python -m benchmarks.suite --compare old.json new.json
+
+Each benchmark runs in its own process with its own scratch database.
+The result file also records the commit, Python and SQLite versions and
+the machine, and --compare prints how every timing moved between two
+result files.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# benchmark modules, with the arguments that shrink them for --quick
+SUITES = {
+    'ingest': ['--messages', '5000', '--store-messages', '500'],
+    'queries': ['--sizes', '10000,100000', '--repeat', '20'],
+    'summarize': ['--messages', '1000', '--model-latency', '0.05', '--model-output-seconds', '0.2'],
+    'backfill': ['--channels', '4', '--messages', '1000', '--latency', '0'],
+    'scheduler': ['--noisy', '20', '--quiet', '4', '--model-latency', '0.05', '--model-jitter', '0.01'],
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(name: str, quick: bool) -> dict:
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, f"{name}.json")
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-m', f'benchmarks.{name}', *(SUITES[name] if quick else []),
+                        '--output', output], cwd=ROOT, check=True)
+        with open(output) as f:
+            result = json.load(f)
+    result['wall_seconds'] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def flatten(value, prefix: str = '') -> dict:
+    """Nested result -> {'a.b.c': number}"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        # lists of per-size results are keyed by their row count
+        items = ((str(v.get('rows', i)) if isinstance(v, dict) else str(i), v) for i, v in enumerate(value))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    else:
+        return {}
+    flat = {}
+    for key, child in items:
+        if key == 'args':
+            continue
+        flat.update(flatten(child, f"{prefix}.{key}" if prefix else key))
+    return flat
+
+
+def compare(old: dict, new: dict) -> list:
+    """(metric, old, new, % change) for every number present in both runs"""
+    before = flatten(old['results'])
+    after = flatten(new['results'])
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        a, b = before[key], after[key]
+        change = (b - a) / a * 100 if a else None
+        rows.append((key, a, b, change))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--only', type=lambda s: s.split(','), default=list(SUITES),
+                        help=f"comma separated subset of {','.join(SUITES)}")
+    parser.add_argument('--quick', action='store_true', help="small sizes, for a fast sanity run")
+    parser.add_argument('--output', default=f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="diff two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path) as f:
+                runs.append(json.load(f))
+        for key, a, b, change in compare(*runs):
+            moved = f"{change:+.1f}%" if change is not None else "n/a"
+            print(f"{key:<70} {a:>14} {b:>14} {moved:>9}")
+        return
+
+    unknown = set(args.only) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'quick': args.quick,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': {},
+    }
+    for name in args.only:
+        print(f"Running {name}...", file=sys.stderr)
+        report['results'][name] = run_suite(name, args.quick)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
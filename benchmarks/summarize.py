@@ -0,0 +1,183 @@
+"""
+/summarize end to end, with a stub in place of the Gemini model.
+
+    python -m benchmarks.summarize [--channels 4] [--messages 3000] [--model-latency 0.5]
+
+Stores --messages per channel over the last day, then calls the real
+/summarize command with a fake interaction. The stub model sleeps
+--model-latency plus the prompt length / --model-chars-per-sec before
+its first text, then takes --model-output-seconds to write the answer
+(in chunks when streamed), so the numbers show our own overhead (reads,
+prompt building, cache, coalescing) around a model that always behaves
+the same. Every phase reports both the full reply time and
+first_content, the time until the user saw any summary text.
+
+Phases: cold (first request per channel), warm (same window again, from
+the cache) and burst (--burst identical requests at once right after a
+new message, which should share one generation).
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+from benchmarks.harness import scratch_database, latency_summary, emit
+
+scratch_database('summarize')
+
+from benchmarks.synthetic import make_messages, firehose_channels  # noqa: E402
+from cogs.summarizer_cog import SummarizerCog  # noqa: E402
+from db import aio, database  # noqa: E402
+
+
+class StubStream:
+    """Async iterator of response chunks, like a streamed Gemini response"""
+
+    def __init__(self, chunks: list, delay: float):
+        self.chunks = chunks
+        self.delay = delay
+        self.usage_metadata = None
+
+    async def __aiter__(self):
+        for i, text in enumerate(self.chunks):
+            if i:
+                await asyncio.sleep(self.delay)
+            yield SimpleNamespace(text=text)
+
+
+class StubModel:
+    """Answers like GenerativeModel.generate_content_async after a predictable delay"""
+
+    def __init__(self, latency: float, chars_per_sec: float, output_seconds: float, chunks: int = 8):
+        self.latency = latency
+        self.chars_per_sec = chars_per_sec
+        self.output_seconds = output_seconds
+        self.chunks = chunks
+        self.calls = 0
+        self.prompt_chars = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        await asyncio.sleep(self.latency + len(prompt) / self.chars_per_sec)
+        text = f"stub summary of a {len(prompt)} character prompt"
+        if stream:
+            step = -(-len(text) // self.chunks)
+            return StubStream([text[i:i + step] for i in range(0, len(text), step)],
+                              self.output_seconds / self.chunks)
+        await asyncio.sleep(self.output_seconds)
+        return SimpleNamespace(text=text)
+
+
+class FakeInteraction:
+    """The parts of discord.Interaction /summarize touches, records what it sends"""
+
+    def __init__(self, channel):
+        self.guild = channel.guild
+        self.channel = channel
+        self.user = SimpleNamespace(display_name='benchmark')
+        self.response = SimpleNamespace(defer=self._defer, send_message=self._send)
+        self.followup = SimpleNamespace(send=self._send)
+        self.sent = []
+        self.first_sent = None
+
+    async def _defer(self, **kwargs):
+        pass
+
+    async def _edit(self, **kwargs):
+        pass
+
+    async def _send(self, content=None, **kwargs):
+        if self.first_sent is None:
+            self.first_sent = time.perf_counter()
+        self.sent.append(kwargs.get('embed', content))
+        return SimpleNamespace(edit=self._edit, delete=self._edit)
+
+
+async def summarize(cog, channel, hours: int) -> tuple:
+    """Run /summarize once, returns (seconds until the reply was done, seconds until it started showing)"""
+    interaction = FakeInteraction(channel)
+    started = time.perf_counter()
+    await cog.summarize.callback(cog, interaction, SimpleNamespace(name=f"{hours}h", value=hours))
+    if not interaction.sent:
+        raise RuntimeError(f"/summarize sent nothing for channel {channel.id}")
+    return time.perf_counter() - started, interaction.first_sent - started
+
+
+def phase_summary(timings: list) -> dict:
+    result = latency_summary([total for total, _ in timings])
+    result['first_content'] = latency_summary([first for _, first in timings])
+    return result
+
+
+async def run(args) -> dict:
+    database.init_db()
+    channels = firehose_channels(1, args.channels)
+    now_ms = int(time.time() * 1000)
+    interval_ms = max(1, 86400000 // args.messages)
+    for channel in channels:
+        database.add_monitored_channel(channel.guild.id, channel.id, channel.name, 1, 'benchmark')
+        database.store_messages(make_messages(
+            args.messages, guild_id=channel.guild.id, channels=1, first_channel=channel.id,
+            start_ms=now_ms - args.messages * interval_ms, interval_ms=interval_ms, seed=channel.id))
+
+    cog = SummarizerCog(SimpleNamespace())
+    cog.model = model = StubModel(args.model_latency, args.model_chars_per_sec, args.model_output_seconds)
+    # every channel is in one guild, the quota would refuse most of the cold phase
+    cog.scheduler.per_hour = 0
+    if not args.blocks:
+        cog.blocks = None
+    elif cog.blocks:
+        # what the background loop would have done before anyone asked
+        while await cog.blocks.run_once():
+            pass
+    block_calls = model.calls
+
+    phases = {}
+    cold = [await summarize(cog, c, args.hours) for c in channels]
+    phases['cold'] = phase_summary(cold)
+    warm = [await summarize(cog, c, args.hours) for c in channels for _ in range(args.repeat)]
+    phases['warm'] = phase_summary(warm)
+
+    # a new message invalidates the cached summary, then everyone asks at once
+    burst_calls = model.calls
+    database.store_messages(make_messages(1, guild_id=channels[0].guild.id, channels=1,
+                                          first_channel=channels[0].id, start_ms=int(time.time() * 1000)))
+    burst = await asyncio.gather(*[summarize(cog, channels[0], args.hours) for _ in range(args.burst)])
+    phases['burst'] = phase_summary(burst)
+    phases['burst']['model_calls'] = model.calls - burst_calls
+
+    await aio.shutdown()
+    return {
+        'phases': phases,
+        'model': {
+            'block_calls': block_calls,
+            'calls': model.calls,
+            'mean_prompt_chars': round(model.prompt_chars / model.calls) if model.calls else 0,
+        },
+        'cache': dict(cog.cache.stats),
+        'coalescer': dict(cog.coalescer.stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=3000, help="messages per channel over the last day")
+    parser.add_argument('--hours', type=int, default=24, help="window to summarize")
+    parser.add_argument('--repeat', type=int, default=5, help="warm requests per channel")
+    parser.add_argument('--burst', type=int, default=20, help="concurrent identical requests")
+    parser.add_argument('--blocks', action='store_true', help="precompute block summaries first")
+    parser.add_argument('--model-latency', type=float, default=0.5, help="stub model base latency, seconds")
+    parser.add_argument('--model-chars-per-sec', type=float, default=200000,
+                        help="stub model prompt processing speed")
+    parser.add_argument('--model-output-seconds', type=float, default=1.0,
+                        help="stub model time to write the answer after its first text")
+    parser.add_argument('--output', help="write the JSON result here instead of printing it")
+    args = parser.parse_args()
+
+    emit({'args': vars(args), **asyncio.run(run(args))}, args.output)
+
+
+if __name__ == "__main__":
+    main()
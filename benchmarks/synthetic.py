@@ -0,0 +1,143 @@
+"""
+Synthetic Discord traffic for benchmarks.
+
+Messages get real snowflake ids (time-ordered, matching their timestamp),
+a small pool of recurring authors and a mix of short chatter and long
+pasted blocks, roughly like a busy server channel. FakeChannel serves
+the same messages through a history() that behaves like discord.py's,
+firehose() pushes live ones at a fixed rate across many guilds.
+"""
+
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from db.snowflake import snowflake_from_ms
+
+WORDS = ("the a to and is it that of in you for on lol this was with just but so "
+         "what like yeah no be have not are do can get if my at all we they up "
+         "build deploy bot server channel summary message game tonight patch "
+         "bug fix release queue raid meeting link docs thread ping").split()
+
+
+def make_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def author_names(authors: int) -> dict:
+    """{author_id: display name}, the same for every call with the same count"""
+    rng = random.Random(authors)
+    return {1000 + i: f"user_{i}_{make_text(rng, 1)}" for i in range(authors)}
+
+
+def make_messages(count: int, guild_id: int = 1, channels: int = 4, authors: int = 50,
+                  start_ms: int = None, interval_ms: int = 2000, long_ratio: float = 0.1,
+                  reply_ratio: float = 0.15, seed: int = 42, first_channel: int = 100) -> list:
+    """count message dicts in the shape store_messages expects, oldest first"""
+    rng = random.Random(seed)
+    start_ms = start_ms if start_ms is not None else int(datetime.now(timezone.utc).timestamp() * 1000) - count * interval_ms
+    names = author_names(authors)
+    author_ids = list(names)
+    messages = []
+    for i in range(count):
+        ms = start_ms + i * interval_ms + rng.randrange(interval_ms)
+        if rng.random() < long_ratio:
+            content = make_text(rng, rng.randrange(60, 400))
+        else:
+            content = make_text(rng, rng.randrange(1, 25))
+        author_id = rng.choice(author_ids)
+        message_id = snowflake_from_ms(ms) | (i & 0x3FFFFF)
+        messages.append({
+            'guild_id': guild_id,
+            'channel_id': first_channel + i % channels,
+            'message_id': message_id,
+            'author_id': author_id,
+            'author_name': names[author_id],
+            'content': content,
+            'timestamp': datetime.fromtimestamp(ms / 1000, tz=timezone.utc),
+            'has_attachments': rng.random() < 0.05,
+            'reply_to': messages[-1]['message_id'] if messages and rng.random() < reply_ratio else None,
+        })
+    return messages
+
+
+def fake_message(row: dict, channel):
+    """A make_messages row dressed up as the parts of discord.Message we read"""
+    return SimpleNamespace(
+        id=row['message_id'],
+        guild=channel.guild,
+        channel=channel,
+        author=SimpleNamespace(id=row['author_id'], display_name=row['author_name'], bot=False),
+        content=row['content'],
+        created_at=row['timestamp'],
+        attachments=[object()] if row['has_attachments'] else [],
+        reference=SimpleNamespace(message_id=row['reply_to']) if row['reply_to'] else None,
+    )
+
+
+class FakeChannel:
+    """Stand-in for a discord text channel whose history() serves synthetic messages.
+
+    Supports the limit/before/after/oldest_first arguments the backfill
+    uses, and sleeps `latency` seconds per call like an API round trip.
+    """
+
+    def __init__(self, channel_id: int, count: int, guild_id: int = 1, latency: float = 0.0,
+                 seed: int = None, **kwargs):
+        self.id = channel_id
+        self.name = f"fake-{channel_id}"
+        self.guild = SimpleNamespace(id=guild_id, shard_id=0)
+        self.latency = latency
+        self.calls = 0
+        rows = make_messages(count, guild_id=guild_id, channels=1,
+                             seed=channel_id if seed is None else seed, **kwargs)
+        self.messages = [fake_message(row, self) for row in rows]
+
+    async def history(self, limit: int = 100, before=None, after=None, oldest_first: bool = None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        low = after.id if after is not None else -1
+        high = before.id if before is not None else 1 << 63
+        window = [m for m in self.messages if low < m.id < high]
+        if oldest_first is None:
+            oldest_first = after is not None
+        # Discord returns the page closest to `before` unless paging up from `after`
+        window = window[:limit] if oldest_first and before is None else window[-limit:]
+        if not oldest_first:
+            window.reverse()
+        for message in window:
+            yield message
+
+
+def firehose_channels(guilds: int, channels_per_guild: int, first_guild: int = 1) -> list:
+    """The (empty) FakeChannels firehose() posts into, ids first_guild * 1000 + n"""
+    return [FakeChannel(first_guild * 1000 + i, 0, guild_id=first_guild + i // channels_per_guild)
+            for i in range(guilds * channels_per_guild)]
+
+
+async def firehose(count: int, rate: float = 0, guilds: int = 10, channels_per_guild: int = 5,
+                   first_guild: int = 1, lag: list = None, **kwargs):
+    """Yield count live messages spread over guilds x channels, paced at `rate` per second.
+
+    rate=0 yields as fast as the consumer takes them. Pacing is open loop:
+    a slow consumer doesn't slow the schedule down, the lag behind it
+    (seconds, one entry per message) is appended to `lag` if given.
+    kwargs go to make_messages (long_ratio, reply_ratio, authors, seed).
+    """
+    channels = firehose_channels(guilds, channels_per_guild, first_guild)
+    interval_ms = max(1, int(1000 / rate)) if rate else 1
+    rows = make_messages(count, channels=1, interval_ms=interval_ms,
+                         start_ms=int(time.time() * 1000), **kwargs)
+    rng = random.Random(kwargs.get('seed', 42))
+    started = time.perf_counter()
+    for i, row in enumerate(rows):
+        if rate:
+            due = started + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if lag is not None:
+                lag.append(max(0.0, -delay))
+        yield fake_message(row, rng.choice(channels))
@@ -1,38 +1,116 @@
-import discord
+import time
+# before the imports, so the startup log includes them
+_process_started = time.perf_counter()
+
 from discord.ext import commands
 import logging
-from config import DISCORD_TOKEN
+import asyncio
+from config import (DISCORD_TOKEN, BACKFILL_ENABLED, GATEWAY_PROFILE, SHARD_COUNT, SHARD_IDS,
+                    CLUSTER_ID, PRIMARY_CLUSTER, DB_WRITER_ADDRESS, METRICS_HOST, METRICS_PORT,
+                    LOOP_WATCHDOG_ENABLED, DIGEST_ENABLED, COMMAND_SYNC)
 from cogs.setup_cog import SetupCog
 from cogs.summarizer_cog import SummarizerCog
-from db.database import is_channel_monitored, store_message
+from cogs.maintenance_cog import MaintenanceCog
+from cogs.admin_cog import AdminCog
+from cogs.digest_cog import DigestCog
+from cogs.search_cog import SearchCog
+from db.database import is_channel_monitored, init_db
+from db.ingest import MessageIngestor, message_row
+from db.backfill import HistoryBackfiller
+from db import aio as db_aio
+from utils.gateway import gateway_options, describe as describe_gateway
+from utils.health import ShardHealth
+from utils.metrics import MetricsServer, Gauge, ON_MESSAGE_SECONDS
+from utils.watchdog import LoopWatchdog
+from utils.startup import StartupTimer
+from utils.command_sync import sync_commands
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format=(f'%(asctime)s - cluster {CLUSTER_ID} - ' if DB_WRITER_ADDRESS else '%(asctime)s - ')
+           + '%(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-# Bot configuration
-intents = discord.Intents.default()
-intents.message_content = True
-intents.guilds = True
-intents.guild_messages = True
+# Bot configuration (GATEWAY_PROFILE=lean drops caches we never read).
+# Sharded even in a single process; cluster.py sets SHARD_IDS per process.
+gateway = gateway_options()
+bot = commands.AutoShardedBot(command_prefix='!', shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **gateway)
+
+# Messages are written in batches by a background task instead of inline
+ingestor = MessageIngestor()
+
+# Pulls in whatever was posted while the bot was offline
+backfiller = HistoryBackfiller()
+_backfill_task = None
+
+# Per-shard gateway state + queue depth
+health = ShardHealth(bot, ingestor)
+
+# Prometheus endpoint (each cluster process gets its own port)
+metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT + CLUSTER_ID) if METRICS_PORT else None
+Gauge('discordsum_ingest_queue_depth', "Messages waiting to be written", lambda: ingestor.depth)
+Gauge('discordsum_ingest_pending', "Messages waiting to be written by shard",
+      lambda: {(shard_id,): n for shard_id, n in ingestor.pending_by_shard.items()}, ('shard',))
+Gauge('discordsum_guilds', "Guilds this process serves", lambda: len(bot.guilds))
+
+# Catches sync calls that stall the event loop, with their stack
+watchdog = LoopWatchdog() if LOOP_WATCHDOG_ENABLED else None
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# How long each part of startup took, logged once the bot is ready
+startup = StartupTimer(_process_started)
+startup.since_start('imports')
+_sync_task = None
 
 @bot.event
 async def on_ready():
     """Called when the bot is ready"""
     logger.info(f'{bot.user} has connected to Discord!')
-    logger.info(f'Bot is in {len(bot.guilds)} guilds')
+    logger.info(f'Bot is in {len(bot.guilds)} guilds on shard(s) {sorted(bot.shards)} of {bot.shard_count}')
+    logger.info(f"Gateway profile {GATEWAY_PROFILE}: {describe_gateway(gateway)}")
+    startup.stop('gateway')
+    startup.report()
     
-    # Sync slash commands
+    # Fill the downtime gap once per process (on_ready fires again after reconnects)
+    global _backfill_task
+    if BACKFILL_ENABLED and _backfill_task is None:
+        _backfill_task = asyncio.create_task(backfill_monitored_channels(), name="history-backfill")
+
+@bot.event
+async def on_shard_connect(shard_id):
+    health.record(shard_id, 'connect')
+
+@bot.event
+async def on_shard_disconnect(shard_id):
+    health.record(shard_id, 'disconnect')
+    logger.warning(f"Shard {shard_id} disconnected")
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    health.record(shard_id, 'resume')
+    logger.info(f"Shard {shard_id} resumed")
+
+@bot.event
+async def on_shard_ready(shard_id):
+    health.record(shard_id, 'ready')
+
+async def backfill_monitored_channels():
+    """Backfill every monitored channel the bot can still see"""
+    channels = []
+    for row in await db_aio.get_monitored_channels():
+        if bot.get_guild(row['guild_id']) is None:
+            # another cluster's guild, or we left it
+            continue
+        channel = bot.get_channel(row['channel_id'])
+        if channel is None:
+            logger.warning(f"Monitored channel {row['channel_id']} is not visible, skipping backfill")
+            continue
+        channels.append(channel)
     try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
+        await backfiller.backfill_channels(channels)
     except Exception as e:
-        logger.error(f"Failed to sync commands: {e}")
+        logger.error(f"Startup backfill failed: {e}")
 
 @bot.event
 async def on_message(message):
@@ -43,32 +121,79 @@ async def on_message(message):
     
     # Check if this channel is being monitored for summarization
     if is_channel_monitored(message.guild.id, message.channel.id):
-        # Store the message for later summarization
-        success = store_message(
-            guild_id=message.guild.id,
-            channel_id=message.channel.id,
-            message_id=message.id,
-            author_id=message.author.id,
-            author_name=message.author.display_name,
-            content=message.content,
-            timestamp=message.created_at,
-            has_attachments=bool(message.attachments),
-            reply_to=message.reference.message_id if message.reference else None
-        )
-        if success:
-            logger.debug(f"Stored message {message.id} from {message.author} in {message.channel}")
+        # Queue the message for later summarization (waits if the writer falls behind)
+        started = time.perf_counter()
+        queued = await ingestor.put(shard_id=message.guild.shard_id, **message_row(message))
+        ON_MESSAGE_SECONDS.observe(time.perf_counter() - started)
+        if queued:
+            logger.debug(f"Queued message {message.id} from {message.author} in {message.channel}")
+
+async def sync_command_tree():
+    """Sync slash commands if they changed since the last sync (runs once per process, not per on_ready)"""
+    try:
+        with startup.phase('command_sync'):
+            await sync_commands(bot.tree, COMMAND_SYNC)
+    except Exception as e:
+        logger.error(f"Failed to sync commands: {e}")
+
+async def load_cogs():
+    """Construct and add every cog, concurrently"""
+    summarizer = SummarizerCog(bot)
+    cogs = [SetupCog(bot, backfiller), summarizer, MaintenanceCog(bot, health), SearchCog(bot),
+            AdminCog(bot, ingestor, watchdog)]
+    if DIGEST_ENABLED:
+        cogs.append(DigestCog(bot, summarizer))
+    await asyncio.gather(*(bot.add_cog(cog) for cog in cogs))
+    logger.info(f"Loaded {len(cogs)} cogs")
 
 async def main():
     """Main function to run the bot"""
+    global _sync_task
     async with bot:
-        # Load cogs
-        await bot.add_cog(SetupCog(bot))
-        await bot.add_cog(SummarizerCog(bot))
-        logger.info("Loaded cogs")
+        # Bring the schema up to date before anything touches it
+        # (in a cluster the writer process already did)
+        if not DB_WRITER_ADDRESS:
+            with startup.phase('schema'):
+                init_db()
+        
+        # Cogs, the monitored channel registry (so on_message never has to hit the DB)
+        # and where stored history ends (before live messages start landing) don't depend
+        # on each other
+        with startup.phase('cogs_and_db'):
+            await asyncio.gather(
+                load_cogs(),
+                db_aio.load_monitored_channels(),
+                backfiller.snapshot()
+            )
+        
+        # Start the message writer before we can receive any events
+        ingestor.start()
+        
+        if metrics_server:
+            await metrics_server.start()
+        if watchdog:
+            watchdog.start()
         
         # Start the bot
-        await bot.start(DISCORD_TOKEN)
+        try:
+            with startup.phase('login'):
+                await bot.login(DISCORD_TOKEN)
+            # the command tree is global, one cluster is enough; it only needs the HTTP
+            # login, so it runs alongside the gateway connect instead of on every on_ready
+            if PRIMARY_CLUSTER:
+                _sync_task = asyncio.create_task(sync_command_tree(), name="command-sync")
+            startup.start('gateway')
+            await bot.connect()
+        finally:
+            if _sync_task:
+                _sync_task.cancel()
+            # flush whatever is still queued before exiting
+            await ingestor.close()
+            await db_aio.shutdown()
+            if metrics_server:
+                await metrics_server.stop()
+            if watchdog:
+                watchdog.stop()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Cluster launcher.
+
+Runs one shared DB writer process plus N bot processes, each owning a
+contiguous range of shards. Bot processes read sqlite directly and send
+every write to the writer over a local socket, so sqlite still only ever
+has one writer. Crashed processes are restarted with backoff.
+
+    python cluster.py --clusters 4            # shard count from Discord
+    python cluster.py --clusters 2 --shards 8
+
+A single process (python bot.py) is still the normal way to run the bot;
+this is for when one core or one process's shards aren't enough.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from multiprocessing.connection import Client
+from config import DISCORD_TOKEN, SHARD_COUNT
+from db.writer import parse_address
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - launcher - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def recommended_shards() -> int:
+    """Ask Discord how many shards it wants for this bot"""
+    request = urllib.request.Request('https://discord.com/api/v10/gateway/bot',
+                                     headers={'Authorization': f'Bot {DISCORD_TOKEN}',
+                                              'User-Agent': 'DiscordSum cluster launcher'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+
+def split_shards(shard_count: int, clusters: int) -> list:
+    """Contiguous shard id ranges, one per cluster"""
+    per_cluster = math.ceil(shard_count / clusters)
+    return [list(range(start, min(start + per_cluster, shard_count)))
+            for start in range(0, shard_count, per_cluster)]
+
+
+class Supervised:
+    """A child process that is restarted (with backoff) when it dies"""
+
+    def __init__(self, name: str, args: list, env: dict, stop_signal=signal.SIGTERM):
+        self.name = name
+        self.args = args
+        self.env = env
+        self.stop_signal = stop_signal
+        self.process = None
+        self.restarts = 0
+        self.next_start = 0.0
+        self.started_at = 0.0
+
+    def start(self):
+        # own session, so a Ctrl+C on the launcher doesn't stop the writer before the bots
+        self.process = subprocess.Popen(self.args, env=self.env, cwd=ROOT, start_new_session=True)
+        self.started_at = time.monotonic()
+        logger.info(f"Started {self.name} (pid {self.process.pid})")
+
+    def check(self):
+        """Restart the process if it exited and its backoff has passed"""
+        if self.process is not None and self.process.poll() is None:
+            # ran long enough, forget earlier crashes
+            if self.restarts and time.monotonic() - self.started_at > 300:
+                self.restarts = 0
+            return
+        now = time.monotonic()
+        if self.process is not None:
+            logger.warning(f"{self.name} exited with code {self.process.returncode}")
+            self.process = None
+            self.restarts += 1
+            self.next_start = now + min(60, 2 ** self.restarts)
+        if now >= self.next_start:
+            self.start()
+
+    def stop(self, timeout: float):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.send_signal(self.stop_signal)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"{self.name} did not stop in {timeout}s, killing it")
+            self.process.kill()
+
+
+def wait_for_writer(address: str, authkey: str, timeout: float = 60):
+    """Block until the writer accepts connections (it runs migrations first)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            Client(parse_address(address), authkey=authkey.encode()).close()
+            return
+        except (OSError, EOFError):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"DB writer did not come up at {address} within {timeout}s")
+            time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as several sharded processes")
+    parser.add_argument('--clusters', type=int, default=2, help="number of bot processes")
+    parser.add_argument('--shards', type=int, default=SHARD_COUNT, help="total shards (default: ask Discord)")
+    parser.add_argument('--writer-address', default=os.path.join(tempfile.gettempdir(),
+                                                                  f"discordsum-writer-{os.getpid()}.sock"),
+                        help="host:port or unix socket path for the writer")
+    args = parser.parse_args()
+
+    shard_count = args.shards or recommended_shards()
+    groups = split_shards(shard_count, max(1, args.clusters))
+    authkey = secrets.token_hex(16)
+    logger.info(f"{shard_count} shard(s) across {len(groups)} cluster(s): {groups}")
+
+    base_env = dict(os.environ, DB_WRITER_AUTHKEY=authkey)
+    # the writer writes locally, so it must not see DB_WRITER_ADDRESS itself
+    base_env.pop('DB_WRITER_ADDRESS', None)
+    writer = Supervised('writer', [sys.executable, '-m', 'db.writer', '--address', args.writer_address],
+                        base_env)
+    writer.start()
+    wait_for_writer(args.writer_address, authkey)
+
+    bots = []
+    for cluster_id, shard_ids in enumerate(groups):
+        env = dict(base_env,
+                   DB_WRITER_ADDRESS=args.writer_address,
+                   CLUSTER_ID=str(cluster_id),
+                   SHARD_COUNT=str(shard_count),
+                   SHARD_IDS=','.join(map(str, shard_ids)))
+        # SIGINT lets asyncio.run unwind bot.main(), which flushes the ingest queue
+        bots.append(Supervised(f"cluster {cluster_id}", [sys.executable, 'bot.py'], env,
+                               stop_signal=signal.SIGINT))
+    for bot in bots:
+        bot.start()
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    while not stopping:
+        writer.check()
+        for bot in bots:
+            bot.check()
+        time.sleep(1)
+
+    # bots first so they can flush their queues through the writer
+    logger.info("Stopping clusters")
+    for bot in bots:
+        bot.stop(timeout=30)
+    writer.stop(timeout=30)
+    logger.info("Cluster stopped")
+
+
+if __name__ == "__main__":
+    main()
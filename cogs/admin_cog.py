@@ -0,0 +1,188 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import io
+import logging
+from datetime import datetime, timezone
+from config import CLUSTER_ID, PROFILE_MAX_SECONDS
+from utils.metrics import (INGEST_MESSAGES, INGEST_FLUSH_SECONDS, DB_CALL_SECONDS, DB_WAIT_SECONDS,
+                           DB_ERRORS, LLM_SECONDS, LLM_TOKENS, LLM_FIRST_TOKEN_SECONDS, PROMPT_BUILD_SECONDS,
+                           PROMPT_TOKENS, SUMMARY_CACHE, COALESCED, SUMMARY_QUEUE_SECONDS, SUMMARY_QUOTA_REJECTIONS,
+                           LOOP_LAG_SECONDS, LOOP_STALLS)
+from utils.profiler import profile_loop
+
+logger = logging.getLogger(__name__)
+
+
+def fmt_seconds(seconds: float) -> str:
+    """0.0123 -> '12.3ms', 2.5 -> '2.50s', None -> 'n/a'"""
+    if seconds is None:
+        return "n/a"
+    return f"{seconds * 1000:.1f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def fmt_latency(histogram, *labels) -> str:
+    """'p50 12.3ms / p99 80.0ms' for one histogram series"""
+    return (f"p50 {fmt_seconds(histogram.quantile(0.5, *labels))} / "
+            f"p99 {fmt_seconds(histogram.quantile(0.99, *labels))}")
+
+
+class AdminCog(commands.Cog):
+    """Cog for bot owner commands"""
+    
+    def __init__(self, bot, ingestor=None, watchdog=None):
+        self.bot = bot
+        self.ingestor = ingestor
+        self.watchdog = watchdog
+    
+    async def owner_only(self, interaction: discord.Interaction) -> bool:
+        """Reply and return False unless the bot owner is asking"""
+        if await self.bot.is_owner(interaction.user):
+            return True
+        await interaction.response.send_message("❌ Only my owner gets to see my insides bestie.", ephemeral=True)
+        return False
+    
+    @app_commands.command(name="botstats", description="Show the bot's internal metrics (owner only)")
+    async def botstats(self, interaction: discord.Interaction):
+        """Show ingestion, sqlite, Gemini and cache metrics for this process"""
+        
+        if not await self.owner_only(interaction):
+            return
+        
+        embed = discord.Embed(
+            title=f"📊 Bot Stats (cluster {CLUSTER_ID})",
+            color=discord.Color.blurple()
+        )
+        
+        # Ingestion
+        depth = self.ingestor.depth if self.ingestor else 0
+        embed.add_field(
+            name="📥 Ingestion",
+            value=(f"**Stored:** {INGEST_MESSAGES.get('stored'):.0f} • **Dupes:** {INGEST_MESSAGES.get('duplicate'):.0f} "
+                   f"• **Failed:** {INGEST_MESSAGES.get('failed'):.0f}\n"
+                   f"**Queue depth:** {depth}\n"
+                   f"**Batch write:** {fmt_latency(INGEST_FLUSH_SECONDS)}"),
+            inline=False
+        )
+        
+        # SQLite, the functions we spend the most time in
+        by_time = sorted(DB_CALL_SECONDS.series, key=lambda k: DB_CALL_SECONDS.sum(*k), reverse=True)
+        db_lines = [f"`{name}` {DB_CALL_SECONDS.count(name)}× {fmt_latency(DB_CALL_SECONDS, name)}"
+                    for (name,) in by_time[:5]]
+        db_seconds = sum(DB_CALL_SECONDS.sum(*k) for k in DB_CALL_SECONDS.series)
+        embed.add_field(
+            name="🗄️ SQLite",
+            value=(f"**Time spent:** {fmt_seconds(db_seconds)} • **Errors:** {DB_ERRORS.total():.0f}\n"
+                   f"**Thread wait:** read {fmt_seconds(DB_WAIT_SECONDS.quantile(0.99, 'read'))} / "
+                   f"write {fmt_seconds(DB_WAIT_SECONDS.quantile(0.99, 'write'))} (p99)\n"
+                   + ("\n".join(db_lines) or "No DB calls yet")),
+            inline=False
+        )
+        
+        # Gemini
+        llm_calls = {outcome: LLM_SECONDS.count(outcome) for outcome in ('ok', 'timeout', 'error')}
+        llm_seconds = sum(LLM_SECONDS.sum(o) for o in llm_calls)
+        prompt_calls = LLM_TOKENS.count('prompt')
+        avg_prompt = LLM_TOKENS.sum('prompt') / prompt_calls if prompt_calls else 0
+        embed.add_field(
+            name="🤖 Gemini",
+            value=(f"**Calls:** {llm_calls['ok']} ok • {llm_calls['timeout']} timed out • {llm_calls['error']} failed\n"
+                   f"**Latency:** {fmt_latency(LLM_SECONDS, 'ok')} • **First text:** {fmt_latency(LLM_FIRST_TOKEN_SECONDS)}\n"
+                   f"**Time spent:** {fmt_seconds(llm_seconds)} • **Avg prompt:** ~{avg_prompt:.0f} tokens\n"
+                   f"**Queue wait:** {fmt_latency(SUMMARY_QUEUE_SECONDS)} • "
+                   f"**Over quota:** {SUMMARY_QUOTA_REJECTIONS.total():.0f} refused"),
+            inline=False
+        )
+        
+        # Prompt building + caching
+        builds = PROMPT_TOKENS.count()
+        hits = SUMMARY_CACHE.get('hit') + SUMMARY_CACHE.get('persisted_hit')
+        lookups = hits + SUMMARY_CACHE.get('miss')
+        embed.add_field(
+            name="📝 Prompts & Cache",
+            value=(f"**Builds:** {builds} • {fmt_latency(PROMPT_BUILD_SECONDS)} • "
+                   f"~{PROMPT_TOKENS.sum() / builds if builds else 0:.0f} tokens avg\n"
+                   f"**Cache hit rate:** {hits / lookups if lookups else 0:.0%} of {lookups:.0f} lookups\n"
+                   f"**Coalesced requests:** {COALESCED.get('coalesced'):.0f}"),
+            inline=False
+        )
+        
+        # Event loop
+        embed.add_field(
+            name="⏱️ Event Loop",
+            value=(f"**Lag:** {fmt_latency(LOOP_LAG_SECONDS)} • "
+                   f"max {fmt_seconds(self.watchdog.max_lag if self.watchdog else None)}\n"
+                   f"**Stalls:** {LOOP_STALLS.total():.0f} (see `/stalls`)"),
+            inline=False
+        )
+        
+        if db_seconds or llm_seconds:
+            slower = "SQLite 🗄️" if db_seconds > llm_seconds else "Gemini 🤖"
+            embed.set_footer(text=f"Most time since start went to {slower}")
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="stalls", description="Show where the event loop got blocked recently (owner only)")
+    async def stalls(self, interaction: discord.Interaction):
+        """List recent event loop stalls with the call that was blocking"""
+        
+        if not await self.owner_only(interaction):
+            return
+        
+        stalls = list(self.watchdog.stalls) if self.watchdog else []
+        if not stalls:
+            await interaction.response.send_message("✅ No event loop stalls caught, we're zooming 🏎️", ephemeral=True)
+            return
+        
+        lines = []
+        report = []
+        for stall in reversed(stalls):
+            when = datetime.fromtimestamp(stall['at'], tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+            duration = fmt_seconds(stall['duration']) if stall['duration'] is not None else "still blocked"
+            # the innermost frame is the call that's blocking
+            culprit = stall['stack'].strip().splitlines()[-2].strip() if stall['stack'].count("\n") > 1 else "?"
+            lines.append(f"**{when}** blocked {duration}\n`{culprit[:150]}`")
+            report.append(f"=== {when}, blocked {duration} ===\n{stall['stack']}")
+        
+        embed = discord.Embed(
+            title=f"🐢 Event Loop Stalls ({len(stalls)})",
+            description="\n".join(lines[:10]),
+            color=discord.Color.orange()
+        )
+        file = discord.File(io.BytesIO("\n".join(report).encode()), filename="stalls.txt")
+        await interaction.response.send_message(embed=embed, file=file, ephemeral=True)
+    
+    @app_commands.command(name="profile", description="Profile the bot for a few seconds (owner only)")
+    @app_commands.describe(
+        seconds="How long to profile",
+        mode="sampling is cheap, cprofile is exact but slows the bot down while it runs"
+    )
+    @app_commands.choices(mode=[
+        app_commands.Choice(name="sampling", value="sampling"),
+        app_commands.Choice(name="cprofile", value="cprofile"),
+    ])
+    async def profile(self, interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 600] = 10,
+                      mode: app_commands.Choice[str] = None):
+        """Profile the event loop thread and send back the hottest functions"""
+        
+        if not await self.owner_only(interaction):
+            return
+        
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        mode_value = mode.value if mode else 'sampling'
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        
+        try:
+            report = await profile_loop(seconds, mode_value)
+        except RuntimeError as e:
+            await interaction.followup.send(f"❌ {e}, wait for it to finish first.", ephemeral=True)
+            return
+        
+        logger.info(f"{mode_value} profile ({seconds}s) requested by {interaction.user}")
+        preview = report if len(report) < 1800 else report[:1800].rsplit("\n", 1)[0] + "\n…"
+        file = discord.File(io.BytesIO(report.encode()), filename=f"profile-{mode_value}.txt")
+        await interaction.followup.send(
+            f"🔬 {mode_value} profile of the event loop over {seconds}s:\n```\n{preview}\n```",
+            file=file,
+            ephemeral=True
+        )
@@ -0,0 +1,191 @@
+import discord
+from discord.ext import commands, tasks
+from discord import app_commands
+import asyncio
+import logging
+import random
+import time
+import zlib
+from config import DIGEST_CHECK_SECONDS, DIGEST_CONCURRENCY, DIGEST_JITTER_SECONDS
+from db.aio import (is_channel_monitored, get_digest_channels, get_latest_message_id,
+                    set_channel_digest, mark_digest_sent)
+from utils.streaming import EmbedStream
+
+logger = logging.getLogger(__name__)
+
+DIGEST_NAMES = {1: "Hourly", 6: "6-Hour", 12: "12-Hour", 24: "Daily"}
+
+
+def digest_slot(channel_id: int, hours: int, now: float) -> float:
+    """Start of the channel's current digest slot.
+
+    Every channel gets a stable offset inside its period (from its id), so
+    digests are spread across the hour/day instead of all firing at :00.
+    """
+    period = hours * 3600
+    offset = zlib.crc32(str(channel_id).encode()) % period
+    return now - (now - offset) % period
+
+
+class DigestCog(commands.Cog):
+    """Cog for automatic periodic channel digests"""
+    
+    def __init__(self, bot, summarizer):
+        self.bot = bot
+        # SummarizerCog, digests share its cache and in-flight generations with /summarize
+        self.summarizer = summarizer
+        # global cap on digests generating at once, the rest wait their turn
+        self.semaphore = asyncio.Semaphore(DIGEST_CONCURRENCY)
+        # (channel_id, slot) -> when it's due, slot start + random jitter
+        self.due = {}
+        self.running = {}  # channel_id -> task
+        self.digest_loop.change_interval(seconds=DIGEST_CHECK_SECONDS)
+    
+    async def cog_load(self):
+        self.digest_loop.start()
+    
+    async def cog_unload(self):
+        self.digest_loop.cancel()
+        for task in self.running.values():
+            task.cancel()
+    
+    @tasks.loop(seconds=60)
+    async def digest_loop(self):
+        """Start the digests whose slot (plus jitter) has come up"""
+        try:
+            rows = await get_digest_channels()
+        except Exception as e:
+            logger.error(f"Could not load digest schedules: {e}")
+            return
+        
+        now = time.time()
+        due = {}
+        for row in rows:
+            # each cluster posts digests for its own guilds
+            if self.bot.get_guild(row['guild_id']) is None:
+                continue
+            slot = digest_slot(row['channel_id'], row['digest_hours'], now)
+            if row['digest_last_at'] >= slot:
+                continue
+            key = (row['channel_id'], slot)
+            due[key] = self.due.get(key) or slot + random.uniform(0, DIGEST_JITTER_SECONDS)
+            if due[key] <= now and row['channel_id'] not in self.running:
+                task = asyncio.create_task(self.run_digest(row), name=f"digest-{row['channel_id']}")
+                self.running[row['channel_id']] = task
+                task.add_done_callback(lambda _, channel_id=row['channel_id']: self.running.pop(channel_id, None))
+        # drop jitter for slots that were handled or unscheduled
+        self.due = due
+    
+    @digest_loop.before_loop
+    async def before_digest_loop(self):
+        await self.bot.wait_until_ready()
+    
+    async def run_digest(self, row: dict):
+        """Summarize one channel's last period and post it, unless nothing new was said"""
+        guild_id = row['guild_id']
+        channel_id = row['channel_id']
+        hours = row['digest_hours']
+        
+        async with self.semaphore:
+            try:
+                channel = self.bot.get_channel(channel_id)
+                if channel is None:
+                    logger.warning(f"Digest channel {channel_id} is not visible, skipping this period")
+                    await mark_digest_sent(guild_id, channel_id, row['digest_last_message_id'], time.time())
+                    return
+                
+                latest = await get_latest_message_id(guild_id, channel_id, hours)
+                last_posted = row['digest_last_message_id']
+                if latest is None or (last_posted is not None and latest <= last_posted):
+                    logger.debug(f"No new messages in #{channel.name} since the last digest, skipping")
+                    await mark_digest_sent(guild_id, channel_id, last_posted, time.time())
+                    return
+                
+                # digests wait in the fair queue too, but the guild opted in so they don't use its quota;
+                # their own key keeps a /summarize that lands meanwhile from joining one for free
+                summary, message_count, ok = await self.summarizer.coalescer.run(
+                    ('digest', guild_id, channel_id, hours),
+                    lambda: self.summarizer.summarize_window(guild_id, channel_id, channel.name, hours, charge=False)
+                )
+                if not ok:
+                    # don't post the error, try again next period
+                    logger.warning(f"Digest for #{channel.name} failed, will retry next period: {summary}")
+                    await mark_digest_sent(guild_id, channel_id, last_posted, time.time())
+                    return
+                
+                # long digests continue in a second message instead of failing the send
+                stream = EmbedStream(
+                    lambda embed: channel.send(embed=embed),
+                    title=f"📰 {DIGEST_NAMES.get(hours, f'{hours}-Hour')} Digest",
+                    color=discord.Color.blue()
+                )
+                try:
+                    await stream.finish(
+                        summary,
+                        fields=[("Stats", f"**Messages analyzed:** {message_count}\n**Timeframe:** last {hours} hour{'s' if hours > 1 else ''}")],
+                        footer="Posted automatically • use /digest to change or turn off • Powered by Google Gemini"
+                    )
+                except discord.HTTPException as e:
+                    logger.warning(f"Could not post digest in #{channel.name}: {e}")
+                await mark_digest_sent(guild_id, channel_id, latest, time.time())
+                logger.info(f"Posted {hours}h digest in #{channel.name} ({message_count} messages)")
+            except Exception as e:
+                logger.error(f"Digest for channel {channel_id} failed: {e}")
+    
+    @app_commands.command(name="digest", description="Post a summary of this channel automatically")
+    @app_commands.describe(
+        frequency="How often to post a digest"
+    )
+    @app_commands.choices(frequency=[
+        app_commands.Choice(name="Off", value=0),
+        app_commands.Choice(name="Hourly", value=1),
+        app_commands.Choice(name="Every 6 hours", value=6),
+        app_commands.Choice(name="Every 12 hours", value=12),
+        app_commands.Choice(name="Daily", value=24),
+    ])
+    async def digest(self, interaction: discord.Interaction, frequency: app_commands.Choice[int]):
+        """Schedule (or stop) automatic digests for this channel"""
+        
+        # Check if user has manage channels permission
+        if not interaction.user.guild_permissions.manage_channels:
+            await interaction.response.send_message(
+                "❌ You need 'Manage Channels' permission to schedule digests bestie.",
+                ephemeral=True
+            )
+            return
+        
+        guild_id = interaction.guild.id
+        channel_id = interaction.channel.id
+        channel_name = interaction.channel.name
+        
+        if not await is_channel_monitored(guild_id, channel_id):
+            await interaction.response.send_message(
+                f"❌ errmmm I'm not monitoring **#{channel_name}** yet, use `/setup` first!",
+                ephemeral=True
+            )
+            return
+        
+        success = await set_channel_digest(guild_id, channel_id, frequency.value)
+        if not success:
+            await interaction.response.send_message(
+                "❌ ermmm failed to update the digest. Please try again.",
+                ephemeral=True
+            )
+            return
+        
+        if frequency.value == 0:
+            embed = discord.Embed(
+                title="🔕 Digest Off",
+                description=f"No more automatic digests in **#{channel_name}**. `/summarize` still works whenever!",
+                color=discord.Color.orange()
+            )
+        else:
+            embed = discord.Embed(
+                title=f"📰 {DIGEST_NAMES[frequency.value]} Digest On",
+                description=(f"I'll post a summary of **#{channel_name}** {frequency.name.lower()} :D\n"
+                             f"Quiet periods get skipped, no new messages = no digest."),
+                color=discord.Color.green()
+            )
+        embed.set_footer(text=f"Set by {interaction.user.display_name}")
+        
+        await interaction.response.send_message(embed=embed)
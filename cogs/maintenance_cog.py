@@ -0,0 +1,73 @@
+import discord
+from discord.ext import commands, tasks
+from discord import app_commands
+import logging
+from config import RETENTION_INTERVAL_MINUTES, HEALTH_LOG_INTERVAL, PRIMARY_CLUSTER, CLUSTER_ID
+from db.retention import RetentionWorker
+from utils.health import format_shard
+
+logger = logging.getLogger(__name__)
+
+class MaintenanceCog(commands.Cog):
+    """Cog for background database upkeep and shard health"""
+    
+    def __init__(self, bot, health=None):
+        self.bot = bot
+        self.health = health
+        self.retention = RetentionWorker()
+        self.retention_loop.change_interval(minutes=RETENTION_INTERVAL_MINUTES)
+        self.health_loop.change_interval(seconds=HEALTH_LOG_INTERVAL)
+    
+    async def cog_load(self):
+        # in a cluster only one process runs retention
+        if PRIMARY_CLUSTER:
+            self.retention_loop.start()
+        if self.health:
+            self.health_loop.start()
+    
+    async def cog_unload(self):
+        self.retention_loop.cancel()
+        self.health_loop.cancel()
+    
+    @tasks.loop(minutes=60)
+    async def retention_loop(self):
+        """Drop expired messages and give the space back"""
+        try:
+            await self.retention.run_once()
+        except Exception as e:
+            logger.error(f"Retention pass failed: {e}")
+    
+    @retention_loop.before_loop
+    async def before_retention_loop(self):
+        await self.bot.wait_until_ready()
+    
+    @tasks.loop(seconds=300)
+    async def health_loop(self):
+        """Log one health line per shard"""
+        for shard in self.health.snapshot():
+            logger.info(format_shard(shard))
+    
+    @health_loop.before_loop
+    async def before_health_loop(self):
+        await self.bot.wait_until_ready()
+    
+    @app_commands.command(name="shards", description="Show gateway shard health")
+    async def shards(self, interaction: discord.Interaction):
+        """Show latency, guilds and queue depth for each shard in this process"""
+        
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message(
+                "❌ You need 'Manage Server' permission to peek at the shards.",
+                ephemeral=True
+            )
+            return
+        
+        shards = self.health.snapshot() if self.health else []
+        embed = discord.Embed(
+            title=f"🩺 Shard Health (cluster {CLUSTER_ID})",
+            description="\n".join(format_shard(s) for s in shards) or "No shards running?? 🤔",
+            color=discord.Color.green() if all(s['up'] for s in shards) else discord.Color.orange()
+        )
+        embed.set_footer(text=f"This server is on shard {interaction.guild.shard_id}")
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
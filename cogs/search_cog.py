@@ -0,0 +1,105 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import logging
+import re
+from db.aio import is_channel_monitored, get_monitored_channels, search_messages
+from db.search import WORD_RE
+
+logger = logging.getLogger(__name__)
+
+
+def snippet(content: str, query: str, width: int = 160) -> str:
+    """Part of content around the first query word, with the query words in bold"""
+    words = [re.escape(w) for w in WORD_RE.findall(query)]
+    pattern = re.compile(r"\b(" + "|".join(words) + r")\w*", re.IGNORECASE) if words else None
+    content = " ".join((content or "").split())
+    found = pattern.search(content) if pattern else None
+    start = max(0, found.start() - width // 3) if found else 0
+    text = content[start:start + width]
+    if start:
+        text = "…" + text
+    if start + width < len(content):
+        text += "…"
+    # markdown in the message itself would fight with our bold
+    text = discord.utils.escape_markdown(text)
+    return pattern.sub(lambda m: f"**{m.group(0)}**", text) if pattern else text
+
+
+def can_read(channel, member) -> bool:
+    """Whether member could scroll back through channel themselves"""
+    permissions = channel.permissions_for(member)
+    return permissions.view_channel and permissions.read_message_history
+
+
+class SearchCog(commands.Cog):
+    """Cog for full-text search over stored messages"""
+    
+    def __init__(self, bot):
+        self.bot = bot
+    
+    async def readable_channels(self, interaction: discord.Interaction) -> list:
+        """Ids of the server's monitored channels the user is allowed to read"""
+        guild = interaction.guild
+        channel_ids = []
+        for row in await get_monitored_channels():
+            if row['guild_id'] != guild.id:
+                continue
+            channel = guild.get_channel_or_thread(row['channel_id'])
+            if channel is not None and can_read(channel, interaction.user):
+                channel_ids.append(channel.id)
+        return channel_ids
+    
+    @app_commands.command(name="search", description="Search stored messages")
+    @app_commands.describe(
+        query="Words to look for (every word has to match)",
+        scope="Search this channel only or every monitored channel on the server"
+    )
+    @app_commands.choices(scope=[
+        app_commands.Choice(name="This channel", value="channel"),
+        app_commands.Choice(name="Whole server", value="server"),
+    ])
+    async def search(self, interaction: discord.Interaction, query: app_commands.Range[str, 1, 200],
+                     scope: app_commands.Choice[str] = None):
+        """Show the best matching stored messages, with links to jump to them"""
+        
+        guild_id = interaction.guild.id
+        whole_server = scope is not None and scope.value == "server"
+        
+        if not whole_server and not await is_channel_monitored(guild_id, interaction.channel.id):
+            await interaction.response.send_message(
+                f"❌ I'm not monitoring **#{interaction.channel.name}** so there's nothing to search bestie. "
+                f"Try the whole server or `/setup` first!",
+                ephemeral=True
+            )
+            return
+        
+        # only channels the user could read anyway, so private channels don't leak through search
+        if whole_server:
+            channel_ids = await self.readable_channels(interaction)
+        else:
+            channel_ids = [interaction.channel.id] if can_read(interaction.channel, interaction.user) else []
+        
+        results = await search_messages(guild_id, channel_ids, query, limit=10)
+        if not results:
+            await interaction.response.send_message(
+                f"🔍 No messages matching **{discord.utils.escape_markdown(query)}**, sorry!",
+                ephemeral=True
+            )
+            return
+        
+        lines = []
+        for msg in results:
+            link = f"https://discord.com/channels/{guild_id}/{msg['channel_id']}/{msg['message_id']}"
+            where = f" in <#{msg['channel_id']}>" if whole_server else ""
+            lines.append(f"**{discord.utils.escape_markdown(msg['author_name'])}**{where} <t:{msg['ts'] // 1000}:R> "
+                         f"[jump]({link})\n{snippet(msg['content'], query)}")
+        
+        embed = discord.Embed(
+            title=f"🔍 Results for \"{query[:80]}\"",
+            description="\n\n".join(lines)[:4096],
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"Best {len(results)} match(es), best first • /summarize has a topic option too")
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
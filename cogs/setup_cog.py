@@ -1,18 +1,32 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+import asyncio
 import logging
-from db.database import (is_channel_monitored, add_monitored_channel, 
+from config import BACKFILL_ENABLED, BACKFILL_LOOKBACK_HOURS
+from db.aio import (is_channel_monitored, add_monitored_channel, 
                         remove_monitored_channel, get_channel_info, 
-                        get_message_count, channel_exists_in_db)
+                        get_message_count, channel_exists_in_db, set_retention_policy)
 
 logger = logging.getLogger(__name__)
 
 class SetupCog(commands.Cog):
     """Cog for bot setup commands"""
     
-    def __init__(self, bot):
+    def __init__(self, bot, backfiller=None):
         self.bot = bot
+        self.backfiller = backfiller if BACKFILL_ENABLED else None
+        # asyncio only keeps weak references to tasks, so running backfills are held here
+        self.backfills = set()
+    
+    async def cog_unload(self):
+        for task in self.backfills:
+            task.cancel()
+    
+    def backfill_done(self, task: asyncio.Task):
+        self.backfills.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Backfill after setup failed: {task.exception()}", exc_info=task.exception())
 
     @app_commands.command(name="setup", description="Set up message monitoring for this channel")
     async def setup(self, interaction: discord.Interaction):
@@ -33,8 +47,8 @@ class SetupCog(commands.Cog):
         username = interaction.user.display_name
         
         # Check if channel is already being monitored
-        if is_channel_monitored(guild_id, channel_id):
-            channel_info = get_channel_info(guild_id, channel_id)
+        if await is_channel_monitored(guild_id, channel_id):
+            channel_info = await get_channel_info(guild_id, channel_id)
             await interaction.response.send_message(
                 f"✅ This channel is already being monitored for message summarization. :D\n"
                 f"Set up by: {channel_info['setup_by_username']} on {channel_info['created_at']}",
@@ -43,10 +57,14 @@ class SetupCog(commands.Cog):
             return
         
         # Check if channel existed before but was disabled
-        was_previously_monitored = channel_exists_in_db(guild_id, channel_id)
+        was_previously_monitored = await channel_exists_in_db(guild_id, channel_id)
+        
+        # Pin where stored history ends before live messages start coming in
+        if self.backfiller:
+            await self.backfiller.mark(channel_id)
         
         # Add/reactivate channel monitoring
-        success = add_monitored_channel(guild_id, channel_id, channel_name, user_id, username)
+        success = await add_monitored_channel(guild_id, channel_id, channel_name, user_id, username)
         if not success:
             await interaction.response.send_message(
                 "❌ ermmm failed to set up channel monitoring. Please try again.",
@@ -74,9 +92,40 @@ class SetupCog(commands.Cog):
                   "• Use `/unset` to stop monitoring this channel",
             inline=False
         )
+        if self.backfiller:
+            embed.add_field(
+                name="Catching up",
+                value=f"Grabbing up to the last {BACKFILL_LOOKBACK_HOURS}h of history in the background 👀",
+                inline=False
+            )
         embed.set_footer(text=f"Set up by {username}")
         
         await interaction.response.send_message(embed=embed)
+        
+        if self.backfiller:
+            task = asyncio.create_task(self.backfill_after_setup(interaction),
+                                       name=f"backfill-{channel_id}")
+            self.backfills.add(task)
+            task.add_done_callback(self.backfill_done)
+
+    async def backfill_after_setup(self, interaction: discord.Interaction):
+        """Backfill a freshly set up channel and report how it went"""
+        progress = await self.backfiller.backfill_channel(interaction.channel)
+        try:
+            if progress['error']:
+                await interaction.followup.send(
+                    f"⚠️ Couldn't read the history of this channel ({progress['error']}), "
+                    f"I'll only have messages from now on.",
+                    ephemeral=True
+                )
+            else:
+                note = " (hit the cap, older stuff skipped)" if progress['truncated'] else ""
+                await interaction.followup.send(
+                    f"📥 Caught up on {progress['stored']} earlier message(s){note}. :D",
+                    ephemeral=True
+                )
+        except discord.HTTPException as e:
+            logger.warning(f"Could not report backfill for #{progress['channel_name']}: {e}")
 
     @app_commands.command(name="unset", description="Stop monitoring this channel")
     async def unset(self, interaction: discord.Interaction):
@@ -94,7 +143,7 @@ class SetupCog(commands.Cog):
         channel_id = interaction.channel.id
         channel_name = interaction.channel.name
         
-        if not is_channel_monitored(guild_id, channel_id):
+        if not await is_channel_monitored(guild_id, channel_id):
             await interaction.response.send_message(
                 "❌ errmmm this channel is not currently being monitored for message summarization.",
                 ephemeral=True
@@ -102,7 +151,7 @@ class SetupCog(commands.Cog):
             return
         
         # Remove channel from monitoring
-        success = remove_monitored_channel(guild_id, channel_id)
+        success = await remove_monitored_channel(guild_id, channel_id)
         if not success:
             await interaction.response.send_message(
                 "❌ ermmm failed to stop monitoring this channel. SORRY Please try again.",
@@ -133,9 +182,9 @@ class SetupCog(commands.Cog):
         channel_id = interaction.channel.id
         channel_name = interaction.channel.name
         
-        if is_channel_monitored(guild_id, channel_id):
-            channel_info = get_channel_info(guild_id, channel_id)
-            message_count = get_message_count(guild_id, channel_id)
+        if await is_channel_monitored(guild_id, channel_id):
+            channel_info = await get_channel_info(guild_id, channel_id)
+            message_count = await get_message_count(guild_id, channel_id)
             
             embed = discord.Embed(
                 title="✅ Channel Status: Active",
@@ -145,6 +194,12 @@ class SetupCog(commands.Cog):
             embed.add_field(name="Set up by", value=channel_info['setup_by_username'], inline=True)
             embed.add_field(name="Set up on", value=channel_info['created_at'], inline=True)
             embed.add_field(name="Messages stored", value=str(message_count), inline=True)
+            digest_hours = channel_info.get('digest_hours') or 0
+            embed.add_field(
+                name="Digest",
+                value=f"Every {digest_hours}h" if digest_hours else "Off (`/digest` to turn on)",
+                inline=True
+            )
             
         else:
             embed = discord.Embed(
@@ -158,4 +213,49 @@ class SetupCog(commands.Cog):
                 inline=False
             )
         
-        await interaction.response.send_message(embed=embed, ephemeral=True)
\ No newline at end of file
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="retention", description="Set how long stored messages are kept")
+    @app_commands.describe(
+        days="Days to keep messages (0 = keep forever)",
+        scope="Apply to this channel only or the whole server"
+    )
+    @app_commands.choices(scope=[
+        app_commands.Choice(name="This channel", value="channel"),
+        app_commands.Choice(name="Whole server", value="server"),
+    ])
+    async def retention(self, interaction: discord.Interaction, days: app_commands.Range[int, 0, 3650],
+                        scope: app_commands.Choice[str] = None):
+        """Set the message retention period for this channel or server"""
+        
+        # Check if user has manage channels permission
+        if not interaction.user.guild_permissions.manage_channels:
+            await interaction.response.send_message(
+                "❌ You need 'Manage Channels' permission to change retention.", 
+                ephemeral=True
+            )
+            return
+        
+        guild_id = interaction.guild.id
+        whole_server = scope is not None and scope.value == "server"
+        # channel_id 0 is the server-wide default
+        channel_id = 0 if whole_server else interaction.channel.id
+        
+        success = await set_retention_policy(guild_id, channel_id, days)
+        if not success:
+            await interaction.response.send_message(
+                "❌ ermmm failed to update retention. Please try again.",
+                ephemeral=True
+            )
+            return
+        
+        target = "this server" if whole_server else f"**#{interaction.channel.name}**"
+        kept = "forever" if days == 0 else f"for {days} day{'s' if days != 1 else ''}"
+        embed = discord.Embed(
+            title="✅ Retention Updated",
+            description=f"Messages in {target} will now be kept {kept}.",
+            color=discord.Color.green()
+        )
+        embed.set_footer(text=f"Changed by {interaction.user.display_name}")
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
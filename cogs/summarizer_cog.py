@@ -1,24 +1,84 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import logging
-import google.generativeai as genai
+import asyncio
+import time
 import os
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-from db.database import (is_channel_monitored, get_messages, get_message_count, 
-                        get_messages_by_timeframe)
+from db.database import get_messages
+from db.aio import is_channel_monitored, get_latest_message_id, run_read
+from config import (GEMINI_TIMEOUT, BLOCK_SUMMARIES_ENABLED, PRIMARY_CLUSTER, SUMMARY_STREAMING,
+                    STREAM_EDIT_INTERVAL, SUMMARY_FALLBACK, SUMMARY_FALLBACK_HIGHLIGHTS, SUMMARY_CONCURRENCY,
+                    SUMMARY_GUILD_PER_HOUR, SUMMARY_GUILD_BURST, SUMMARY_GUILD_WEIGHTS)
+from summarizer.coalesce import RequestCoalescer
+from summarizer.cache import SummaryCache
+from summarizer.blocks import BlockSummarizer
+from summarizer.prompt import PromptBuilder, chunk_prompt, estimate_tokens
+from summarizer.scheduler import SummaryScheduler, QuotaExceeded
+from utils.metrics import (LLM_SECONDS, LLM_TOKENS, LLM_FIRST_TOKEN_SECONDS, SUMMARY_FIRST_CONTENT_SECONDS,
+                           Gauge)
+from utils.streaming import EmbedStream
 
 logger = logging.getLogger(__name__)
 
+
+def load_gemini_model():
+    """Import and configure the Gemini client (slow: google.generativeai pulls in grpc and protobuf)"""
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    return genai.GenerativeModel('gemini-2.0-flash-exp')
+
 class SummarizerCog(commands.Cog):
     """Cog for message summarization using Google Gemini"""
     
     def __init__(self, bot):
         self.bot = bot
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        # Gemini client, created on first use so startup doesn't pay for the import
+        self.model = None
+        self._model_lock = asyncio.Lock()
+        # identical /summarize calls that overlap share one generation
+        self.coalescer = RequestCoalescer()
+        # generations wait here for a slot, fairly across guilds and within each guild's quota
+        self.scheduler = SummaryScheduler(SUMMARY_CONCURRENCY, SUMMARY_GUILD_PER_HOUR, SUMMARY_GUILD_BURST,
+                                          SUMMARY_GUILD_WEIGHTS)
+        # the same cap on actual Gemini calls: block summaries and map chunks don't hold scheduler slots
+        self.model_slots = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+        # keeps prompts inside the model's context budget
+        self.prompt_builder = PromptBuilder()
+        # finished summaries, reused until a new message lands in the window
+        self.cache = SummaryCache()
+        # background map step: summarize closed time blocks ahead of time
+        self.blocks = None
+        if BLOCK_SUMMARIES_ENABLED:
+            self.blocks = BlockSummarizer(self.call_model, self.format_message_lines)
+        Gauge('discordsum_summary_cache_entries', "Summaries held in memory", lambda: len(self.cache))
+        Gauge('discordsum_summaries_in_flight', "Distinct summary windows being generated",
+              self.coalescer.inflight)
+        Gauge('discordsum_summary_queue_depth', "Summaries waiting for a generation slot", self.scheduler.depth)
+        Gauge('discordsum_summaries_generating', "Summaries holding a generation slot",
+              lambda: self.scheduler.running)
+    
+    async def cog_load(self):
+        # in a cluster only one process summarizes blocks (it covers every channel)
+        if self.blocks and PRIMARY_CLUSTER:
+            self.block_summary_loop.start()
+    
+    async def cog_unload(self):
+        self.block_summary_loop.cancel()
+    
+    @tasks.loop(seconds=60)
+    async def block_summary_loop(self):
+        """Summarize any time blocks that closed since the last tick"""
+        try:
+            await self.blocks.run_once()
+        except Exception as e:
+            logger.error(f"Block summary pass failed: {e}")
+    
+    @block_summary_loop.before_loop
+    async def before_block_summary_loop(self):
+        await self.bot.wait_until_ready()
 
     
     def get_messages_in_timeframe_backup(self, guild_id: int, channel_id: int, hours: int) -> List[Dict]:
@@ -46,33 +106,25 @@ class SummarizerCog(commands.Cog):
         if not messages:
             return f"No messages found in #{channel_name} from the last {hours} hour(s)."
         
-        formatted = f"Discord Channel: #{channel_name}\n"
-        formatted += f"Messages from the last {hours} hour(s) ({len(messages)} total messages):\n\n"
-        
-        for msg in messages:
-            # Parse timestamp to make it more readable
-            timestamp_str = msg['timestamp']
-            try:
-                # Your format: 2025-08-17 00:09:56.151000+00:00
-                dt = datetime.fromisoformat(timestamp_str)
-                readable_time = dt.strftime('%H:%M:%S')  # Just show time like 00:09:56
-            except:
-                readable_time = timestamp_str  
-            
-            author = msg['author_name']
-            content = msg['content'] or "[No text content]"
-            
-            # Handle attachments
-            if msg.get('has_attachments'):
-                content += " [Has attachments]"
-            
-            # Handle replies
-            if msg.get('reply_to'):
-                content = f"[Reply] {content}"
-            
-            formatted += f"[{readable_time}] {author}: {content}\n"
-        
-        return formatted
+        return self.transcript_header(channel_name, hours, len(messages)) + self.format_message_lines(messages)
+    
+    def transcript_header(self, channel_name: str, hours: int, message_count: int, topic: str = None) -> str:
+        """First lines of every transcript we send"""
+        focus = ""
+        if topic:
+            focus = (f"Only messages about \"{topic}\" and the replies around them are included, "
+                     f"keep the summary focused on that topic.\n")
+        return (f"Discord Channel: #{channel_name}\n{focus}"
+                f"Messages from the last {hours} hour(s) ({message_count} total messages):\n\n")
+    
+    def format_message_lines(self, messages: List[Dict]) -> str:
+        """Format messages (oldest first) as a compact transcript that fits the token budget"""
+        if not messages:
+            return ""
+        transcript = self.prompt_builder.build(reversed(messages), overflow='truncate')
+        if transcript['messages_dropped']:
+            logger.info(f"Transcript over budget, dropped {transcript['messages_dropped']} oldest message(s)")
+        return transcript['chunks'][0]
     
     def create_summarization_prompt(self, formatted_messages: str, channel_name: str, hours: int) -> str:
         """Prompt for Gemini"""
@@ -95,33 +147,213 @@ class SummarizerCog(commands.Cog):
                     """
         return prompt
     
-    async def generate_summary(self, messages: List[Dict], channel_name: str, hours: int) -> str:
-        """Generate summary using Google Gemini"""
+    async def try_generate_summary(self, messages: List[Dict], channel_name: str, hours: int) -> tuple:
+        """Generate summary using Google Gemini, returns (summary, ok)"""
+        if not messages:
+            return f"Bestie, #{channel_name} was dead silent for the past {hours} hour(s) LOL. Not a single message! Everyone must be touching grass or something idk", True
+        
+        # Format messages for AI
+        formatted_messages = self.format_messages_for_ai(messages, channel_name, hours)
+        return await self.run_summary_prompt(formatted_messages, channel_name, hours)
+    
+    async def summarize_transcript(self, transcript: dict, channel_name: str, hours: int,
+                                   on_text=None, topic: str = None) -> tuple:
+        """Summarize a PromptBuilder result, map-reducing if it came back in several chunks"""
+        used = transcript['messages_used']
+        logger.info(f"Prompt for #{channel_name} ({hours}h): {used} messages / ~{transcript['tokens_used']} tokens "
+                    f"in {len(transcript['chunks'])} chunk(s), dropped {transcript['messages_dropped']} "
+                    f"messages / ~{transcript['tokens_dropped']} tokens")
+        if not used:
+            if topic:
+                return f"Nobody said anything about **{topic}** in #{channel_name} in the past {hours} hour(s) 🤷 Try another word?", True
+            if transcript['messages_dropped']:
+                return f"#{channel_name} had {transcript['messages_dropped']} message(s) in the past {hours} hour(s) but it was all 'lol's, emojis and copy-paste 💀 Nothing to summarize fr", True
+            return await self.try_generate_summary([], channel_name, hours)
+        
+        header = self.transcript_header(channel_name, hours, used, topic)
+        chunks = transcript['chunks']
+        if len(chunks) == 1:
+            return await self.run_summary_prompt(header + chunks[0], channel_name, hours, on_text)
+        
+        # map: notes per chunk, reduce: the normal summary prompt over the notes
+        # (call_model's slots keep the chunks from all hitting Gemini at once)
+        try:
+            notes = await asyncio.gather(*[
+                self.call_model(chunk_prompt(chunk, channel_name, i + 1, len(chunks)))
+                for i, chunk in enumerate(chunks)
+            ])
+        except Exception as e:
+            logger.error(f"Map step failed for #{channel_name}: {e}")
+            return f"Ermmm, something went wrong while trying to summarize  mb gang. Error: {str(e)}", False
+        
+        formatted = header + "Notes for each part of the window, in order:\n\n" + "\n\n".join(
+            f"[Part {i + 1}]\n{n.strip()}" for i, n in enumerate(notes))
+        # only the reduce step streams, the notes are never shown
+        return await self.run_summary_prompt(formatted, channel_name, hours, on_text)
+    
+    async def run_summary_prompt(self, formatted_messages: str, channel_name: str, hours: int,
+                                 on_text=None) -> tuple:
+        """Wrap already formatted chat text in the summary prompt and run it, returns (summary, ok)"""
         try:
-            if not messages:
-                return f"Bestie, #{channel_name} was dead silent for the past {hours} hour(s) LOL. Not a single message! Everyone must be touching grass or something idk"
-            
-            # Format messages for AI
-            formatted_messages = self.format_messages_for_ai(messages, channel_name, hours)
-            
             # Create prompt
             prompt = self.create_summarization_prompt(formatted_messages, channel_name, hours)
             
-            # Generate summary
-            response = self.model.generate_content(prompt)
+            # Generate summary without blocking the event loop
+            text = await self.call_model(prompt, on_text)
             
-            if response.text:
-                return response.text
+            if text:
+                return text, True
             else:
-                return f"Oop, Gemini decided to be mysterious and didn't give me a summary 🤷‍♀️ Maybe try again?"
+                return f"Oop, Gemini decided to be mysterious and didn't give me a summary 🤷‍♀️ Maybe try again?", False
                 
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini timed out after {GEMINI_TIMEOUT}s summarizing #{channel_name}")
+            return f"Gemini took too long to answer (>{GEMINI_TIMEOUT:.0f}s) and I got bored waiting 😴 Try again in a bit!", False
         except Exception as e:
             logger.error(f"Error generating summary: {e}")
-            return f"Ermmm, something went wrong while trying to summarize  mb gang. Error: {str(e)}"
+            return f"Ermmm, something went wrong while trying to summarize  mb gang. Error: {str(e)}", False
+    
+    async def get_model(self):
+        """The Gemini model, loaded in a thread the first time it's needed"""
+        if self.model is None:
+            async with self._model_lock:
+                if self.model is None:
+                    started = time.perf_counter()
+                    self.model = await asyncio.to_thread(load_gemini_model)
+                    logger.info(f"Loaded the Gemini client in {time.perf_counter() - started:.2f}s")
+        return self.model
+    
+    async def call_model(self, prompt: str, on_text=None) -> str:
+        """Send a prompt to Gemini, raises on errors and timeouts.
+        
+        With on_text the response is streamed and on_text(text so far) is
+        awaited after every chunk. At most SUMMARY_CONCURRENCY calls run at
+        once, the rest wait for a slot before their timeout starts.
+        """
+        model = await self.get_model()
+        async with self.model_slots:
+            return await self._call_model(model, prompt, on_text)
+    
+    async def _call_model(self, model, prompt: str, on_text) -> str:
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            if on_text is None:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(prompt),
+                    timeout=GEMINI_TIMEOUT
+                )
+                text = response.text
+            else:
+                response, text = await asyncio.wait_for(
+                    self.stream_model(model, prompt, on_text, started),
+                    timeout=GEMINI_TIMEOUT
+                )
+            outcome = 'ok'
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            raise
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, outcome)
+        
+        # real token counts when Gemini reports them, our estimate otherwise
+        usage = getattr(response, 'usage_metadata', None)
+        LLM_TOKENS.observe(getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt), 'prompt')
+        LLM_TOKENS.observe(getattr(usage, 'candidates_token_count', None) or estimate_tokens(text), 'response')
+        return text
+    
+    async def stream_model(self, model, prompt: str, on_text, started: float) -> tuple:
+        """Stream a Gemini response, returns (response, full text)"""
+        response = await model.generate_content_async(prompt, stream=True)
+        text = ""
+        async for chunk in response:
+            if not chunk.text:
+                continue
+            if not text:
+                LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+            text += chunk.text
+            await on_text(text)
+        return response, text
+    
+    async def summarize_window(self, guild_id: int, channel_id: int, channel_name: str, hours: int,
+                               on_text=None, topic: str = None, on_queue=None, charge: bool = True) -> tuple:
+        """Read the window and summarize it, returns (summary, message count, ok)
+        
+        on_text gets the summary as it's written when it's generated fresh
+        (cache hits return straight away). With a topic only matching
+        messages and their reply context are summarized. Generating waits
+        for the scheduler, which awaits on_queue(place in line) meanwhile
+        and raises QuotaExceeded when the guild is out of quota (unless
+        charge is False). A summary that failed doesn't count against the
+        quota.
+        """
+        if topic:
+            # found through the search index, not cached (the cache is per whole window)
+            return await self.schedule(
+                guild_id, lambda: self.summarize_topic(guild_id, channel_id, channel_name, hours, topic, on_text),
+                on_queue, charge)
+        
+        # The newest message id acts as a version for the window
+        watermark = await get_latest_message_id(guild_id, channel_id, hours)
+        if watermark is not None:
+            cached = await self.cache.get(guild_id, channel_id, hours, watermark)
+            if cached:
+                logger.debug(f"Summary cache hit for #{channel_name} ({hours}h)")
+                return cached['summary'], cached['message_count'], True
+        
+        return await self.schedule(
+            guild_id, lambda: self.generate_window(guild_id, channel_id, channel_name, hours, watermark, on_text),
+            on_queue, charge)
+    
+    async def schedule(self, guild_id: int, factory, on_queue, charge: bool) -> tuple:
+        """Run a (summary, message count, ok) factory through the scheduler, refunding the quota if not ok"""
+        result = await self.scheduler.run(guild_id, factory, on_position=on_queue, charge=charge)
+        if charge and not result[2]:
+            self.scheduler.refund(guild_id)
+        return result
+    
+    async def summarize_topic(self, guild_id: int, channel_id: int, channel_name: str, hours: int,
+                              topic: str, on_text=None) -> tuple:
+        """Summarize the messages about topic in the window, returns (summary, message count, ok)"""
+        transcript = await run_read(self.prompt_builder.build_topic_from_db, guild_id, channel_id, hours, topic)
+        summary, ok = await self.summarize_transcript(transcript, channel_name, hours, on_text, topic)
+        return summary, transcript['messages_used'], ok
+    
+    async def generate_window(self, guild_id: int, channel_id: int, channel_name: str, hours: int,
+                              watermark: Optional[int], on_text=None) -> tuple:
+        """Summarize the window fresh and cache it under watermark, returns (summary, message count, ok)"""
+        # Prefer merging precomputed block summaries over one giant prompt
+        window = None
+        if self.blocks:
+            window = await self.blocks.build_window(guild_id, channel_id, hours)
+        
+        if window and window['message_count']:
+            formatted_messages = self.blocks.format_window(window, channel_name, hours)
+            summary, ok = await self.run_summary_prompt(formatted_messages, channel_name, hours, on_text)
+            message_count = window['message_count']
+        else:
+            # stream the window out of sqlite through the token budget
+            transcript = await run_read(self.prompt_builder.build_from_db, guild_id, channel_id, hours)
+            summary, ok = await self.summarize_transcript(transcript, channel_name, hours, on_text)
+            message_count = transcript['messages_used']
+        
+        # only cache real summaries, not errors/timeouts
+        if ok and watermark is not None:
+            await self.cache.put(guild_id, channel_id, hours, watermark, summary, message_count)
+        elif not ok and SUMMARY_FALLBACK:
+            # Gemini let us down, pick out the highlights ourselves
+            try:
+                picked = await run_read(self.prompt_builder.highlights_from_db, guild_id, channel_id, hours,
+                                        SUMMARY_FALLBACK_HIGHLIGHTS)
+                summary = f"{summary}\n\n**Here's what stood out instead:**\n{picked}"
+            except Exception as e:
+                logger.error(f"Fallback highlights failed for #{channel_name}: {e}")
+        return summary, message_count, ok
     
     @app_commands.command(name="summarize", description="Get a fun summary of recent channel messages")
     @app_commands.describe(
-        hours="How many hours back to summarize (1-5)"
+        hours="How many hours back to summarize",
+        topic="Only summarize messages about this (and the replies around them)"
     )
     @app_commands.choices(hours=[
         app_commands.Choice(name="1 hour ago", value=1),
@@ -129,8 +361,11 @@ class SummarizerCog(commands.Cog):
         app_commands.Choice(name="3 hours ago", value=3),
         app_commands.Choice(name="4 hours ago", value=4),
         app_commands.Choice(name="5 hours ago", value=5),
+        app_commands.Choice(name="12 hours ago", value=12),
+        app_commands.Choice(name="24 hours ago", value=24),
     ])
-    async def summarize(self, interaction: discord.Interaction, hours: app_commands.Choice[int]):
+    async def summarize(self, interaction: discord.Interaction, hours: app_commands.Choice[int],
+                        topic: app_commands.Range[str, 1, 100] = None):
         """Generate a summary of recent messages in this channel"""
         
         # Check if channel is being monitored
@@ -138,7 +373,7 @@ class SummarizerCog(commands.Cog):
         channel_id = interaction.channel.id
         channel_name = interaction.channel.name
         
-        if not is_channel_monitored(guild_id, channel_id):
+        if not await is_channel_monitored(guild_id, channel_id):
             embed = discord.Embed(
                 title="❌ Channel Not Monitored",
                 description=f"Sorry bestie! I'm not monitoring **#{channel_name}** yet, so I can't summarize it\n\nUse `/setup` first to start monitoring this channel!",
@@ -148,35 +383,53 @@ class SummarizerCog(commands.Cog):
             return
         
         # Defer response since AI generation might take time
+        started = time.perf_counter()
         await interaction.response.defer()
         
         try:
-            # Get messages from timeframe using the optimized database function
             hours_value = hours.value
-            messages = get_messages_by_timeframe(guild_id, channel_id, hours_value)
+            # Show the summary while Gemini is still writing it, long ones continue in more messages
+            stream = EmbedStream(
+                lambda embed: interaction.followup.send(embed=embed, wait=True),
+                title=(f"Channel Summary{f' - {topic}' if topic else ''} - "
+                       f"Last {hours_value} Hour{'s' if hours_value > 1 else ''}"),
+                color=discord.Color.blue(),
+                interval=STREAM_EDIT_INTERVAL
+            )
             
-            # Generate summary
-            summary = await self.generate_summary(messages, channel_name, hours_value)
+            # Read + summarize, sharing the work (and the stream) with anyone asking for the same window right now
+            key = (guild_id, channel_id, hours_value) + ((topic.lower(),) if topic else ())
             
-            # Create embed
-            embed = discord.Embed(
-                title=f"Channel Summary - Last {hours_value} Hour{'s' if hours_value > 1 else ''}",
-                description=summary,
-                color=discord.Color.blue()
-            )
+            async def show_place(position: int):
+                # goes out like streamed text, so people who joined this request see it too
+                await self.coalescer.publish(key, f"⏳ Gemini's busy rn, you're **#{position}** in line..."
+                                             if position else "🧠 Your turn! Reading the chat...")
             
-            embed.add_field(
-                name="Stats",
-                value=f"**Messages analyzed:** {len(messages)}\n**Channel:** #{channel_name}\n**Timeframe:** {hours_value} hour{'s' if hours_value > 1 else ''}",
-                inline=True
+            summary, message_count, _ = await self.coalescer.run(
+                key,
+                lambda: self.summarize_window(guild_id, channel_id, channel_name, hours_value,
+                                              (lambda text: self.coalescer.publish(key, text))
+                                              if SUMMARY_STREAMING else None,
+                                              topic, on_queue=show_place),
+                on_progress=stream.update
             )
             
-            embed.set_footer(
-                text=f"Summary requested by {interaction.user.display_name} • Powered by Google Gemini"
+            await stream.finish(
+                summary,
+                fields=[("Stats", f"**Messages analyzed:** {message_count}\n**Channel:** #{channel_name}\n**Timeframe:** {hours_value} hour{'s' if hours_value > 1 else ''}")],
+                footer=f"Summary requested by {interaction.user.display_name} • Powered by Google Gemini"
             )
+            SUMMARY_FIRST_CONTENT_SECONDS.observe(stream.first_shown - started)
             
-            await interaction.followup.send(embed=embed)
-            
+        except QuotaExceeded as e:
+            logger.info(f"Summary quota used up in guild {guild_id}")
+            embed = discord.Embed(
+                title="⏳ Slow Down Bestie",
+                description=(f"This server asked for a lot of summaries lately and Gemini needs a breather 😮‍💨\n\n"
+                             f"You can summarize again <t:{int(time.time() + e.retry_after)}:R>!"),
+                color=discord.Color.orange()
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
         except Exception as e:
             logger.error(f"Error in summarize command: {e}")
             error_embed = discord.Embed(
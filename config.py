@@ -8,9 +8,119 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 if not DISCORD_TOKEN:
     raise ValueError("DISCORD_TOKEN env var is required")
+# slash command sync on startup: 'auto' only when the commands changed since the last sync,
+# 'always' or 'never'
+COMMAND_SYNC = os.getenv('COMMAND_SYNC', 'auto').lower()
+
+# Gateway profile: 'default' keeps discord.py's caches, 'lean' trims intents
+# and caches we never read (everything we need is in sqlite)
+GATEWAY_PROFILE = os.getenv('GATEWAY_PROFILE', 'default').lower()
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', '0'))  # lean profile only, 0 = no message cache
+
+# Sharding / cluster config (set by cluster.py for each process)
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None  # None = ask Discord
+SHARD_IDS = [int(s) for s in os.getenv('SHARD_IDS').split(',')] if os.getenv('SHARD_IDS') else None
+CLUSTER_ID = int(os.getenv('CLUSTER_ID', '0'))
+# only one process runs the background jobs (retention, block summaries)
+PRIMARY_CLUSTER = CLUSTER_ID == 0
+HEALTH_LOG_INTERVAL = float(os.getenv('HEALTH_LOG_INTERVAL', '300'))
 
 # Database config
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///discord_summarizer.db')
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', '4'))
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')  # NORMAL is safe with WAL
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '65536'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+# Partitioning: 'none' (one file), 'guild' (a file per guild) or 'bucket' (guilds hashed into N files)
+DB_PARTITION_MODE = os.getenv('DB_PARTITION_MODE', 'none').lower()
+DB_PARTITION_BUCKETS = int(os.getenv('DB_PARTITION_BUCKETS', '16'))
+DB_PARTITION_DIR = os.getenv('DB_PARTITION_DIR', '')  # empty = <database name>_partitions next to it
+DB_PARTITION_MAX_OPEN = int(os.getenv('DB_PARTITION_MAX_OPEN', '32'))  # LRU of open partition files
+DB_PARTITION_READERS = int(os.getenv('DB_PARTITION_READERS', '2'))  # reader pool per open partition
+# host:port or a unix socket path of the shared writer process, empty = write in-process
+DB_WRITER_ADDRESS = os.getenv('DB_WRITER_ADDRESS', '')
+DB_WRITER_AUTHKEY = os.getenv('DB_WRITER_AUTHKEY', '')
+CONTENT_COMPRESS_MIN_BYTES = int(os.getenv('CONTENT_COMPRESS_MIN_BYTES', '256'))  # compress content at least this long
 
 # Logging Configuration
-LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
\ No newline at end of file
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+# Metrics config (counters/histograms for /botstats and a Prometheus endpoint)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 = no HTTP endpoint, cluster N listens on port + N
+
+# Event loop watchdog (logs the blocking stack when the loop stalls) + /profile
+LOOP_WATCHDOG_ENABLED = os.getenv('LOOP_WATCHDOG_ENABLED', 'true').lower() == 'true'
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', '0.1'))  # seconds between heartbeats
+LOOP_STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD', '0.5'))  # blocked this long = capture the stack
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '120'))
+
+# Gemini config
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '60'))
+# stream /summarize into the reply as Gemini writes it, editing at most once per interval
+SUMMARY_STREAMING = os.getenv('SUMMARY_STREAMING', 'true').lower() == 'true'
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+
+# Summary scheduling: a global cap on generations, a per-guild quota and fair queuing between guilds
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '4'))  # generations (and Gemini calls) at once, per process
+SUMMARY_GUILD_PER_HOUR = float(os.getenv('SUMMARY_GUILD_PER_HOUR', '30'))  # 0 = no quota
+SUMMARY_GUILD_BURST = int(os.getenv('SUMMARY_GUILD_BURST', '5'))
+# "guild_id:weight,..." gives those guilds a bigger share of the queue (default weight 1)
+SUMMARY_GUILD_WEIGHTS = {int(g): float(w) for g, w in
+                         (pair.split(':') for pair in os.getenv('SUMMARY_GUILD_WEIGHTS', '').split(',') if pair)}
+
+# Summary cache config
+SUMMARY_CACHE_SIZE = int(os.getenv('SUMMARY_CACHE_SIZE', '256'))
+SUMMARY_CACHE_TTL = float(os.getenv('SUMMARY_CACHE_TTL', '1800'))
+SUMMARY_CACHE_PERSIST = os.getenv('SUMMARY_CACHE_PERSIST', 'true').lower() == 'true'
+
+# Block summaries config (background map step for /summarize)
+BLOCK_SUMMARIES_ENABLED = os.getenv('BLOCK_SUMMARIES_ENABLED', 'true').lower() == 'true'
+BLOCK_MINUTES = int(os.getenv('BLOCK_MINUTES', '15'))
+BLOCK_LOOKBACK_HOURS = int(os.getenv('BLOCK_LOOKBACK_HOURS', '24'))
+BLOCK_GRACE_SECONDS = int(os.getenv('BLOCK_GRACE_SECONDS', '60'))
+BLOCK_MAX_PER_TICK = int(os.getenv('BLOCK_MAX_PER_TICK', '8'))
+
+# Prompt budget config
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '24000'))
+PROMPT_MAX_MESSAGE_CHARS = int(os.getenv('PROMPT_MAX_MESSAGE_CHARS', '600'))
+PROMPT_OVERFLOW = os.getenv('PROMPT_OVERFLOW', 'extractive')  # or 'mapreduce' / 'truncate'
+PROMPT_MAX_CHUNKS = int(os.getenv('PROMPT_MAX_CHUNKS', '6'))
+# Extractive pre-ranking (local, no model calls): drop 'lol'/emoji spam and repeats, and cut
+# windows bigger than PROMPT_EXTRACTIVE_TOKENS down to their most informative messages
+PROMPT_DROP_NOISE = os.getenv('PROMPT_DROP_NOISE', 'true').lower() == 'true'
+PROMPT_EXTRACTIVE_TOKENS = int(os.getenv('PROMPT_EXTRACTIVE_TOKENS', '8000'))
+PROMPT_EXTRACTIVE_MAX_MESSAGES = int(os.getenv('PROMPT_EXTRACTIVE_MAX_MESSAGES', '20000'))  # newest ones ranked
+# highlights picked the same way when Gemini fails or times out
+SUMMARY_FALLBACK = os.getenv('SUMMARY_FALLBACK', 'true').lower() == 'true'
+SUMMARY_FALLBACK_HIGHLIGHTS = int(os.getenv('SUMMARY_FALLBACK_HIGHLIGHTS', '8'))
+
+# Scheduled digests config (opt-in per channel with /digest)
+DIGEST_ENABLED = os.getenv('DIGEST_ENABLED', 'true').lower() == 'true'
+DIGEST_CHECK_SECONDS = int(os.getenv('DIGEST_CHECK_SECONDS', '60'))
+DIGEST_CONCURRENCY = int(os.getenv('DIGEST_CONCURRENCY', '2'))  # digests generating at once, per process
+DIGEST_JITTER_SECONDS = int(os.getenv('DIGEST_JITTER_SECONDS', '300'))  # random extra delay per run
+
+# Retention config (0 days = keep forever, the default; servers can opt in with /retention)
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '0'))
+RETENTION_INTERVAL_MINUTES = int(os.getenv('RETENTION_INTERVAL_MINUTES', '60'))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '500'))
+RETENTION_VACUUM_PAGES = int(os.getenv('RETENTION_VACUUM_PAGES', '2000'))
+RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', '')  # empty = don't archive
+
+# History backfill config (fills gaps from downtime and before /setup)
+BACKFILL_ENABLED = os.getenv('BACKFILL_ENABLED', 'true').lower() == 'true'
+BACKFILL_CONCURRENCY = int(os.getenv('BACKFILL_CONCURRENCY', '3'))  # channels at once
+BACKFILL_REQUESTS_PER_SECOND = float(os.getenv('BACKFILL_REQUESTS_PER_SECOND', '2'))  # shared by all channels
+BACKFILL_BURST = int(os.getenv('BACKFILL_BURST', '4'))
+BACKFILL_PAGE_SIZE = int(os.getenv('BACKFILL_PAGE_SIZE', '100'))  # Discord's max per request
+BACKFILL_MAX_MESSAGES = int(os.getenv('BACKFILL_MAX_MESSAGES', '5000'))  # per channel per run
+BACKFILL_LOOKBACK_HOURS = int(os.getenv('BACKFILL_LOOKBACK_HOURS', '24'))  # never go back further than this
+
+# Ingestion config (write-behind queue for on_message)
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '10000'))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '500'))
+INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', '1.0'))
+INGEST_STATS_INTERVAL = float(os.getenv('INGEST_STATS_INTERVAL', '300'))
@@ -0,0 +1,149 @@
+"""
+Awaitable versions of the db.database functions.
+
+Writes run on one dedicated DB thread (matching the single writer
+connection) and reads run on a small reader pool, so coroutines never
+block the event loop on sqlite. In cluster mode (DB_WRITER_ADDRESS set)
+that thread forwards each write to the shared writer process instead.
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import DB_READ_POOL_SIZE, DB_WRITER_ADDRESS, DB_WRITER_AUTHKEY
+from db import database
+from db.writer import RemoteWriter
+from utils.metrics import DB_CALL_SECONDS, DB_WAIT_SECONDS, DB_ERRORS, Gauge
+
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+_read_executor = ThreadPoolExecutor(max_workers=DB_READ_POOL_SIZE, thread_name_prefix='db-reader')
+_remote = RemoteWriter(DB_WRITER_ADDRESS, DB_WRITER_AUTHKEY) if DB_WRITER_ADDRESS else None
+
+# calls submitted but not finished yet, per pool
+_pending = {'read': 0, 'write': 0}
+Gauge('discordsum_db_pending', "DB calls queued or running", lambda: {(k,): v for k, v in _pending.items()},
+      ('pool',))
+
+
+def _timed(call, name: str, pool: str):
+    """Wrap a DB call so it records how long it waited for a thread and how long it ran"""
+    submitted = time.perf_counter()
+
+    def run():
+        started = time.perf_counter()
+        DB_WAIT_SECONDS.observe(started - submitted, pool)
+        try:
+            return call()
+        except Exception:
+            DB_ERRORS.inc(name)
+            raise
+        finally:
+            DB_CALL_SECONDS.observe(time.perf_counter() - started, name)
+    return run
+
+
+async def _submit(executor, pool: str, name: str, call):
+    loop = asyncio.get_running_loop()
+    _pending[pool] += 1
+    try:
+        return await loop.run_in_executor(executor, _timed(call, name, pool))
+    finally:
+        _pending[pool] -= 1
+
+
+async def run_write(func, *args, **kwargs):
+    """Run a sync DB function on the writer thread (or in the writer process)"""
+    if _remote is not None:
+        call = functools.partial(_remote.call, func.__name__, *args, **kwargs)
+    else:
+        call = functools.partial(func, *args, **kwargs)
+    return await _submit(_write_executor, 'write', func.__name__, call)
+
+
+async def run_read(func, *args, **kwargs):
+    """Run a sync DB function on the reader pool"""
+    return await _submit(_read_executor, 'read', func.__name__, functools.partial(func, *args, **kwargs))
+
+
+def _writer(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_write(func, *args, **kwargs)
+    return wrapper
+
+
+def _reader(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_read(func, *args, **kwargs)
+    return wrapper
+
+
+async def is_channel_monitored(guild_id: int, channel_id: int) -> bool:
+    """Registry lookup, only touches the DB if the registry isn't loaded yet"""
+    if not database._registry_loaded:
+        await run_read(database.load_monitored_channels)
+    return database.is_channel_monitored(guild_id, channel_id)
+
+
+load_monitored_channels = _reader(database.load_monitored_channels)
+channel_exists_in_db = _reader(database.channel_exists_in_db)
+get_channel_info = _reader(database.get_channel_info)
+get_message_count = _reader(database.get_message_count)
+get_messages = _reader(database.get_messages)
+get_messages_by_timeframe = _reader(database.get_messages_by_timeframe)
+search_messages = _reader(database.search_messages)
+get_message_stats = _reader(database.get_message_stats)
+get_latest_message_id = _reader(database.get_latest_message_id)
+get_last_message_ids = _reader(database.get_last_message_ids)
+get_saved_summary = _reader(database.get_saved_summary)
+get_monitored_channels = _reader(database.get_monitored_channels)
+get_digest_channels = _reader(database.get_digest_channels)
+get_messages_between = _reader(database.get_messages_between)
+get_block_progress = _reader(database.get_block_progress)
+get_block_summaries = _reader(database.get_block_summaries)
+get_retention_policies = _reader(database.get_retention_policies)
+get_stored_channels = _reader(database.get_stored_channels)
+get_db_size = _reader(database.get_db_size)
+get_bot_state = _reader(database.get_bot_state)
+
+
+async def add_monitored_channel(guild_id: int, channel_id: int, *args) -> bool:
+    """Add/reactivate a channel, then update this process's registry too"""
+    added = await run_write(database.add_monitored_channel, guild_id, channel_id, *args)
+    if added:
+        # the writer may be another process, whose registry isn't ours
+        database._monitored_channels.add((guild_id, channel_id))
+    return added
+
+
+async def remove_monitored_channel(guild_id: int, channel_id: int) -> bool:
+    """Deactivate a channel, then update this process's registry too"""
+    removed = await run_write(database.remove_monitored_channel, guild_id, channel_id)
+    database._monitored_channels.discard((guild_id, channel_id))
+    return removed
+
+
+store_message = _writer(database.store_message)
+store_messages = _writer(database.store_messages)
+save_summary = _writer(database.save_summary)
+save_block_summaries = _writer(database.save_block_summaries)
+prune_block_summaries = _writer(database.prune_block_summaries)
+rewind_block_progress = _writer(database.rewind_block_progress)
+set_retention_policy = _writer(database.set_retention_policy)
+set_channel_digest = _writer(database.set_channel_digest)
+mark_digest_sent = _writer(database.mark_digest_sent)
+set_bot_state = _writer(database.set_bot_state)
+delete_messages_before = _writer(database.delete_messages_before)
+incremental_vacuum = _writer(database.incremental_vacuum)
+
+
+async def shutdown():
+    """Finish queued DB work, then close the executors and connections"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _write_executor.shutdown)
+    if _remote is not None:
+        _remote.close()
+    await loop.run_in_executor(None, _read_executor.shutdown)
+    database.close_db()
@@ -0,0 +1,169 @@
+"""
+History backfill.
+
+Pages through channel.history() from now back to the newest stored
+message_id and bulk-inserts each page through store_messages (INSERT OR IGNORE,
+so overlap with live ingestion is harmless). Several channels run at once
+but every page request goes through one shared rate limiter.
+
+Runs for every monitored channel after startup (to fill the gap left by
+downtime) and for a single channel right after /setup. Block summaries
+that were written over the gap before it was filled are rewound, so the
+block loop redoes them with the backfilled messages.
+"""
+
+import asyncio
+import logging
+import time
+import discord
+from config import (BACKFILL_CONCURRENCY, BACKFILL_REQUESTS_PER_SECOND, BACKFILL_BURST,
+                    BACKFILL_PAGE_SIZE, BACKFILL_MAX_MESSAGES, BACKFILL_LOOKBACK_HOURS, BLOCK_MINUTES)
+from db.aio import store_messages, get_last_message_ids, rewind_block_progress
+from db.ingest import message_row
+from db.snowflake import snowflake_from_ms, snowflake_to_ms
+from utils.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryBackfiller:
+    """Fills stored_messages from channel history, a few channels at a time"""
+
+    def __init__(self, concurrency: int = BACKFILL_CONCURRENCY,
+                 rate: float = BACKFILL_REQUESTS_PER_SECOND, burst: int = BACKFILL_BURST,
+                 page_size: int = BACKFILL_PAGE_SIZE, max_messages: int = BACKFILL_MAX_MESSAGES,
+                 lookback_hours: int = BACKFILL_LOOKBACK_HOURS, log_every: int = 10):
+        self.limiter = RateLimiter(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.page_size = page_size
+        self.max_messages = max_messages
+        self.lookback_ms = lookback_hours * 3600000
+        self.log_every = log_every
+        # channel_id -> newest stored message_id, taken before live messages arrive
+        self.resume_points = {}
+        # channel_id -> progress dict of the latest run for that channel
+        self.progress = {}
+        self.stats = {'channels': 0, 'pages': 0, 'fetched': 0, 'stored': 0, 'failures': 0}
+
+    async def snapshot(self):
+        """Remember where each channel's stored history ends.
+
+        Must run before the gateway connects, otherwise the first live
+        messages would move the resume point past the gap.
+        """
+        self.resume_points = await get_last_message_ids()
+
+    async def mark(self, channel_id: int):
+        """Refresh one channel's resume point, call it before the channel starts getting live messages"""
+        self.resume_points[channel_id] = (await get_last_message_ids()).get(channel_id)
+
+    def start_point(self, channel_id: int, now_ms: float = None) -> int:
+        """message_id to page forward from: the resume point, but never older than the lookback"""
+        now_ms = time.time() * 1000 if now_ms is None else now_ms
+        oldest = snowflake_from_ms(now_ms - self.lookback_ms)
+        return max(self.resume_points.get(channel_id) or 0, oldest)
+
+    async def rewind_blocks(self, channel, oldest_message_id: int):
+        """Have the block loop redo every block from the one holding oldest_message_id on"""
+        block_seconds = BLOCK_MINUTES * 60
+        since = snowflake_to_ms(oldest_message_id) // 1000 // block_seconds * block_seconds
+        try:
+            await rewind_block_progress(channel.guild.id, channel.id, since)
+        except Exception as e:
+            logger.error(f"Could not rewind block summaries for #{getattr(channel, 'name', channel.id)}: {e}")
+
+    def progress_summary(self) -> dict:
+        """Totals across the channels of the current/last run"""
+        runs = list(self.progress.values())
+        return {
+            'channels': len(runs),
+            'done': sum(1 for p in runs if p['done']),
+            'fetched': sum(p['fetched'] for p in runs),
+            'stored': sum(p['stored'] for p in runs),
+            'failed': sum(1 for p in runs if p['error']),
+        }
+
+    async def backfill_channels(self, channels: list) -> dict:
+        """Backfill many channels concurrently, returns progress_summary()"""
+        if not channels:
+            return self.progress_summary()
+        started = time.perf_counter()
+        logger.info(f"Backfilling {len(channels)} channel(s)")
+        await asyncio.gather(*(self.backfill_channel(c) for c in channels))
+        summary = self.progress_summary()
+        logger.info(f"Backfill finished: {summary['stored']} new of {summary['fetched']} fetched "
+                    f"message(s) across {summary['done']}/{summary['channels']} channel(s), "
+                    f"{summary['failed']} failed, in {time.perf_counter() - started:.1f}s "
+                    f"(rate limited {self.limiter.waited:.1f}s)")
+        return summary
+
+    async def backfill_channel(self, channel, after: int = None) -> dict:
+        """Page one channel's history from now back to `after` (default: start_point)"""
+        progress = {
+            'channel_id': channel.id,
+            'channel_name': getattr(channel, 'name', str(channel.id)),
+            'pages': 0,
+            'fetched': 0,
+            'stored': 0,
+            'done': False,
+            'truncated': False,
+            'error': None,
+        }
+        self.progress[channel.id] = progress
+        start = self.start_point(channel.id) if after is None else after
+        # page newest -> oldest so a capped run keeps the most recent part of the gap
+        before = None
+        oldest_new = None  # oldest message_id of a page that stored anything
+
+        async with self.semaphore:
+            try:
+                while progress['fetched'] < self.max_messages:
+                    limit = min(self.page_size, self.max_messages - progress['fetched'])
+                    await self.limiter.acquire()
+                    page = [m async for m in channel.history(limit=limit, before=before,
+                                                             after=discord.Object(id=start),
+                                                             oldest_first=False)]
+                    progress['pages'] += 1
+                    self.stats['pages'] += 1
+                    if not page:
+                        break
+
+                    before = discord.Object(id=page[-1].id)
+                    progress['fetched'] += len(page)
+                    # same filter as on_message
+                    rows = [message_row(m) for m in page if not m.author.bot]
+                    if rows:
+                        stored = await store_messages(rows)
+                        progress['stored'] += stored
+                        if stored:
+                            oldest_new = min(r['message_id'] for r in rows)
+
+                    if progress['pages'] % self.log_every == 0:
+                        logger.info(f"Backfill #{progress['channel_name']}: {progress['fetched']} fetched, "
+                                    f"{progress['stored']} new so far")
+                    if len(page) < limit:
+                        break
+                else:
+                    progress['truncated'] = True
+                    logger.warning(f"Backfill #{progress['channel_name']} stopped at the "
+                                   f"{self.max_messages} message cap, older part of the gap is missing")
+                progress['done'] = True
+            except discord.Forbidden:
+                progress['error'] = "missing access"
+                logger.warning(f"Backfill #{progress['channel_name']}: no permission to read history")
+            except Exception as e:
+                progress['error'] = str(e)
+                logger.error(f"Backfill #{progress['channel_name']} failed: {e}")
+
+        if oldest_new is not None:
+            await self.rewind_blocks(channel, oldest_new)
+
+        self.stats['channels'] += 1
+        self.stats['fetched'] += progress['fetched']
+        self.stats['stored'] += progress['stored']
+        if progress['error']:
+            self.stats['failures'] += 1
+        elif progress['stored']:
+            logger.info(f"Backfilled #{progress['channel_name']}: {progress['stored']} new message(s) "
+                        f"in {progress['pages']} page(s)")
+        return progress
@@ -0,0 +1,35 @@
+"""
+Message content encoding.
+
+Short messages are stored as plain TEXT. Anything over the threshold is
+zlib-compressed into a BLOB, as long as that actually makes it smaller.
+stored_messages.content_codec says which one a row holds.
+"""
+
+import zlib
+
+CODEC_PLAIN = 0
+CODEC_ZLIB = 1
+
+DEFAULT_COMPRESS_MIN_BYTES = 256
+
+
+def encode_content(content: str, min_bytes: int = DEFAULT_COMPRESS_MIN_BYTES) -> tuple:
+    """str -> (stored value, codec)"""
+    if content is None:
+        return None, CODEC_PLAIN
+    raw = content.encode('utf-8')
+    if len(raw) >= min_bytes:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return packed, CODEC_ZLIB
+    return content, CODEC_PLAIN
+
+
+def decode_content(value, codec: int) -> str:
+    """(stored value, codec) -> str"""
+    if value is None:
+        return None
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(value).decode('utf-8')
+    return value
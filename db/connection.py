@@ -0,0 +1,123 @@
+"""
+Long-lived SQLite connections.
+
+One writer connection (guarded by a lock) and a small pool of reader
+connections, all opened once and tuned for WAL mode, instead of paying
+for sqlite3.connect() on every query.
+"""
+
+import sqlite3
+import threading
+import queue
+import logging
+from contextlib import contextmanager
+from config import (DB_READ_POOL_SIZE, DB_SYNCHRONOUS, DB_CACHE_SIZE_KB,
+                    DB_MMAP_SIZE, DB_BUSY_TIMEOUT_MS)
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """Owns the writer connection and the reader pool for one database file"""
+
+    def __init__(self, db_file: str, readers: int = DB_READ_POOL_SIZE, writable: bool = True):
+        self.db_file = db_file
+        self.max_readers = max(1, readers)
+        # False when another process owns the writer (cluster mode)
+        self.writable = writable
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection and apply the tuning pragmas"""
+        conn = sqlite3.connect(self.db_file, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}')
+        conn.execute(f'PRAGMA synchronous = {DB_SYNCHRONOUS}')
+        # negative cache_size is in KiB rather than pages
+        conn.execute(f'PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size = {int(DB_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection manager is closed")
+        if not self.writable:
+            raise RuntimeError(f"{self.db_file} is read-only here, writes go through the writer process")
+        if self._writer is None:
+            conn = self._connect()
+            # WAL is persistent in the file, but setting it is cheap and makes sure
+            mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+            if mode.lower() != 'wal':
+                logger.warning(f"Could not enable WAL for {self.db_file} (journal_mode={mode})")
+            self._writer = conn
+            logger.info(f"Opened writer connection to {self.db_file} (journal_mode={mode})")
+        return self._writer
+
+    @contextmanager
+    def writer(self):
+        """The single writer connection, one user at a time"""
+        with self._write_lock:
+            conn = self._get_writer()
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def reader(self):
+        """Borrow a reader connection from the pool"""
+        if self._closed:
+            raise RuntimeError("Connection manager is closed")
+
+        # make sure the writer exists first so the file is in WAL mode before readers attach
+        if self._writer is None and self.writable:
+            with self._write_lock:
+                self._get_writer()
+
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                if self._reader_count < self.max_readers:
+                    self._reader_count += 1
+                    conn = self._connect()
+            if conn is None:
+                # pool exhausted, wait for someone to give one back
+                conn = self._readers.get()
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self):
+        """Close every connection (used on shutdown)"""
+        self._closed = True
+        with self._write_lock:
+            if self._writer is not None:
+                try:
+                    # keep the WAL from growing across restarts
+                    self._writer.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                except sqlite3.Error as e:
+                    logger.warning(f"WAL checkpoint failed on close: {e}")
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self._reader_count = 0
+        logger.info(f"Closed connections to {self.db_file}")
@@ -2,44 +2,138 @@
 Database operations using SQLite
 """
 
-import sqlite3
+import os
+import json
+import time
 import logging
+from collections import defaultdict
 from contextlib import contextmanager
-from datetime import datetime
-from config import DATABASE_URL
+from datetime import datetime, timezone
+from config import (DATABASE_URL, DB_WRITER_ADDRESS, CONTENT_COMPRESS_MIN_BYTES, DB_PARTITION_MODE,
+                    DB_PARTITION_BUCKETS, DB_PARTITION_DIR, DB_PARTITION_MAX_OPEN, DB_PARTITION_READERS)
+from db.codec import encode_content, decode_content
+from db.connection import ConnectionManager
+from db.migrations import migrate, to_epoch_ms
+from db.partitions import PartitionRouter
+from db.search import match_query, index_messages, unindex_messages
+from db.snowflake import snowflake_from_ms
+from db.stats import MS_PER_HOUR
 
 logger = logging.getLogger(__name__)
 
 # Extract database file from URL
 DB_FILE = DATABASE_URL.replace('sqlite:///', '')
 
+# One writer + a small reader pool, opened once for the life of the process.
+# With a shared writer process (cluster mode) this process only reads.
+_manager = ConnectionManager(DB_FILE, writable=not DB_WRITER_ADDRESS)
+
+# Optional per-guild (or per-bucket) files for messages/stats/summaries.
+# The main file then only holds the catalog: monitored_channels + retention_policies.
+PARTITION_DIR = DB_PARTITION_DIR or os.path.splitext(DB_FILE)[0] + '_partitions'
+_partitions = None
+if DB_PARTITION_MODE != 'none':
+    _partitions = PartitionRouter(PARTITION_DIR, DB_PARTITION_MODE, DB_PARTITION_BUCKETS,
+                                  DB_PARTITION_MAX_OPEN, DB_PARTITION_READERS,
+                                  writable=not DB_WRITER_ADDRESS)
+
 @contextmanager
-def get_db():
-    """Get a database connection"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row  
-    try:
-        yield conn
-    except Exception as e:
-        logger.error(f"Database error: {e}")
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+def _storage(guild_id: int = None, create: bool = False):
+    """ConnectionManager holding a guild's messages (the catalog when not partitioned).
 
-def is_channel_monitored(guild_id: int, channel_id: int) -> bool:
-    """Check if a channel is being monitored (active only)"""
+    Reads of a guild without a partition file fall back to the catalog,
+    which is where its rows still are if the DB was never split.
+    """
+    if _partitions is None or guild_id is None or not (create or _partitions.exists(guild_id)):
+        yield _manager
+        return
+    with _partitions.lease(_partitions.key_for(guild_id)) as manager:
+        yield manager
+
+def _each_storage():
+    """Every ConnectionManager that can hold message data, one lease at a time"""
+    yield _manager
+    if _partitions is not None:
+        for key in _partitions.keys():
+            with _partitions.lease(key) as manager:
+                yield manager
+
+@contextmanager
+def get_db(guild_id: int = None):
+    """Get the writer connection (serialized across threads), of a guild's partition if partitioned"""
+    with _storage(guild_id, create=True) as manager, manager.writer() as conn:
+        try:
+            yield conn
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            raise
+
+@contextmanager
+def get_read_db(guild_id: int = None):
+    """Get a pooled reader connection (use for SELECTs only), of a guild's partition if partitioned"""
+    with _storage(guild_id) as manager, manager.reader() as conn:
+        try:
+            yield conn
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            raise
+
+def init_db() -> int:
+    """Create the schema / apply pending migrations, returns the schema version"""
     with get_db() as conn:
+        version = migrate(conn)
+        guilds = [row[0] for row in conn.execute('SELECT DISTINCT guild_id FROM monitored_channels WHERE active = 1')]
+        unsplit = conn.execute('SELECT COUNT(*) FROM channel_stats WHERE message_count > 0').fetchone()[0]
+    if _partitions is not None:
+        if unsplit:
+            logger.warning(f"{unsplit} channel(s) still have messages in {DB_FILE}, "
+                           f"run `python -m db.partitions split` to move them into partitions")
+        # open (and migrate) every partition a monitored guild writes to
+        for key in sorted({_partitions.key_for(g) for g in guilds} | set(_partitions.keys())):
+            with _partitions.lease(key):
+                pass
+        logger.info(f"Partitioned storage ({DB_PARTITION_MODE}) in {PARTITION_DIR}: "
+                    f"{len(_partitions.keys())} partition(s)")
+    return version
+
+def _cutoff_id(hours: float) -> int:
+    """Smallest message_id (snowflake) posted within the last `hours`"""
+    return snowflake_from_ms((time.time() - hours * 3600) * 1000)
+
+def close_db():
+    """Close all pooled connections"""
+    if _partitions is not None:
+        _partitions.close()
+    _manager.close()
+
+# Process-wide registry of active (guild_id, channel_id) pairs.
+# on_message checks this for every message so it has to stay off the DB.
+_monitored_channels = set()
+_registry_loaded = False
+
+def load_monitored_channels() -> int:
+    """(Re)load the monitored channel registry from the database"""
+    global _monitored_channels, _registry_loaded
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT id FROM monitored_channels 
-            WHERE guild_id = ? AND channel_id = ? AND active = 1
-        ''', (guild_id, channel_id))
-        return cursor.fetchone() is not None
+            SELECT guild_id, channel_id FROM monitored_channels
+            WHERE active = 1
+        ''')
+        _monitored_channels = {(row['guild_id'], row['channel_id']) for row in cursor.fetchall()}
+    _registry_loaded = True
+    logger.info(f"Loaded {len(_monitored_channels)} monitored channel(s) into registry")
+    return len(_monitored_channels)
+
+def is_channel_monitored(guild_id: int, channel_id: int) -> bool:
+    """Check if a channel is being monitored (active only)"""
+    if not _registry_loaded:
+        load_monitored_channels()
+    return (guild_id, channel_id) in _monitored_channels
 
 def channel_exists_in_db(guild_id: int, channel_id: int) -> bool:
     """Check if a channel exists in database (active or inactive)"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT id FROM monitored_channels 
@@ -83,7 +177,13 @@ def add_monitored_channel(guild_id: int, channel_id: int, channel_name: str,
                 logger.info(f"Added new channel {channel_name} ({channel_id}) to monitoring")
             
             conn.commit()
-            return True
+        if _partitions is not None:
+            # create the guild's partition now so readers in other processes can find it
+            with _storage(guild_id, create=True):
+                pass
+        # write-through so the registry never lags the table
+        _monitored_channels.add((guild_id, channel_id))
+        return True
     except Exception as e:
         logger.error(f"Failed to add monitored channel: {e}")
         return False
@@ -99,6 +199,7 @@ def remove_monitored_channel(guild_id: int, channel_id: int) -> bool:
                 WHERE guild_id = ? AND channel_id = ?
             ''', (guild_id, channel_id))
             conn.commit()
+            _monitored_channels.discard((guild_id, channel_id))
             logger.info(f"Removed channel {channel_id} from monitoring")
             return cursor.rowcount > 0
     except Exception as e:
@@ -107,7 +208,7 @@ def remove_monitored_channel(guild_id: int, channel_id: int) -> bool:
 
 def get_channel_info(guild_id: int, channel_id: int, active_only: bool = True) -> dict:
     """Get information about a monitored channel"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         
         if active_only:
@@ -132,94 +233,602 @@ def store_message(guild_id: int, channel_id: int, message_id: int,
                  reply_to: int = None) -> bool:
     """Store a message in the database"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR IGNORE INTO stored_messages 
-                (guild_id, channel_id, message_id, author_id, author_name, 
-                 content, timestamp, has_attachments, reply_to)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (guild_id, channel_id, message_id, author_id, author_name, 
-                  content, timestamp, has_attachments, reply_to))
-            conn.commit()
-            return cursor.rowcount > 0
+        return store_messages([{
+            'guild_id': guild_id, 'channel_id': channel_id, 'message_id': message_id,
+            'author_id': author_id, 'author_name': author_name, 'content': content,
+            'timestamp': timestamp, 'has_attachments': has_attachments, 'reply_to': reply_to,
+        }]) > 0
     except Exception as e:
         logger.error(f"Failed to store message {message_id}: {e}")
         return False
 
+def store_messages(messages: list) -> int:
+    """Store a batch of messages, one transaction per partition, returns how many were new.
+
+    Each message is a dict with the same keys as store_message's arguments.
+    Author names go to the authors table (latest message wins), content over
+    CONTENT_COMPRESS_MIN_BYTES is stored compressed and new messages are
+    added to the search index.
+    Errors are raised so the caller can decide what to do with the batch.
+    """
+    if not messages:
+        return 0
+    groups = defaultdict(list)
+    for m in messages:
+        groups[_partitions.key_for(m['guild_id']) if _partitions else None].append(m)
+
+    inserted = 0
+    for group in groups.values():
+        authors = [(m['author_id'], m['author_name'], m['message_id']) for m in group]
+        rows = []
+        for m in group:
+            content, codec = encode_content(m['content'], CONTENT_COMPRESS_MIN_BYTES)
+            rows.append((m['channel_id'], m['message_id'], m['guild_id'], m['author_id'],
+                         content, codec, to_epoch_ms(m['timestamp']),
+                         m.get('has_attachments', False), m.get('reply_to')))
+        with get_db(group[0]['guild_id']) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO authors (author_id, author_name, last_message_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT(author_id) DO UPDATE SET
+                    author_name = excluded.author_name,
+                    last_message_id = excluded.last_message_id
+                WHERE excluded.last_message_id > authors.last_message_id
+            ''', authors)
+            # which ones we already have, so duplicates (OR IGNORE) stay out of the search index
+            existing = {row[0] for row in cursor.execute('''
+                SELECT m.message_id FROM json_each(?) j
+                JOIN stored_messages m
+                  ON m.channel_id = json_extract(j.value, '$[0]') AND m.message_id = json_extract(j.value, '$[1]')
+            ''', (json.dumps([[m['channel_id'], m['message_id']] for m in group]),))}
+            cursor.executemany('''
+                INSERT OR IGNORE INTO stored_messages
+                (channel_id, message_id, guild_id, author_id, content, content_codec,
+                 ts, has_attachments, reply_to)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            new = []
+            for m in group:
+                # a message repeated inside the batch is only inserted (and indexed) once
+                if m['message_id'] not in existing:
+                    existing.add(m['message_id'])
+                    new.append((m['message_id'], m['content']))
+            index_messages(conn, new)
+            conn.commit()
+            inserted += len(new)
+    return inserted
+
 def get_message_count(guild_id: int, channel_id: int) -> int:
-    """Get the number of stored messages for a channel"""
-    with get_db() as conn:
+    """Get the number of stored messages for a channel (from the materialized counter)"""
+    with get_read_db(guild_id) as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT COUNT(*) FROM stored_messages 
-            WHERE guild_id = ? AND channel_id = ?
-        ''', (guild_id, channel_id))
-        return cursor.fetchone()[0]
+            SELECT message_count FROM channel_stats 
+            WHERE channel_id = ?
+        ''', (channel_id,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+# stored_messages rows as callers expect them: author name joined back in
+# from authors, content decoded and a text timestamp rebuilt from ts
+MESSAGE_COLUMNS = '''
+    m.guild_id, m.channel_id, m.message_id, m.author_id,
+    COALESCE(a.author_name, CAST(m.author_id AS TEXT)) AS author_name,
+    m.content, m.content_codec, m.ts, m.has_attachments, m.reply_to
+'''
+MESSAGE_FROM = 'stored_messages m LEFT JOIN authors a ON a.author_id = m.author_id'
+
+def _decode_row(row) -> dict:
+    """sqlite row from MESSAGE_COLUMNS -> message dict"""
+    msg = dict(row)
+    msg['content'] = decode_content(msg['content'], msg.pop('content_codec'))
+    msg['timestamp'] = _ms_to_text(msg['ts'])
+    return msg
 
 def get_messages(guild_id: int, channel_id: int, limit: int = 100, 
                 offset: int = 0) -> list:
     """Get stored messages for a channel"""
-    with get_db() as conn:
+    with get_read_db(guild_id) as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM stored_messages 
-            WHERE guild_id = ? AND channel_id = ?
-            ORDER BY timestamp DESC
+        cursor.execute(f'''
+            SELECT {MESSAGE_COLUMNS} FROM {MESSAGE_FROM}
+            WHERE m.guild_id = ? AND m.channel_id = ?
+            ORDER BY m.message_id DESC
             LIMIT ? OFFSET ?
         ''', (guild_id, channel_id, limit, offset))
-        return [dict(row) for row in cursor.fetchall()]
+        return [_decode_row(row) for row in cursor.fetchall()]
 
 def get_messages_by_timeframe(guild_id: int, channel_id: int, hours: int, limit: int = 1000) -> list:
     """Get stored messages for a channel within the specified timeframe"""
-    from datetime import datetime, timedelta
+    cutoff_id = _cutoff_id(hours)
     
-    cutoff_time = datetime.now() - timedelta(hours=hours)
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {MESSAGE_COLUMNS} FROM {MESSAGE_FROM}
+            WHERE m.guild_id = ? AND m.channel_id = ? AND m.message_id >= ?
+            ORDER BY m.message_id ASC
+            LIMIT ?
+        ''', (guild_id, channel_id, cutoff_id, limit))
+        return [_decode_row(row) for row in cursor.fetchall()]
+
+def iter_messages_by_timeframe(guild_id: int, channel_id: int, hours: int, 
+                               newest_first: bool = False, batch_size: int = 500):
+    """Stream stored messages in the timeframe without loading them all (no limit)"""
+    cutoff_id = _cutoff_id(hours)
+    order = 'DESC' if newest_first else 'ASC'
     
-    with get_db() as conn:
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f'''
+                SELECT {MESSAGE_COLUMNS} FROM {MESSAGE_FROM}
+                WHERE m.guild_id = ? AND m.channel_id = ? AND m.message_id >= ?
+                ORDER BY m.message_id {order}
+            ''', (guild_id, channel_id, cutoff_id))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _decode_row(row)
+        finally:
+            cursor.close()
+
+def search_messages(guild_id: int, channel_ids: list, query: str, limit: int = 10, 
+                    hours: int = None) -> list:
+    """Best full-text matches for query in the given channels of a guild, best first"""
+    match = match_query(query)
+    if match is None or not channel_ids:
+        return []
+    cutoff_id = _cutoff_id(hours) if hours else 0
+    # stored_messages is keyed (channel_id, message_id) and CROSS JOIN keeps the
+    # FTS scan first, so every match is a primary key lookup
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {MESSAGE_COLUMNS}, f.rank AS rank
+            FROM message_fts f
+            CROSS JOIN stored_messages m
+              ON m.channel_id IN (SELECT value FROM json_each(?)) AND m.message_id = f.rowid
+            LEFT JOIN authors a ON a.author_id = m.author_id
+            WHERE message_fts MATCH ? AND f.rowid >= ? AND m.guild_id = ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (json.dumps(list(channel_ids)), match, cutoff_id, guild_id, limit))
+        return [_decode_row(row) for row in cursor.fetchall()]
+
+def get_topic_messages(guild_id: int, channel_id: int, hours: int, topic: str, 
+                       limit: int = 5000) -> list:
+    """Messages in the timeframe matching topic plus their reply context, newest first.
+
+    Context is the message each match replied to and the replies it got.
+    """
+    match = match_query(topic)
+    if match is None:
+        return []
+    cutoff_id = _cutoff_id(hours)
+    
+    with get_read_db(guild_id) as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT * FROM stored_messages 
-            WHERE guild_id = ? AND channel_id = ? AND timestamp >= ?
-            ORDER BY timestamp ASC
+            SELECT m.message_id, m.reply_to FROM message_fts f
+            CROSS JOIN stored_messages m ON m.channel_id = ? AND m.message_id = f.rowid
+            WHERE message_fts MATCH ? AND f.rowid >= ?
+            ORDER BY f.rowid DESC
             LIMIT ?
-        ''', (guild_id, channel_id, cutoff_time.isoformat(), limit))
-        return [dict(row) for row in cursor.fetchall()]
+        ''', (channel_id, match, cutoff_id, limit))
+        matches = cursor.fetchall()
+        if not matches:
+            return []
+        wanted = {row[0] for row in matches}
+        wanted.update(row[1] for row in matches if row[1])
+        
+        # replies to a match, the window is a range scan of the channel
+        matched = [row[0] for row in matches]
+        for i in range(0, len(matched), 500):
+            batch = matched[i:i + 500]
+            cursor.execute(f'''
+                SELECT message_id FROM stored_messages
+                WHERE channel_id = ? AND message_id >= ? AND reply_to IN ({','.join('?' * len(batch))})
+            ''', (channel_id, cutoff_id, *batch))
+            wanted.update(row[0] for row in cursor.fetchall())
+        
+        ids = sorted(wanted, reverse=True)
+        messages = []
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            cursor.execute(f'''
+                SELECT {MESSAGE_COLUMNS} FROM {MESSAGE_FROM}
+                WHERE m.channel_id = ? AND m.message_id IN ({','.join('?' * len(batch))})
+                ORDER BY m.message_id DESC
+            ''', (channel_id, *batch))
+            messages.extend(_decode_row(row) for row in cursor.fetchall())
+        return messages
+
+def _ms_to_text(ms: int) -> str:
+    """Epoch ms -> the same text format stored_messages.timestamp uses"""
+    if ms is None:
+        return None
+    return str(datetime.fromtimestamp(ms / 1000, tz=timezone.utc))
 
 def get_message_stats(guild_id: int, channel_id: int, hours: int = None) -> dict:
-    """Get message statistics for a channel, optionally within timeframe"""
-    with get_db() as conn:
+    """Get message statistics for a channel, optionally within timeframe.
+
+    Whole hours come from the hourly buckets, only the partial hour at the
+    start of the window is read from stored_messages.
+    """
+    with get_read_db(guild_id) as conn:
         cursor = conn.cursor()
         
+        total, oldest, newest = 0, None, None
         if hours:
-            from datetime import datetime, timedelta
-            cutoff_time = datetime.now() - timedelta(hours=hours)
+            cutoff_ms = int((time.time() - hours * 3600) * 1000)
+            cutoff_hour = cutoff_ms // MS_PER_HOUR
+            partial_range = (snowflake_from_ms(cutoff_ms), 
+                             snowflake_from_ms((cutoff_hour + 1) * MS_PER_HOUR))
+            cursor.execute('''
+                SELECT COUNT(*), MIN(ts), MAX(ts) FROM stored_messages 
+                WHERE channel_id = ? AND message_id >= ? AND message_id < ?
+            ''', (channel_id, *partial_range))
+            total, oldest, newest = cursor.fetchone()
             cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_messages,
-                    COUNT(DISTINCT author_id) as unique_authors,
-                    MIN(timestamp) as oldest_message,
-                    MAX(timestamp) as newest_message
-                FROM stored_messages 
-                WHERE guild_id = ? AND channel_id = ? AND timestamp >= ?
-            ''', (guild_id, channel_id, cutoff_time.isoformat()))
+                SELECT COUNT(*) FROM (
+                    SELECT author_id FROM stored_messages 
+                    WHERE channel_id = ? AND message_id >= ? AND message_id < ?
+                    UNION
+                    SELECT author_id FROM channel_hourly_authors 
+                    WHERE channel_id = ? AND hour > ?
+                )
+            ''', (channel_id, *partial_range, channel_id, cutoff_hour))
         else:
+            cutoff_hour = -1
             cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_messages,
-                    COUNT(DISTINCT author_id) as unique_authors,
-                    MIN(timestamp) as oldest_message,
-                    MAX(timestamp) as newest_message
-                FROM stored_messages 
-                WHERE guild_id = ? AND channel_id = ?
-            ''', (guild_id, channel_id))
+                SELECT COUNT(DISTINCT author_id) FROM channel_hourly_authors 
+                WHERE channel_id = ?
+            ''', (channel_id,))
+        unique_authors = cursor.fetchone()[0]
+        
+        cursor.execute('''
+            SELECT COALESCE(SUM(message_count), 0), MIN(first_ts), MAX(last_ts) 
+            FROM channel_hourly_stats 
+            WHERE channel_id = ? AND hour > ?
+        ''', (channel_id, cutoff_hour))
+        bucket_total, bucket_oldest, bucket_newest = cursor.fetchone()
         
+        total += bucket_total
+        oldest = min(v for v in (oldest, bucket_oldest, float('inf')) if v is not None)
+        newest = max(v for v in (newest, bucket_newest, float('-inf')) if v is not None)
+        
+        return {
+            'total_messages': total,
+            'unique_authors': unique_authors,
+            'oldest_message': _ms_to_text(oldest) if total else None,
+            'newest_message': _ms_to_text(newest) if total else None
+        }
+
+def get_latest_message_id(guild_id: int, channel_id: int, hours: int) -> int:
+    """Get the newest stored message_id in the timeframe (None if the window is empty)"""
+    cutoff_id = _cutoff_id(hours)
+    
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT MAX(message_id) FROM stored_messages 
+            WHERE guild_id = ? AND channel_id = ? AND message_id >= ?
+        ''', (guild_id, channel_id, cutoff_id))
+        return cursor.fetchone()[0]
+
+def get_last_message_ids() -> dict:
+    """Newest stored message_id per channel, {channel_id: message_id}"""
+    last_ids = {}
+    for manager in _each_storage():
+        with manager.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT channel_id, last_message_id FROM channel_stats 
+                WHERE last_message_id IS NOT NULL
+            ''')
+            for channel_id, last_id in cursor.fetchall():
+                last_ids[channel_id] = max(last_id, last_ids.get(channel_id, 0))
+    return last_ids
+
+def get_saved_summary(guild_id: int, channel_id: int, hours: int, 
+                      last_message_id: int, max_age: float) -> dict:
+    """Get a persisted summary if it matches the watermark and isn't older than max_age seconds"""
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT summary, message_count, created_at FROM summaries 
+            WHERE guild_id = ? AND channel_id = ? AND hours = ? 
+              AND last_message_id = ? AND created_at >= ?
+        ''', (guild_id, channel_id, hours, last_message_id, time.time() - max_age))
         row = cursor.fetchone()
         if row:
             return dict(row)
-        return {
-            'total_messages': 0,
-            'unique_authors': 0, 
-            'oldest_message': None,
-            'newest_message': None
-        }
\ No newline at end of file
+        return None
+
+def save_summary(guild_id: int, channel_id: int, hours: int, last_message_id: int, 
+                 summary: str, message_count: int) -> bool:
+    """Persist the latest summary for a window (replaces the previous one)"""
+    try:
+        with get_db(guild_id) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO summaries 
+                (guild_id, channel_id, hours, last_message_id, summary, message_count, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(guild_id, channel_id, hours) DO UPDATE SET
+                    last_message_id = excluded.last_message_id,
+                    summary = excluded.summary,
+                    message_count = excluded.message_count,
+                    created_at = excluded.created_at
+            ''', (guild_id, channel_id, hours, last_message_id, summary, message_count, time.time()))
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Failed to save summary for channel {channel_id}: {e}")
+        return False
+
+def get_monitored_channels() -> list:
+    """Get all actively monitored channels"""
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM monitored_channels 
+            WHERE active = 1
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+
+def get_digest_channels() -> list:
+    """Get active monitored channels that have a digest scheduled"""
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT guild_id, channel_id, channel_name, digest_hours, 
+                   digest_last_message_id, digest_last_at
+            FROM monitored_channels 
+            WHERE active = 1 AND digest_hours > 0
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+
+def set_channel_digest(guild_id: int, channel_id: int, hours: int) -> bool:
+    """Schedule a digest every `hours` for a monitored channel (0 turns it off)"""
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # counts the current slot as done, so the first digest goes out at the next slot boundary
+            cursor.execute('''
+                UPDATE monitored_channels 
+                SET digest_hours = ?, digest_last_at = ?
+                WHERE guild_id = ? AND channel_id = ? AND active = 1
+            ''', (hours, time.time(), guild_id, channel_id))
+            conn.commit()
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"Failed to set digest for channel {channel_id}: {e}")
+        return False
+
+def mark_digest_sent(guild_id: int, channel_id: int, last_message_id: int, sent_at: float) -> bool:
+    """Record a digest run (last_message_id is the newest message it covered)"""
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE monitored_channels 
+                SET digest_last_message_id = ?, digest_last_at = ?
+                WHERE guild_id = ? AND channel_id = ?
+            ''', (last_message_id, sent_at, guild_id, channel_id))
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Failed to record digest for channel {channel_id}: {e}")
+        return False
+
+def get_bot_state(key: str) -> str:
+    """Value stored under key in bot_state, None if it was never set"""
+    with get_read_db() as conn:
+        row = conn.execute('SELECT value FROM bot_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+def set_bot_state(key: str, value: str) -> bool:
+    """Store value under key in bot_state"""
+    try:
+        with get_db() as conn:
+            conn.execute('''
+                INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            ''', (key, value, time.time()))
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Failed to save bot state {key}: {e}")
+        return False
+
+def get_messages_between(guild_id: int, channel_id: int, start: datetime, 
+                         end: datetime, limit: int = None) -> list:
+    """Get stored messages for a channel with start <= time < end (all of them unless limit is given)"""
+    params = [guild_id, channel_id, snowflake_from_ms(to_epoch_ms(start)), snowflake_from_ms(to_epoch_ms(end))]
+    if limit is not None:
+        params.append(limit)
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {MESSAGE_COLUMNS} FROM {MESSAGE_FROM}
+            WHERE m.guild_id = ? AND m.channel_id = ? AND m.message_id >= ? AND m.message_id < ?
+            ORDER BY m.message_id ASC
+            {'LIMIT ?' if limit is not None else ''}
+        ''', params)
+        return [_decode_row(row) for row in cursor.fetchall()]
+
+def get_block_progress(guild_id: int, channel_id: int) -> int:
+    """Get the epoch second up to which a channel is covered by block summaries (None if never)"""
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT processed_until FROM block_progress 
+            WHERE guild_id = ? AND channel_id = ?
+        ''', (guild_id, channel_id))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+def get_block_summaries(guild_id: int, channel_id: int, start: int, end: int) -> list:
+    """Get block summaries that lie fully inside [start, end) (epoch seconds)"""
+    with get_read_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM block_summaries 
+            WHERE guild_id = ? AND channel_id = ? AND block_start >= ? AND block_end <= ?
+            ORDER BY block_start ASC
+        ''', (guild_id, channel_id, start, end))
+        return [dict(row) for row in cursor.fetchall()]
+
+def save_block_summaries(guild_id: int, channel_id: int, blocks: list, 
+                         processed_until: int) -> bool:
+    """Store finished block summaries and advance the channel's progress in one transaction"""
+    try:
+        with get_db(guild_id) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO block_summaries 
+                (guild_id, channel_id, block_start, block_end, summary, message_count, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(guild_id, channel_id, b['block_start'], b['block_end'], b['summary'], 
+                   b['message_count'], time.time()) for b in blocks])
+            cursor.execute('''
+                INSERT INTO block_progress (guild_id, channel_id, processed_until)
+                VALUES (?, ?, ?)
+                ON CONFLICT(guild_id, channel_id) DO UPDATE SET
+                    processed_until = MAX(processed_until, excluded.processed_until)
+            ''', (guild_id, channel_id, processed_until))
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Failed to save block summaries for channel {channel_id}: {e}")
+        return False
+
+def rewind_block_progress(guild_id: int, channel_id: int, since: int) -> bool:
+    """Make block summaries redo a channel from `since` (epoch second of a block start) on.
+
+    For messages stored late (backfill) into blocks that were already
+    summarized, or skipped as empty, before those messages arrived.
+    """
+    try:
+        with get_db(guild_id) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM block_summaries 
+                WHERE guild_id = ? AND channel_id = ? AND block_end > ?
+            ''', (guild_id, channel_id, since))
+            cursor.execute('''
+                UPDATE block_progress SET processed_until = ?
+                WHERE guild_id = ? AND channel_id = ? AND processed_until > ?
+            ''', (since, guild_id, channel_id, since))
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Failed to rewind block summaries for channel {channel_id}: {e}")
+        return False
+
+def prune_block_summaries(before: int) -> int:
+    """Delete block summaries that ended before the given epoch second"""
+    pruned = 0
+    for manager in _each_storage():
+        with manager.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM block_summaries WHERE block_end < ?', (before,))
+            conn.commit()
+            pruned += cursor.rowcount
+    return pruned
+
+def get_retention_policies() -> dict:
+    """Get retention overrides as {(guild_id, channel_id): days}, channel_id 0 is the server default"""
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT guild_id, channel_id, retention_days FROM retention_policies')
+        return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+def set_retention_policy(guild_id: int, channel_id: int, days: int) -> bool:
+    """Set retention for a channel (channel_id 0 = whole server), days None removes the override"""
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if days is None:
+                cursor.execute('''
+                    DELETE FROM retention_policies WHERE guild_id = ? AND channel_id = ?
+                ''', (guild_id, channel_id))
+            else:
+                cursor.execute('''
+                    INSERT INTO retention_policies (guild_id, channel_id, retention_days)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(guild_id, channel_id) DO UPDATE SET retention_days = excluded.retention_days
+                ''', (guild_id, channel_id, days))
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Failed to set retention policy for {guild_id}/{channel_id}: {e}")
+        return False
+
+def get_stored_channels() -> list:
+    """Get every channel that has stored messages (monitored or not)"""
+    channels = []
+    for manager in _each_storage():
+        with manager.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT guild_id, channel_id, message_count FROM channel_stats 
+                WHERE message_count > 0
+            ''')
+            channels.extend(dict(row) for row in cursor.fetchall())
+    return channels
+
+def delete_messages_before(guild_id: int, channel_id: int, before_id: int, 
+                           batch_size: int, archive=None) -> int:
+    """Delete one batch of a channel's oldest messages older than before_id, returns rows deleted.
+
+    archive(rows) is called with the batch before it's deleted, inside the
+    same transaction, so a failed archive leaves the rows in place.
+    """
+    with get_db(guild_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {MESSAGE_COLUMNS} FROM {MESSAGE_FROM}
+            WHERE m.channel_id = ? AND m.message_id < ?
+            ORDER BY m.message_id ASC
+            LIMIT ?
+        ''', (channel_id, before_id, batch_size))
+        rows = [_decode_row(row) for row in cursor.fetchall()]
+        if not rows:
+            return 0
+        if archive:
+            archive(rows)
+        unindex_messages(conn, [(row['message_id'], row['content']) for row in rows])
+        cursor.execute('''
+            DELETE FROM stored_messages 
+            WHERE channel_id = ? AND message_id >= ? AND message_id <= ?
+        ''', (channel_id, rows[0]['message_id'], rows[-1]['message_id']))
+        conn.commit()
+        return cursor.rowcount
+
+def get_db_size() -> dict:
+    """Get the database size (all partition files together) and how much of it is free pages"""
+    size = {'bytes': 0, 'free_bytes': 0, 'files': 0}
+    for manager in _each_storage():
+        with manager.reader() as conn:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        size['bytes'] += page_size * page_count
+        size['free_bytes'] += page_size * freelist
+        size['files'] += 1
+        size['page_size'] = page_size
+    return size
+
+def incremental_vacuum(pages: int) -> None:
+    """Give up to `pages` free pages per file back to the filesystem"""
+    for manager in _each_storage():
+        with manager.writer() as conn:
+            if conn.execute('PRAGMA freelist_count').fetchone()[0]:
+                # executescript steps the pragma to completion (execute() frees one page per step)
+                conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
@@ -0,0 +1,197 @@
+"""
+Write-behind ingestion queue.
+
+on_message drops messages into a bounded queue and a background writer
+flushes them to sqlite in batches, so the event loop never waits on disk.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from config import (INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE,
+                    INGEST_FLUSH_INTERVAL, INGEST_STATS_INTERVAL)
+from db.aio import store_messages
+from utils.metrics import INGEST_MESSAGES, INGEST_FLUSH_SECONDS, INGEST_BATCH_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# Put on the queue by close() to tell the writer to flush and exit
+_STOP = object()
+
+
+def message_row(message) -> dict:
+    """discord.Message -> the dict store_messages expects"""
+    return {
+        'guild_id': message.guild.id,
+        'channel_id': message.channel.id,
+        'message_id': message.id,
+        'author_id': message.author.id,
+        'author_name': message.author.display_name,
+        'content': message.content,
+        'timestamp': message.created_at,
+        'has_attachments': bool(message.attachments),
+        'reply_to': message.reference.message_id if message.reference else None,
+    }
+
+
+class MessageIngestor:
+    """Bounded queue + background batch writer for incoming messages"""
+
+    def __init__(self, max_queue: int = INGEST_QUEUE_SIZE,
+                 batch_size: int = INGEST_BATCH_SIZE,
+                 flush_interval: float = INGEST_FLUSH_INTERVAL,
+                 stats_interval: float = INGEST_STATS_INTERVAL):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats_interval = stats_interval
+        self.queue = None
+        self._task = None
+        self._closing = False
+        self.stats = {
+            'enqueued': 0,
+            'stored': 0,
+            'duplicates': 0,
+            'failed': 0,
+            'batches': 0,
+            'backpressure_waits': 0,
+            'max_depth': 0,
+        }
+        # shard_id -> messages queued but not written yet
+        self.pending_by_shard = Counter()
+
+    def start(self):
+        """Start the background writer (must be called from a running loop)"""
+        if self._task is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._closing = False
+        self._task = asyncio.create_task(self._run(), name="message-ingestor")
+        logger.info(f"Message ingestor started (queue={self.max_queue}, "
+                    f"batch={self.batch_size}, interval={self.flush_interval}s)")
+
+    @property
+    def depth(self) -> int:
+        """Number of messages waiting to be written"""
+        return self.queue.qsize() if self.queue else 0
+
+    def depth_for(self, shard_id: int) -> int:
+        """Messages from one shard waiting to be written"""
+        return self.pending_by_shard.get(shard_id, 0)
+
+    async def put(self, shard_id: int = None, **message) -> bool:
+        """Queue a message for storage, waits if the queue is full (backpressure)"""
+        if self._task is None or self._closing:
+            logger.warning(f"Ingestor not running, dropping message {message.get('message_id')}")
+            return False
+
+        if self.queue.full():
+            self.stats['backpressure_waits'] += 1
+        self.pending_by_shard[shard_id] += 1
+        await self.queue.put((shard_id, message))
+
+        self.stats['enqueued'] += 1
+        depth = self.queue.qsize()
+        if depth > self.stats['max_depth']:
+            self.stats['max_depth'] = depth
+        return True
+
+    async def close(self):
+        """Stop accepting messages, flush everything still queued and stop the writer"""
+        if self._task is None:
+            return
+        self._closing = True
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+        self.log_stats()
+        logger.info("Message ingestor drained and stopped")
+
+    def log_stats(self):
+        """Log ingestion counters"""
+        s = self.stats
+        logger.info(f"Ingest stats: enqueued={s['enqueued']} stored={s['stored']} "
+                    f"duplicates={s['duplicates']} failed={s['failed']} "
+                    f"batches={s['batches']} depth={self.depth} max_depth={s['max_depth']} "
+                    f"backpressure_waits={s['backpressure_waits']}")
+
+    async def _run(self):
+        """Collect batches by size/time and write them out"""
+        loop = asyncio.get_running_loop()
+        last_stats = loop.time()
+        stopping = False
+
+        while not stopping:
+            # Block until there is at least one message (or the stats timer is due)
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=self.stats_interval)
+            except asyncio.TimeoutError:
+                self.log_stats()
+                last_stats = loop.time()
+                continue
+
+            batch = []
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+
+            # Keep filling the batch until it's big enough or the flush window closes
+            deadline = loop.time() + self.flush_interval
+            while not stopping and len(batch) < self.batch_size:
+                # grab whatever is already queued without waiting
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            if stopping:
+                # drain anything that snuck in before the stop marker
+                while not self.queue.empty():
+                    item = self.queue.get_nowait()
+                    if item is not _STOP:
+                        batch.append(item)
+
+            # flush in batch_size chunks so a big drain doesn't become one huge transaction
+            for i in range(0, len(batch), self.batch_size):
+                await self._flush(batch[i:i + self.batch_size])
+
+            if loop.time() - last_stats >= self.stats_interval:
+                self.log_stats()
+                last_stats = loop.time()
+
+    async def _flush(self, batch: list):
+        """Write one batch in a single transaction off the event loop"""
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            inserted = await store_messages([message for _, message in batch])
+        except Exception as e:
+            self.stats['failed'] += len(batch)
+            INGEST_MESSAGES.inc('failed', amount=len(batch))
+            logger.error(f"Failed to store batch of {len(batch)} messages: {e}")
+            return
+        finally:
+            self.pending_by_shard.subtract(shard_id for shard_id, _ in batch)
+
+        self.stats['batches'] += 1
+        self.stats['stored'] += inserted
+        self.stats['duplicates'] += len(batch) - inserted
+        INGEST_MESSAGES.inc('stored', amount=inserted)
+        INGEST_MESSAGES.inc('duplicate', amount=len(batch) - inserted)
+        INGEST_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        INGEST_BATCH_MESSAGES.observe(len(batch))
+        logger.debug(f"Flushed {len(batch)} messages ({inserted} new) in "
+                     f"{(time.perf_counter() - started) * 1000:.1f}ms")
@@ -0,0 +1,491 @@
+"""
+Versioned schema migrations.
+
+The schema version lives in PRAGMA user_version. Each migration moves the
+database from version N-1 to N and is written so it can resume if the
+process dies halfway (big data rewrites are done in committed batches).
+"""
+
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from config import CONTENT_COMPRESS_MIN_BYTES
+from db.codec import encode_content
+from db.snowflake import DISCORD_EPOCH_MS
+
+logger = logging.getLogger(__name__)
+
+# Rows rewritten per transaction during data migrations
+MIGRATION_BATCH_SIZE = 5000
+
+
+def to_epoch_ms(timestamp) -> int:
+    """datetime / stored timestamp text -> epoch milliseconds (naive values are taken as UTC)"""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _v1_baseline(conn: sqlite3.Connection):
+    """Schema as of the switch to migrations, what the one-shot db/init.py last created.
+
+    That's the original monitored_channels and stored_messages plus the
+    summary cache (summaries) and block summary tables (block_summaries,
+    block_progress) that were added to init.py before migrations existed.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monitored_channels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            channel_name TEXT NOT NULL,
+            setup_by_user_id INTEGER NOT NULL,
+            setup_by_username TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            active BOOLEAN DEFAULT 1,
+            UNIQUE(guild_id, channel_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stored_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER UNIQUE NOT NULL,
+            author_id INTEGER NOT NULL,
+            author_name TEXT NOT NULL,
+            content TEXT,
+            timestamp TIMESTAMP NOT NULL,
+            has_attachments BOOLEAN DEFAULT 0,
+            reply_to INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS summaries (
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            hours INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            message_count INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (guild_id, channel_id, hours)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS block_summaries (
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            block_start INTEGER NOT NULL,
+            block_end INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            message_count INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (guild_id, channel_id, block_start)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS block_progress (
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            processed_until INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, channel_id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_monitored_guild_channel ON monitored_channels(guild_id, channel_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_guild_channel ON stored_messages(guild_id, channel_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON stored_messages(timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_message_id ON stored_messages(message_id)')
+    conn.commit()
+
+
+def _v2_integer_time(conn: sqlite3.Connection):
+    """Add ts (epoch ms) to stored_messages, backfill it and index (guild, channel, ts)"""
+    if 'ts' not in _columns(conn, 'stored_messages'):
+        conn.execute('ALTER TABLE stored_messages ADD COLUMN ts INTEGER')
+        conn.commit()
+
+    # backfill in rowid order, one committed batch at a time
+    converted = 0
+    last_id = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, timestamp FROM stored_messages
+            WHERE id > ? AND ts IS NULL
+            ORDER BY id LIMIT ?
+        ''', (last_id, MIGRATION_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, timestamp in rows:
+            try:
+                updates.append((to_epoch_ms(timestamp), row_id))
+            except ValueError:
+                logger.warning(f"Unparseable timestamp {timestamp!r} on row {row_id}, using 0")
+                updates.append((0, row_id))
+        conn.executemany('UPDATE stored_messages SET ts = ? WHERE id = ?', updates)
+        conn.commit()
+        converted += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"Migrated timestamps for {converted} message(s)")
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_guild_channel_ts ON stored_messages(guild_id, channel_id, ts)')
+    # both are prefixes/subsets of the new index or unused by any query now
+    conn.execute('DROP INDEX IF EXISTS idx_messages_guild_channel')
+    conn.execute('DROP INDEX IF EXISTS idx_messages_timestamp')
+    conn.commit()
+
+
+def _v3_snowflake_clustered(conn: sqlite3.Connection):
+    """Rebuild stored_messages as a WITHOUT ROWID table clustered on (channel_id, message_id)"""
+    if 'id' not in _columns(conn, 'stored_messages'):
+        # swap already happened, we just didn't get to bump user_version
+        return
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stored_messages_v3 (
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            author_id INTEGER NOT NULL,
+            author_name TEXT NOT NULL,
+            content TEXT,
+            timestamp TIMESTAMP NOT NULL,
+            ts INTEGER NOT NULL,
+            has_attachments BOOLEAN DEFAULT 0,
+            reply_to INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel_id, message_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+    # copy in committed batches; OR IGNORE makes a restart after a crash harmless
+    copied = 0
+    last_id = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id FROM stored_messages WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_id, MIGRATION_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        conn.execute('''
+            INSERT OR IGNORE INTO stored_messages_v3
+            (channel_id, message_id, guild_id, author_id, author_name, content,
+             timestamp, ts, has_attachments, reply_to, created_at)
+            SELECT channel_id, message_id, guild_id, author_id, author_name, content,
+                   timestamp, COALESCE(ts, 0), has_attachments, reply_to, created_at
+            FROM stored_messages WHERE id > ? AND id <= ?
+        ''', (last_id, rows[-1][0]))
+        conn.commit()
+        copied += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"Copied {copied} message(s) into clustered table")
+
+    # swap atomically; the old table's indexes go with it
+    conn.execute('BEGIN')
+    conn.execute('DROP TABLE stored_messages')
+    conn.execute('ALTER TABLE stored_messages_v3 RENAME TO stored_messages')
+    conn.commit()
+
+
+# Stats triggers (migration v4). Kept as constants because any migration
+# that rebuilds stored_messages has to recreate them.
+STATS_INSERT_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS trg_messages_stats_insert AFTER INSERT ON stored_messages
+    BEGIN
+        INSERT INTO channel_stats (channel_id, guild_id, message_count, last_ts, last_message_id)
+        VALUES (NEW.channel_id, NEW.guild_id, 1, NEW.ts, NEW.message_id)
+        ON CONFLICT(channel_id) DO UPDATE SET
+            message_count = message_count + 1,
+            last_ts = MAX(COALESCE(last_ts, 0), excluded.last_ts),
+            last_message_id = MAX(COALESCE(last_message_id, 0), excluded.last_message_id);
+        INSERT INTO channel_hourly_stats (channel_id, hour, guild_id, message_count, first_ts, last_ts)
+        VALUES (NEW.channel_id, NEW.ts / 3600000, NEW.guild_id, 1, NEW.ts, NEW.ts)
+        ON CONFLICT(channel_id, hour) DO UPDATE SET
+            message_count = message_count + 1,
+            first_ts = MIN(first_ts, excluded.first_ts),
+            last_ts = MAX(last_ts, excluded.last_ts);
+        INSERT INTO channel_hourly_authors (channel_id, hour, author_id, message_count)
+        VALUES (NEW.channel_id, NEW.ts / 3600000, NEW.author_id, 1)
+        ON CONFLICT(channel_id, hour, author_id) DO UPDATE SET
+            message_count = message_count + 1;
+    END
+'''
+
+# OLD's hour as a message_id range: ts comes from the snowflake, so the rows of
+# one hour bucket are a contiguous slice of the (channel_id, message_id) key
+_OLD_HOUR_IDS = (f"BETWEEN (OLD.ts / 3600000 * 3600000 - {DISCORD_EPOCH_MS}) << 22 "
+                 f"AND ((OLD.ts / 3600000 + 1) * 3600000 - {DISCORD_EPOCH_MS}) << 22")
+
+STATS_DELETE_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS trg_messages_stats_delete AFTER DELETE ON stored_messages
+    BEGIN
+        UPDATE channel_stats SET message_count = message_count - 1
+        WHERE channel_id = OLD.channel_id;
+        UPDATE channel_hourly_stats SET message_count = message_count - 1
+        WHERE channel_id = OLD.channel_id AND hour = OLD.ts / 3600000;
+        -- deleting the bucket's first/last message moves its boundary to the next one left
+        UPDATE channel_hourly_stats SET first_ts = COALESCE((
+            SELECT ts FROM stored_messages
+            WHERE channel_id = OLD.channel_id AND message_id {_OLD_HOUR_IDS}
+              AND ts / 3600000 = OLD.ts / 3600000
+            ORDER BY message_id LIMIT 1), first_ts)
+        WHERE channel_id = OLD.channel_id AND hour = OLD.ts / 3600000 AND first_ts = OLD.ts;
+        UPDATE channel_hourly_stats SET last_ts = COALESCE((
+            SELECT ts FROM stored_messages
+            WHERE channel_id = OLD.channel_id AND message_id {_OLD_HOUR_IDS}
+              AND ts / 3600000 = OLD.ts / 3600000
+            ORDER BY message_id DESC LIMIT 1), last_ts)
+        WHERE channel_id = OLD.channel_id AND hour = OLD.ts / 3600000 AND last_ts = OLD.ts;
+        DELETE FROM channel_hourly_stats
+        WHERE channel_id = OLD.channel_id AND hour = OLD.ts / 3600000 AND message_count <= 0;
+        UPDATE channel_hourly_authors SET message_count = message_count - 1
+        WHERE channel_id = OLD.channel_id AND hour = OLD.ts / 3600000 AND author_id = OLD.author_id;
+        DELETE FROM channel_hourly_authors
+        WHERE channel_id = OLD.channel_id AND hour = OLD.ts / 3600000
+          AND author_id = OLD.author_id AND message_count <= 0;
+    END
+'''
+
+
+def _v4_materialized_stats(conn: sqlite3.Connection):
+    """Per-channel counters and hourly buckets maintained by triggers on stored_messages"""
+    from db.stats import rebuild_all_stats
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS channel_stats (
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            last_ts INTEGER,
+            last_message_id INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS channel_hourly_stats (
+            channel_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            first_ts INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+            PRIMARY KEY (channel_id, hour)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS channel_hourly_authors (
+            channel_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            author_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (channel_id, hour, author_id)
+        ) WITHOUT ROWID
+    ''')
+    # AFTER INSERT only fires for rows that were really inserted, so
+    # INSERT OR IGNORE duplicates don't get double counted
+    conn.execute(STATS_INSERT_TRIGGER)
+    conn.execute(STATS_DELETE_TRIGGER)
+    conn.commit()
+
+    # backfill from whatever is already stored
+    rebuild_all_stats(conn)
+
+
+def _v5_retention(conn: sqlite3.Connection):
+    """Retention policies + incremental auto-vacuum so deleted pages can be given back"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS retention_policies (
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL DEFAULT 0,
+            retention_days INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, channel_id)
+        )
+    ''')
+    conn.commit()
+
+    # auto_vacuum can only be switched on an existing file by a full VACUUM
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        logger.info("Enabling incremental auto-vacuum (one-time VACUUM, may take a while)")
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+
+
+def _v6_compact_storage(conn: sqlite3.Connection):
+    """Move author names into an authors table and compress large message content"""
+    if 'author_name' not in _columns(conn, 'stored_messages'):
+        # swap already happened, we just didn't get to bump user_version
+        return
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS authors (
+            author_id INTEGER PRIMARY KEY,
+            author_name TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # timestamp text and created_at are dropped too, timestamp is rebuilt from ts on read
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stored_messages_v6 (
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            author_id INTEGER NOT NULL,
+            content,
+            content_codec INTEGER NOT NULL DEFAULT 0,
+            ts INTEGER NOT NULL,
+            has_attachments BOOLEAN DEFAULT 0,
+            reply_to INTEGER,
+            PRIMARY KEY (channel_id, message_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+    copied = 0
+    last_key = (-1, -1)
+    while True:
+        rows = conn.execute('''
+            SELECT channel_id, message_id, guild_id, author_id, author_name, content,
+                   ts, has_attachments, reply_to
+            FROM stored_messages
+            WHERE (channel_id, message_id) > (?, ?)
+            ORDER BY channel_id, message_id
+            LIMIT ?
+        ''', (*last_key, MIGRATION_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        conn.executemany('''
+            INSERT INTO authors (author_id, author_name, last_message_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(author_id) DO UPDATE SET
+                author_name = excluded.author_name,
+                last_message_id = excluded.last_message_id
+            WHERE excluded.last_message_id > authors.last_message_id
+        ''', [(r[3], r[4], r[1]) for r in rows])
+        converted = []
+        for r in rows:
+            # same threshold as new writes (store_messages)
+            content, codec = encode_content(r[5], CONTENT_COMPRESS_MIN_BYTES)
+            converted.append((r[0], r[1], r[2], r[3], content, codec, r[6], r[7], r[8]))
+        conn.executemany('''
+            INSERT OR IGNORE INTO stored_messages_v6
+            (channel_id, message_id, guild_id, author_id, content, content_codec,
+             ts, has_attachments, reply_to)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', converted)
+        conn.commit()
+        copied += len(rows)
+        last_key = (rows[-1][0], rows[-1][1])
+        logger.info(f"Compacted {copied} message(s)")
+
+    # swap atomically; dropping the old table drops its triggers, so recreate them
+    conn.execute('BEGIN')
+    conn.execute('DROP TABLE stored_messages')
+    conn.execute('ALTER TABLE stored_messages_v6 RENAME TO stored_messages')
+    conn.execute(STATS_INSERT_TRIGGER)
+    conn.execute(STATS_DELETE_TRIGGER)
+    conn.commit()
+
+
+def _v7_channel_digests(conn: sqlite3.Connection):
+    """Opt-in periodic digests per monitored channel"""
+    columns = _columns(conn, 'monitored_channels')
+    # 0 = no digest, otherwise the period in hours
+    if 'digest_hours' not in columns:
+        conn.execute('ALTER TABLE monitored_channels ADD COLUMN digest_hours INTEGER NOT NULL DEFAULT 0')
+    # newest message the last posted digest covered, and when we last ran (epoch seconds)
+    if 'digest_last_message_id' not in columns:
+        conn.execute('ALTER TABLE monitored_channels ADD COLUMN digest_last_message_id INTEGER')
+    if 'digest_last_at' not in columns:
+        conn.execute('ALTER TABLE monitored_channels ADD COLUMN digest_last_at REAL NOT NULL DEFAULT 0')
+    conn.commit()
+
+
+def _v8_full_text_search(conn: sqlite3.Connection):
+    """Contentless FTS5 index over message content, built from what's already stored"""
+    from db.search import FTS_TABLE, rebuild_search_index
+
+    conn.execute(FTS_TABLE)
+    conn.commit()
+    rebuild_search_index(conn)
+
+
+def _v9_bot_state(conn: sqlite3.Connection):
+    """Small key/value store for process-wide bookkeeping (the synced command tree's hash)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def _v10_stats_boundaries(conn: sqlite3.Connection):
+    """Delete trigger that keeps hourly first_ts/last_ts on rows that still exist, plus a repair pass"""
+    conn.execute('DROP TRIGGER IF EXISTS trg_messages_stats_delete')
+    conn.execute(STATS_DELETE_TRIGGER)
+    # retention purges oldest first, so only a channel's oldest bucket can point at deleted rows
+    hour_ids = (f"BETWEEN (h.hour * 3600000 - {DISCORD_EPOCH_MS}) << 22 "
+                f"AND ((h.hour + 1) * 3600000 - {DISCORD_EPOCH_MS}) << 22")
+    conn.execute(f'''
+        UPDATE channel_hourly_stats AS h SET
+            first_ts = COALESCE((SELECT MIN(ts) FROM stored_messages m
+                                 WHERE m.channel_id = h.channel_id AND m.message_id {hour_ids}
+                                   AND m.ts / 3600000 = h.hour), first_ts),
+            last_ts = COALESCE((SELECT MAX(ts) FROM stored_messages m
+                                WHERE m.channel_id = h.channel_id AND m.message_id {hour_ids}
+                                  AND m.ts / 3600000 = h.hour), last_ts)
+        WHERE h.hour = (SELECT MIN(hour) FROM channel_hourly_stats WHERE channel_id = h.channel_id)
+    ''')
+    conn.commit()
+
+
+# (version, description, function) - append only, never edit a shipped migration
+MIGRATIONS = [
+    (1, "baseline schema", _v1_baseline),
+    (2, "integer epoch-ms timestamps + (guild, channel, ts) index", _v2_integer_time),
+    (3, "stored_messages clustered on (channel_id, message_id) WITHOUT ROWID", _v3_snowflake_clustered),
+    (4, "materialized channel stats + hourly buckets", _v4_materialized_stats),
+    (5, "retention policies + incremental auto-vacuum", _v5_retention),
+    (6, "authors table + compressed message content", _v6_compact_storage),
+    (7, "scheduled channel digests", _v7_channel_digests),
+    (8, "full-text search index", _v8_full_text_search),
+    (9, "bot state key/value table", _v9_bot_state),
+    (10, "hourly stats boundaries follow deletes", _v10_stats_boundaries),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: int = SCHEMA_VERSION) -> int:
+    """Apply pending migrations up to target (default: latest), returns the resulting schema version"""
+    current = get_schema_version(conn)
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema v{current} is newer than this code (v{SCHEMA_VERSION})")
+
+    for version, description, apply in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        logger.info(f"Applying migration v{version}: {description}")
+        apply(conn)
+        conn.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+        current = version
+
+    return current
@@ -0,0 +1,239 @@
+"""
+Per-guild database partitioning.
+
+With DB_PARTITION_MODE=guild every guild's messages, stats and summaries
+live in their own sqlite file; with DB_PARTITION_MODE=bucket guilds are
+hashed into DB_PARTITION_BUCKETS files. The main database stays as a small
+catalog (monitored_channels, retention_policies). Partition connections
+are opened on first use and the least recently used idle ones are closed
+once more than DB_PARTITION_MAX_OPEN are open.
+
+Split an existing single-file database (bot stopped) with:
+
+    python -m db.partitions split [--purge]
+"""
+
+import glob
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from db.connection import ConnectionManager
+from db.migrations import migrate, STATS_DELETE_TRIGGER
+from db.search import rebuild_search_index
+
+logger = logging.getLogger(__name__)
+
+MODES = ('none', 'guild', 'bucket')
+
+
+class PartitionRouter:
+    """Maps guilds to partition files and keeps an LRU of open ConnectionManagers"""
+
+    def __init__(self, directory: str, mode: str, buckets: int = 16, max_open: int = 32,
+                 readers: int = 2, writable: bool = True):
+        if mode not in ('guild', 'bucket'):
+            raise ValueError(f"Unknown partition mode {mode!r}, expected one of {MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.buckets = max(1, buckets)
+        self.max_open = max(1, max_open)
+        self.readers = readers
+        self.writable = writable
+        self._open = OrderedDict()  # key -> [ConnectionManager, leases]
+        self._lock = threading.Lock()
+        self.stats = {'opens': 0, 'evictions': 0}
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+
+    def key_for(self, guild_id: int) -> str:
+        """Partition name for a guild"""
+        if self.mode == 'guild':
+            return f"guild_{guild_id}"
+        # crc32 rather than hash() so the mapping is stable across runs
+        return f"bucket_{zlib.crc32(str(guild_id).encode()) % self.buckets:03d}"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.db")
+
+    def keys(self) -> list:
+        """Partitions that exist on disk"""
+        prefix = 'guild_' if self.mode == 'guild' else 'bucket_'
+        return sorted(os.path.basename(p)[:-3]
+                      for p in glob.glob(os.path.join(self.directory, f"{prefix}*.db")))
+
+    def exists(self, guild_id: int) -> bool:
+        key = self.key_for(guild_id)
+        return key in self._open or os.path.exists(self.path_for(key))
+
+    @contextmanager
+    def lease(self, key: str):
+        """ConnectionManager for a partition, held open (not evictable) until the block exits"""
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is None:
+                entry = [self._open_partition(key), 0]
+                self._open[key] = entry
+            self._open.move_to_end(key)
+            entry[1] += 1
+            self._evict()
+        try:
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                self._evict()
+
+    def _open_partition(self, key: str) -> ConnectionManager:
+        manager = ConnectionManager(self.path_for(key), readers=self.readers, writable=self.writable)
+        if self.writable:
+            with manager.writer() as conn:
+                migrate(conn)
+        self.stats['opens'] += 1
+        return manager
+
+    def _evict(self):
+        """Close least recently used idle partitions until we're back under max_open"""
+        if len(self._open) <= self.max_open:
+            return
+        for key in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            manager, leases = self._open[key]
+            if leases == 0:
+                del self._open[key]
+                manager.close()
+                self.stats['evictions'] += 1
+
+    def close(self):
+        with self._lock:
+            for manager, _ in self._open.values():
+                manager.close()
+            self._open.clear()
+
+
+# stored_messages columns in table order, shared by the split copy
+MESSAGE_FIELDS = ('channel_id, message_id, guild_id, author_id, content, content_codec, '
+                  'ts, has_attachments, reply_to')
+
+
+def split_database(src: sqlite3.Connection, router: PartitionRouter, purge: bool = False) -> dict:
+    """Copy every guild's rows from a single-file database into its partition.
+
+    Stats tables are rebuilt by the insert triggers in each partition.
+    With purge=True the copied rows are removed from the source afterwards.
+    """
+    migrate(src)
+    channels = src.execute('SELECT guild_id, channel_id, message_count FROM channel_stats').fetchall()
+    guilds = {row[0] for row in src.execute('''
+        SELECT guild_id FROM channel_stats
+        UNION SELECT guild_id FROM summaries
+        UNION SELECT guild_id FROM block_progress
+    ''')}
+    report = {'guilds': len(guilds), 'partitions': 0, 'messages': 0, 'mismatches': 0}
+
+    by_key = {}
+    for guild_id in guilds:
+        by_key.setdefault(router.key_for(guild_id), set()).add(guild_id)
+
+    for key, guild_ids in sorted(by_key.items()):
+        with router.lease(key) as manager, manager.writer() as dst:
+            dst.execute('ATTACH DATABASE ? AS src', (src_path(src),))
+            try:
+                for guild_id, channel_id, expected in channels:
+                    if guild_id not in guild_ids:
+                        continue
+                    dst.execute('''
+                        INSERT OR IGNORE INTO authors
+                        SELECT * FROM src.authors WHERE author_id IN
+                            (SELECT DISTINCT author_id FROM src.stored_messages WHERE channel_id = ?)
+                    ''', (channel_id,))
+                    dst.execute(f'''
+                        INSERT OR IGNORE INTO stored_messages ({MESSAGE_FIELDS})
+                        SELECT {MESSAGE_FIELDS} FROM src.stored_messages WHERE channel_id = ?
+                    ''', (channel_id,))
+                    dst.commit()
+                    copied = dst.execute('SELECT COUNT(*) FROM stored_messages WHERE channel_id = ?',
+                                         (channel_id,)).fetchone()[0]
+                    report['messages'] += copied
+                    if copied != expected:
+                        report['mismatches'] += 1
+                        logger.warning(f"Channel {channel_id}: {copied} copied, source says {expected}")
+                for table in ('summaries', 'block_summaries', 'block_progress'):
+                    dst.executemany(f'INSERT OR REPLACE INTO {table} SELECT * FROM src.{table} WHERE guild_id = ?',
+                                    [(g,) for g in guild_ids])
+                dst.commit()
+            finally:
+                if dst.in_transaction:
+                    dst.rollback()
+                dst.execute('DETACH DATABASE src')
+            # the text is copied as stored (maybe compressed), so index the partition from scratch
+            rebuild_search_index(dst)
+        report['partitions'] += 1
+        logger.info(f"Split {len(guild_ids)} guild(s) into {key}")
+
+    if purge and not report['mismatches']:
+        _purge_source(src, [c[1] for c in channels])
+    elif purge:
+        logger.warning("Not purging the source database, some channels did not copy cleanly")
+    return report
+
+
+def src_path(conn: sqlite3.Connection) -> str:
+    """File behind a connection's main database"""
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
+
+def _purge_source(src: sqlite3.Connection, channel_ids: list):
+    """Drop the copied rows from the catalog, keeping monitored_channels and retention_policies"""
+    # the delete trigger would update stats row by row, we clear them wholesale instead
+    src.execute('DROP TRIGGER IF EXISTS trg_messages_stats_delete')
+    try:
+        for channel_id in channel_ids:
+            src.execute('DELETE FROM stored_messages WHERE channel_id = ?', (channel_id,))
+            src.commit()
+        for table in ('channel_stats', 'channel_hourly_stats', 'channel_hourly_authors',
+                      'summaries', 'block_summaries', 'block_progress', 'authors'):
+            src.execute(f'DELETE FROM {table}')
+        src.execute("INSERT INTO message_fts (message_fts) VALUES ('delete-all')")
+        src.commit()
+    finally:
+        src.execute(STATS_DELETE_TRIGGER)
+        src.commit()
+    src.executescript('PRAGMA incremental_vacuum;')
+    logger.info(f"Purged {len(channel_ids)} channel(s) from the catalog database")
+
+
+def main(argv: list) -> int:
+    logging.basicConfig(level=logging.INFO)
+    if len(argv) < 1 or argv[0] != 'split':
+        print("usage: python -m db.partitions split [--purge]")
+        return 2
+
+    from config import (DATABASE_URL, DB_PARTITION_MODE, DB_PARTITION_BUCKETS,
+                        DB_PARTITION_MAX_OPEN)
+    from db.database import DB_FILE, PARTITION_DIR
+    if DB_PARTITION_MODE == 'none':
+        print("Set DB_PARTITION_MODE=guild or DB_PARTITION_MODE=bucket first")
+        return 2
+
+    router = PartitionRouter(PARTITION_DIR, DB_PARTITION_MODE, DB_PARTITION_BUCKETS,
+                             DB_PARTITION_MAX_OPEN)
+    src = sqlite3.connect(DB_FILE)
+    try:
+        report = split_database(src, router, purge='--purge' in argv)
+    finally:
+        router.close()
+        src.close()
+    print(f"Split {DATABASE_URL}: {report['messages']} message(s) from {report['guilds']} guild(s) "
+          f"into {report['partitions']} partition(s) under {PARTITION_DIR}, "
+          f"{report['mismatches']} mismatch(es)")
+    return 1 if report['mismatches'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
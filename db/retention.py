@@ -0,0 +1,134 @@
+"""
+Retention / compaction for stored_messages.
+
+Deletes messages older than each channel's retention period in small
+batches (each its own short write transaction), optionally archives them
+to gzipped JSONL first, then hands freed pages back to the filesystem
+with incremental vacuum.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from config import (RETENTION_DAYS, RETENTION_BATCH_SIZE, RETENTION_VACUUM_PAGES,
+                    RETENTION_ARCHIVE_DIR)
+from db.aio import (get_retention_policies, get_stored_channels, delete_messages_before,
+                    get_db_size, incremental_vacuum)
+from db.snowflake import snowflake_from_ms
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_retention_days(policies: dict, guild_id: int, channel_id: int,
+                           default: int = RETENTION_DAYS) -> int:
+    """Channel override beats server override beats the global default"""
+    if (guild_id, channel_id) in policies:
+        return policies[(guild_id, channel_id)]
+    if (guild_id, 0) in policies:
+        return policies[(guild_id, 0)]
+    return default
+
+
+class MessageArchiver:
+    """Appends expired rows to {archive_dir}/{guild}/{channel}/{date}.jsonl.gz"""
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+        self.rows_archived = 0
+
+    def __call__(self, rows: list):
+        first = rows[0]
+        folder = os.path.join(self.archive_dir, str(first['guild_id']), str(first['channel_id']))
+        os.makedirs(folder, exist_ok=True)
+        day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        path = os.path.join(folder, f"{day}.jsonl.gz")
+        # each call adds a gzip member, which gzip readers concatenate transparently
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+                for row in rows:
+                    gz.write((json.dumps(row, default=str) + "\n").encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        self.rows_archived += len(rows)
+
+
+class RetentionWorker:
+    """One retention pass over every channel with stored messages"""
+
+    def __init__(self, default_days: int = RETENTION_DAYS, batch_size: int = RETENTION_BATCH_SIZE,
+                 vacuum_pages: int = RETENTION_VACUUM_PAGES, archive_dir: str = RETENTION_ARCHIVE_DIR,
+                 pause: float = 0.05):
+        self.default_days = default_days
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.archiver = MessageArchiver(archive_dir) if archive_dir else None
+        # gap between batches so other writers get the lock
+        self.pause = pause
+        self.last_report = None
+
+    async def run_once(self) -> dict:
+        """Delete expired messages everywhere, vacuum, and report what was reclaimed"""
+        started = time.perf_counter()
+        size_before = await get_db_size()
+        policies = await get_retention_policies()
+        now_ms = time.time() * 1000
+
+        deleted = 0
+        channels = 0
+        for channel in await get_stored_channels():
+            days = resolve_retention_days(policies, channel['guild_id'], channel['channel_id'],
+                                          self.default_days)
+            if days <= 0:
+                continue
+            before_id = snowflake_from_ms(now_ms - days * 86400000)
+            removed = await self.purge_channel(channel['guild_id'], channel['channel_id'], before_id)
+            if removed:
+                channels += 1
+                deleted += removed
+
+        # free pages only go back to the OS in small steps
+        vacuumed = 0
+        while self.vacuum_pages > 0:
+            free = (await get_db_size())['free_bytes']
+            if not free:
+                break
+            await incremental_vacuum(self.vacuum_pages)
+            vacuumed += 1
+            if (await get_db_size())['free_bytes'] >= free:
+                break
+            await asyncio.sleep(self.pause)
+
+        size_after = await get_db_size()
+        report = {
+            'deleted': deleted,
+            'channels': channels,
+            # every deleted row was archived first (the archiver may run in the writer process)
+            'archived': deleted if self.archiver else 0,
+            'bytes_before': size_before['bytes'],
+            'bytes_after': size_after['bytes'],
+            'bytes_reclaimed': size_before['bytes'] - size_after['bytes'],
+            'free_bytes': size_after['free_bytes'],
+            'vacuum_steps': vacuumed,
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+        self.last_report = report
+        if deleted or report['bytes_reclaimed']:
+            logger.info(f"Retention: deleted {deleted} message(s) from {channels} channel(s), "
+                        f"reclaimed {report['bytes_reclaimed'] / 1024:.0f} KiB "
+                        f"({report['bytes_after'] / 1048576:.1f} MiB now) in {report['seconds']}s")
+        return report
+
+    async def purge_channel(self, guild_id: int, channel_id: int, before_id: int) -> int:
+        """Delete a channel's expired messages one small batch at a time"""
+        total = 0
+        while True:
+            removed = await delete_messages_before(guild_id, channel_id, before_id,
+                                                   self.batch_size, self.archiver)
+            total += removed
+            if removed < self.batch_size:
+                return total
+            await asyncio.sleep(self.pause)
@@ -0,0 +1,105 @@
+"""
+Full-text search index over stored messages.
+
+message_fts is a contentless FTS5 table whose rowid is the message id, so
+the text isn't stored twice. Triggers can't keep it in sync because
+content may be compressed by the time it reaches stored_messages, so
+store_messages indexes new rows itself and retention removes them with
+FTS5's 'delete' command (which needs the original text). This module
+builds the index from scratch for existing data (migration v8 does it
+once):
+
+    python -m db.search rebuild
+"""
+
+import re
+import sys
+import logging
+import sqlite3
+from db.codec import decode_content
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 5000
+
+FTS_TABLE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+        content,
+        content = '',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+'''
+
+WORD_RE = re.compile(r"\w+")
+
+
+def match_query(text: str) -> str:
+    """User text -> FTS5 query: every word has to match, as a prefix ('deploy' finds 'deployed').
+
+    Words are quoted so nothing the user types is parsed as FTS5 syntax.
+    None if there's nothing searchable in the text.
+    """
+    words = WORD_RE.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def index_messages(conn: sqlite3.Connection, rows: list):
+    """Add (message_id, text) pairs to the index (caller commits)"""
+    conn.executemany('INSERT INTO message_fts (rowid, content) VALUES (?, ?)',
+                     [(message_id, text) for message_id, text in rows if text])
+
+
+def unindex_messages(conn: sqlite3.Connection, rows: list):
+    """Remove (message_id, text) pairs from the index, text must be what was indexed (caller commits)"""
+    conn.executemany("INSERT INTO message_fts (message_fts, rowid, content) VALUES ('delete', ?, ?)",
+                     [(message_id, text) for message_id, text in rows if text])
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> int:
+    """Reindex every stored message in committed batches, returns how many were indexed.
+
+    Starts by emptying the index, so rerunning it after a crash is safe.
+    """
+    conn.execute("INSERT INTO message_fts (message_fts) VALUES ('delete-all')")
+    conn.commit()
+
+    indexed = 0
+    last_key = (-1, -1)
+    while True:
+        rows = conn.execute('''
+            SELECT channel_id, message_id, content, content_codec FROM stored_messages
+            WHERE (channel_id, message_id) > (?, ?)
+            ORDER BY channel_id, message_id
+            LIMIT ?
+        ''', (*last_key, REBUILD_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        index_messages(conn, [(r[1], decode_content(r[2], r[3])) for r in rows])
+        conn.commit()
+        indexed += len(rows)
+        last_key = (rows[-1][0], rows[-1][1])
+        if indexed % (REBUILD_BATCH_SIZE * 20) == 0:
+            logger.info(f"Indexed {indexed} message(s) for search")
+
+    # merge the per-batch segments so queries don't have to walk all of them
+    conn.execute("INSERT INTO message_fts (message_fts) VALUES ('optimize')")
+    conn.commit()
+    logger.info(f"Built the search index over {indexed} message(s)")
+    return indexed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("usage: python -m db.search rebuild")
+        sys.exit(1)
+
+    from db.database import init_db, _each_storage
+    init_db()
+    # the catalog plus every partition file, if storage is partitioned
+    for manager in _each_storage():
+        with manager.writer() as conn:
+            rebuild_search_index(conn)
+    print("Search index rebuilt!")
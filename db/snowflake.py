@@ -0,0 +1,19 @@
+"""
+Discord snowflake helpers.
+
+A snowflake's top 42 bits are milliseconds since the Discord epoch, so a
+time cutoff can be turned into a message_id cutoff and used directly
+against the (channel_id, message_id) primary key.
+"""
+
+DISCORD_EPOCH_MS = 1420070400000
+
+
+def snowflake_from_ms(epoch_ms: int) -> int:
+    """Smallest snowflake that could have been created at epoch_ms"""
+    return max(int(epoch_ms) - DISCORD_EPOCH_MS, 0) << 22
+
+
+def snowflake_to_ms(snowflake: int) -> int:
+    """Creation time of a snowflake in epoch milliseconds"""
+    return (int(snowflake) >> 22) + DISCORD_EPOCH_MS
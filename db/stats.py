@@ -0,0 +1,84 @@
+"""
+Materialized message statistics.
+
+channel_stats (one row per channel) and the hourly buckets in
+channel_hourly_stats / channel_hourly_authors are kept up to date by
+triggers on stored_messages (see migration v4). This module rebuilds
+them from scratch for existing data:
+
+    python -m db.stats rebuild
+"""
+
+import sys
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# stored_messages.ts is epoch ms, buckets are keyed by epoch hour
+MS_PER_HOUR = 3600000
+
+
+def rebuild_channel_stats(conn: sqlite3.Connection, channel_id: int) -> int:
+    """Recompute every stats row for one channel in a single transaction, returns its message count"""
+    conn.execute('BEGIN')
+    try:
+        conn.execute('DELETE FROM channel_stats WHERE channel_id = ?', (channel_id,))
+        conn.execute('DELETE FROM channel_hourly_stats WHERE channel_id = ?', (channel_id,))
+        conn.execute('DELETE FROM channel_hourly_authors WHERE channel_id = ?', (channel_id,))
+        conn.execute('''
+            INSERT INTO channel_stats (channel_id, guild_id, message_count, last_ts, last_message_id)
+            SELECT channel_id, MAX(guild_id), COUNT(*), MAX(ts), MAX(message_id)
+            FROM stored_messages WHERE channel_id = ?
+            GROUP BY channel_id
+        ''', (channel_id,))
+        conn.execute(f'''
+            INSERT INTO channel_hourly_stats (channel_id, hour, guild_id, message_count, first_ts, last_ts)
+            SELECT channel_id, ts / {MS_PER_HOUR}, MAX(guild_id), COUNT(*), MIN(ts), MAX(ts)
+            FROM stored_messages WHERE channel_id = ?
+            GROUP BY channel_id, ts / {MS_PER_HOUR}
+        ''', (channel_id,))
+        conn.execute(f'''
+            INSERT INTO channel_hourly_authors (channel_id, hour, author_id, message_count)
+            SELECT channel_id, ts / {MS_PER_HOUR}, author_id, COUNT(*)
+            FROM stored_messages WHERE channel_id = ?
+            GROUP BY channel_id, ts / {MS_PER_HOUR}, author_id
+        ''', (channel_id,))
+        count = conn.execute('SELECT message_count FROM channel_stats WHERE channel_id = ?',
+                             (channel_id,)).fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return count[0] if count else 0
+
+
+def rebuild_all_stats(conn: sqlite3.Connection) -> int:
+    """Rebuild stats for every channel that has stored messages, one channel per transaction"""
+    channels = [row[0] for row in conn.execute('SELECT DISTINCT channel_id FROM stored_messages')]
+    total = 0
+    for channel_id in channels:
+        total += rebuild_channel_stats(conn, channel_id)
+    # channels whose messages are all gone shouldn't keep stale counters around
+    conn.execute('''
+        DELETE FROM channel_stats
+        WHERE channel_id NOT IN (SELECT DISTINCT channel_id FROM stored_messages)
+    ''')
+    conn.commit()
+    logger.info(f"Rebuilt stats for {len(channels)} channel(s), {total} message(s)")
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("usage: python -m db.stats rebuild")
+        sys.exit(1)
+
+    from db.database import init_db, _each_storage
+    init_db()
+    # the catalog plus every partition file, if storage is partitioned
+    for manager in _each_storage():
+        with manager.writer() as conn:
+            rebuild_all_stats(conn)
+    print("Stats rebuilt!")
@@ -0,0 +1,192 @@
+"""
+Shared writer process for cluster mode.
+
+Every bot process in a cluster reads sqlite directly (WAL allows that
+across processes) but sends its writes here over a local
+multiprocessing.connection channel. This process owns the only writer
+connection, so sqlite never sees two processes writing at once.
+
+    python -m db.writer --address /tmp/discordsum-writer.sock
+
+The auth key comes from DB_WRITER_AUTHKEY (cluster.py generates one).
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+
+logger = logging.getLogger(__name__)
+
+# db.database functions a client may call, everything else is refused
+WRITE_FUNCTIONS = (
+    'add_monitored_channel',
+    'remove_monitored_channel',
+    'store_message',
+    'store_messages',
+    'save_summary',
+    'save_block_summaries',
+    'prune_block_summaries',
+    'rewind_block_progress',
+    'set_retention_policy',
+    'set_channel_digest',
+    'mark_digest_sent',
+    'set_bot_state',
+    'delete_messages_before',
+    'incremental_vacuum',
+)
+
+
+def parse_address(address: str):
+    """'host:port' -> (host, port), anything else is a unix socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and os.sep not in address:
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+class RemoteWriter:
+    """Client side: call write functions in the writer process (blocking, one call at a time)"""
+
+    def __init__(self, address: str, authkey: str):
+        self.address = parse_address(address)
+        self.authkey = authkey.encode()
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._conn = Client(self.address, authkey=self.authkey)
+        logger.info(f"Connected to DB writer at {self.address}")
+
+    def call(self, name: str, *args, **kwargs):
+        with self._lock:
+            request = (name, args, kwargs)
+            try:
+                if self._conn is None:
+                    self._connect()
+                self._conn.send(request)
+            except (OSError, EOFError):
+                # the writer restarted, nothing was sent, so one retry is safe
+                self.close()
+                self._connect()
+                self._conn.send(request)
+            try:
+                ok, result = self._conn.recv()
+            except (OSError, EOFError):
+                self.close()
+                raise ConnectionError(f"DB writer went away during {name}")
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except OSError:
+                pass
+            self._conn = None
+
+
+class WriterServer:
+    """Accepts client connections and runs their write calls, one thread per client"""
+
+    def __init__(self, address: str, authkey: str):
+        self.address = parse_address(address)
+        self.authkey = authkey.encode()
+        self.stats = {'clients': 0, 'calls': 0, 'errors': 0, 'waiting': 0, 'max_waiting': 0}
+        self._stats_lock = threading.Lock()
+
+    def _track(self, key: str, delta: int = 1):
+        with self._stats_lock:
+            self.stats[key] += delta
+            if key == 'waiting' and self.stats['waiting'] > self.stats['max_waiting']:
+                self.stats['max_waiting'] = self.stats['waiting']
+
+    def serve_forever(self, stats_interval: float = 300):
+        from db import database
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)  # stale socket from a previous run
+        version = database.init_db()
+        functions = {name: getattr(database, name) for name in WRITE_FUNCTIONS}
+
+        threading.Thread(target=self._log_stats, args=(stats_interval,), daemon=True,
+                         name="db-writer-stats").start()
+        # SIGTERM from the launcher unwinds through the finally below
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            with Listener(self.address, authkey=self.authkey) as listener:
+                logger.info(f"DB writer listening on {self.address} (schema v{version})")
+                while True:
+                    try:
+                        conn = listener.accept()
+                    except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                        # bad auth key or a client that hung up mid-handshake
+                        logger.warning(f"Rejected writer client: {e}")
+                        continue
+                    threading.Thread(target=self._handle, args=(conn, functions), daemon=True,
+                                     name="db-writer-client").start()
+        finally:
+            # waits for an in-flight write, then checkpoints the WAL
+            database.close_db()
+            logger.info("DB writer stopped")
+
+    def _handle(self, conn, functions: dict):
+        self._track('clients')
+        try:
+            while True:
+                try:
+                    name, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                func = functions.get(name)
+                self._track('calls')
+                self._track('waiting')
+                try:
+                    if func is None:
+                        raise ValueError(f"{name} is not a write function")
+                    reply = (True, func(*args, **kwargs))
+                except Exception as e:
+                    self._track('errors')
+                    reply = (False, e)
+                finally:
+                    self._track('waiting', -1)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    # the result didn't pickle, send something the client can raise
+                    conn.send((False, RuntimeError(f"{name} failed: {reply[1]!r}")))
+        finally:
+            self._track('clients', -1)
+            conn.close()
+
+    def _log_stats(self, interval: float):
+        while True:
+            time.sleep(interval)
+            s = self.stats
+            logger.info(f"DB writer: clients={s['clients']} calls={s['calls']} errors={s['errors']} "
+                        f"waiting={s['waiting']} max_waiting={s['max_waiting']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared sqlite writer for cluster mode")
+    parser.add_argument('--address', required=True, help="host:port or unix socket path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - writer - %(name)s - %(levelname)s - %(message)s')
+    authkey = os.getenv('DB_WRITER_AUTHKEY')
+    if not authkey:
+        sys.exit("DB_WRITER_AUTHKEY is required")
+    WriterServer(args.address, authkey).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# summarization helpers used by the cogs
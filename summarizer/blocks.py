@@ -0,0 +1,158 @@
+"""
+Rolling block summaries (the "map" half of map-reduce summarization).
+
+A background pass summarizes each monitored channel in fixed time blocks
+as they close and stores the results. /summarize then only has to merge
+the stored block summaries for the window plus the raw messages that
+aren't covered by a block yet.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from config import (BLOCK_MINUTES, BLOCK_LOOKBACK_HOURS, BLOCK_GRACE_SECONDS,
+                    BLOCK_MAX_PER_TICK)
+from db.aio import (get_monitored_channels, get_messages_between, get_block_progress,
+                    get_block_summaries, save_block_summaries, prune_block_summaries)
+
+logger = logging.getLogger(__name__)
+
+
+def to_utc(ts: int) -> datetime:
+    """Epoch seconds -> aware UTC datetime"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+class BlockSummarizer:
+    """Summarizes closed time blocks per channel and assembles windows from them"""
+
+    def __init__(self, generate, format_lines, block_minutes: int = BLOCK_MINUTES,
+                 lookback_hours: int = BLOCK_LOOKBACK_HOURS,
+                 grace_seconds: int = BLOCK_GRACE_SECONDS,
+                 max_per_tick: int = BLOCK_MAX_PER_TICK):
+        # generate(prompt) -> str, raises on failure
+        self.generate = generate
+        # format_lines(messages) -> transcript text
+        self.format_lines = format_lines
+        self.block_seconds = block_minutes * 60
+        self.lookback_seconds = lookback_hours * 3600
+        self.grace_seconds = grace_seconds
+        self.max_per_tick = max_per_tick
+        self.stats = {'blocks_summarized': 0, 'empty_blocks': 0, 'failures': 0}
+
+    def floor(self, ts: float) -> int:
+        """Start of the block containing ts"""
+        return int(ts) // self.block_seconds * self.block_seconds
+
+    def ceil(self, ts: float) -> int:
+        """Start of the first block that begins at or after ts"""
+        return -(-int(ts) // self.block_seconds) * self.block_seconds
+
+    def block_prompt(self, transcript: str, channel_name: str, block_start: int) -> str:
+        """Prompt for a single block (plain notes, the fun voice is added at merge time)"""
+        start = to_utc(block_start).strftime('%H:%M')
+        end = to_utc(block_start + self.block_seconds).strftime('%H:%M')
+        return f"""Summarize this slice of the #{channel_name} Discord channel ({start}-{end} UTC) as short factual bullet notes.
+Keep who said what, topics, decisions, announcements, jokes and drama. No intro or outro, just the notes.
+
+{transcript}
+"""
+
+    async def run_once(self, now: float = None) -> int:
+        """Summarize newly closed blocks for every monitored channel, returns blocks written"""
+        now = time.time() if now is None else now
+        written = 0
+        for channel in await get_monitored_channels():
+            try:
+                written += await self.process_channel(channel, now)
+            except Exception as e:
+                self.stats['failures'] += 1
+                logger.error(f"Block summarization failed for channel {channel['channel_id']}: {e}")
+
+        # blocks older than the longest window we'd ever merge are dead weight
+        await prune_block_summaries(self.floor(now - self.lookback_seconds))
+        return written
+
+    async def process_channel(self, channel: dict, now: float) -> int:
+        """Summarize the closed blocks of one channel that haven't been processed yet"""
+        guild_id = channel['guild_id']
+        channel_id = channel['channel_id']
+        channel_name = channel['channel_name']
+
+        # don't close a block until ingestion has had time to flush it
+        closed_until = self.floor(now - self.grace_seconds)
+        oldest = self.floor(now - self.lookback_seconds)
+        progress = await get_block_progress(guild_id, channel_id)
+        cursor = max(progress or oldest, oldest)
+
+        blocks = []
+        while cursor + self.block_seconds <= closed_until and len(blocks) < self.max_per_tick:
+            block_end = cursor + self.block_seconds
+            messages = await get_messages_between(guild_id, channel_id, to_utc(cursor), to_utc(block_end))
+            if messages:
+                prompt = self.block_prompt(self.format_lines(messages), channel_name, cursor)
+                try:
+                    summary = await self.generate(prompt)
+                except Exception as e:
+                    # stop here and retry this block next tick
+                    self.stats['failures'] += 1
+                    logger.warning(f"Could not summarize block {cursor} of #{channel_name}: {e}")
+                    break
+                blocks.append({
+                    'block_start': cursor,
+                    'block_end': block_end,
+                    'summary': summary,
+                    'message_count': len(messages),
+                })
+                self.stats['blocks_summarized'] += 1
+            else:
+                self.stats['empty_blocks'] += 1
+            cursor = block_end
+
+        if progress is None or cursor > progress:
+            await save_block_summaries(guild_id, channel_id, blocks, cursor)
+        if blocks:
+            logger.info(f"Summarized {len(blocks)} block(s) for #{channel_name}")
+        return len(blocks)
+
+    async def build_window(self, guild_id: int, channel_id: int, hours: int,
+                           now: float = None) -> dict:
+        """Split a window into stored block summaries plus uncovered head/tail messages.
+
+        Returns None when no full block inside the window has been processed
+        yet, in which case the caller should summarize the raw messages.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - hours * 3600
+        first_block = self.ceil(cutoff)
+        progress = await get_block_progress(guild_id, channel_id)
+        if progress is None or progress <= first_block:
+            return None
+
+        covered_until = min(progress, self.floor(now))
+        blocks = await get_block_summaries(guild_id, channel_id, first_block, covered_until)
+        head = await get_messages_between(guild_id, channel_id, to_utc(cutoff), to_utc(first_block))
+        tail = await get_messages_between(guild_id, channel_id, to_utc(covered_until), to_utc(now + 1))
+        return {
+            'blocks': blocks,
+            'head': head,
+            'tail': tail,
+            'message_count': sum(b['message_count'] for b in blocks) + len(head) + len(tail),
+        }
+
+    def format_window(self, window: dict, channel_name: str, hours: int) -> str:
+        """Render a window from build_window as prompt text"""
+        parts = [f"Discord Channel: #{channel_name}\n"
+                 f"Activity from the last {hours} hour(s) ({window['message_count']} total messages)\n"]
+        if window['head']:
+            parts.append("Messages at the start of the window:\n" + self.format_lines(window['head']))
+        if window['blocks']:
+            notes = []
+            for b in window['blocks']:
+                start = to_utc(b['block_start']).strftime('%H:%M')
+                end = to_utc(b['block_end']).strftime('%H:%M')
+                notes.append(f"[{start}-{end}, {b['message_count']} messages]\n{b['summary'].strip()}\n")
+            parts.append("Notes for each part of the window, in order:\n" + "\n".join(notes))
+        if window['tail']:
+            parts.append("Most recent messages:\n" + self.format_lines(window['tail']))
+        return "\n".join(parts)
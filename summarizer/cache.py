@@ -0,0 +1,88 @@
+"""
+Summary result cache.
+
+Entries are keyed by (guild_id, channel_id, hours, newest message_id in
+the window). A new message changes the watermark, so the old entry simply
+stops matching. Entries also expire after a TTL, since messages age out
+of the window even when nothing new arrives.
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from config import SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL, SUMMARY_CACHE_PERSIST
+from db.aio import get_saved_summary, save_summary
+from utils.metrics import SUMMARY_CACHE
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryCache:
+    """In-memory LRU + TTL cache with optional write-through to the summaries table"""
+
+    def __init__(self, max_entries: int = SUMMARY_CACHE_SIZE,
+                 ttl: float = SUMMARY_CACHE_TTL, persist: bool = SUMMARY_CACHE_PERSIST):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist = persist
+        self._entries = OrderedDict()  # (guild, channel, hours) -> entry dict
+        self.stats = {'hits': 0, 'persisted_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, guild_id: int, channel_id: int, hours: int, watermark: int) -> dict:
+        """Return {'summary', 'message_count'} for this window/watermark or None"""
+        window = (guild_id, channel_id, hours)
+        entry = self._entries.get(window)
+        if entry is not None:
+            if entry['watermark'] == watermark and time.time() - entry['created_at'] < self.ttl:
+                self._entries.move_to_end(window)
+                self.stats['hits'] += 1
+                SUMMARY_CACHE.inc('hit')
+                return entry
+            # new messages arrived or it expired, either way it's dead
+            del self._entries[window]
+
+        if self.persist:
+            row = await get_saved_summary(guild_id, channel_id, hours, watermark, self.ttl)
+            if row:
+                self.stats['persisted_hits'] += 1
+                SUMMARY_CACHE.inc('persisted_hit')
+                entry = self._remember(window, watermark, row['summary'],
+                                       row['message_count'], row['created_at'])
+                return entry
+
+        self.stats['misses'] += 1
+        SUMMARY_CACHE.inc('miss')
+        return None
+
+    async def put(self, guild_id: int, channel_id: int, hours: int, watermark: int,
+                  summary: str, message_count: int):
+        """Cache a freshly generated summary"""
+        entry = self._remember((guild_id, channel_id, hours), watermark, summary,
+                               message_count, time.time())
+        if self.persist:
+            await save_summary(guild_id, channel_id, hours, watermark, summary, message_count)
+        return entry
+
+    def _remember(self, window: tuple, watermark: int, summary: str,
+                  message_count: int, created_at: float) -> dict:
+        entry = {
+            'watermark': watermark,
+            'summary': summary,
+            'message_count': message_count,
+            'created_at': created_at,
+        }
+        self._entries[window] = entry
+        self._entries.move_to_end(window)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+        return entry
+
+    def hit_ratio(self) -> float:
+        """Fraction of lookups served from memory or the table"""
+        hits = self.stats['hits'] + self.stats['persisted_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
@@ -0,0 +1,76 @@
+"""
+Request coalescing: identical requests that arrive while one is already
+running share its result instead of starting their own. Callers can also
+follow the shared call's progress (a streamed summary) as it's published.
+"""
+
+import asyncio
+import logging
+from utils.metrics import COALESCED
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Share one in-flight task between callers that ask for the same key"""
+
+    def __init__(self):
+        self._inflight = {}  # key -> [task, waiter count, progress listeners, latest progress]
+        self.stats = {'started': 0, 'coalesced': 0}
+
+    def inflight(self) -> int:
+        """Number of distinct keys currently running"""
+        return len(self._inflight)
+
+    async def publish(self, key, value):
+        """Pass progress for key's running call to every caller following it"""
+        entry = self._inflight.get(key)
+        if entry is None:
+            return
+        entry[3] = value
+        for listener in list(entry[2]):
+            await listener(value)
+
+    async def run(self, key, factory, on_progress=None):
+        """Await factory() for key, or join the call already running for it.
+
+        on_progress is awaited with whatever the call publish()es for key,
+        a late joiner gets the latest value straight away. If every caller
+        waiting on a key is cancelled the shared task is cancelled too,
+        otherwise it keeps running for the rest.
+        """
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.create_task(factory())
+            entry = [task, 0, [], None]
+            self._inflight[key] = entry
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+            self.stats['started'] += 1
+            COALESCED.inc('started')
+        else:
+            self.stats['coalesced'] += 1
+            COALESCED.inc('coalesced')
+            logger.debug(f"Coalesced request for {key} ({entry[1]} already waiting)")
+
+        task = entry[0]
+        entry[1] += 1
+        if on_progress is not None:
+            entry[2].append(on_progress)
+            if entry[3] is not None:
+                await on_progress(entry[3])
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                # last one out turns off the lights
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+            if on_progress is not None:
+                entry[2].remove(on_progress)
+
+    def _forget(self, key, task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
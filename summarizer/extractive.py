@@ -0,0 +1,152 @@
+"""
+Local extractive ranking, no model calls.
+
+Picks the most informative messages of a window so the prompt only
+carries those. Messages are scored by TF-IDF similarity to the window's
+centroid (what the chat was mostly about, a cheap stand-in for
+TextRank's O(n^2) similarity graph), boosted by how many replies they
+got. Pure noise ("lol", emoji spam) and near-identical repeats are
+dropped before ranking. The same ranking builds the highlight list we
+fall back on when Gemini fails.
+"""
+
+import math
+import re
+from collections import Counter
+
+WORD_RE = re.compile(r"[a-z0-9][a-z0-9']+")
+URL_RE = re.compile(r"https?://\S+")
+REPEAT_RE = re.compile(r"(.)\1{2,}")
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+# only worth keeping alongside something else
+FILLER = frozenset("""
+lol lmao lmfao rofl xd xdd haha hahaha hehe ok okay kk yes yeah yea yep ya no nah nope same true fr
+real bruh omg wow nice ty thx thanks np idk ikr gg rip oof ong lowkey yo hi hey sup gm gn
+""".split())
+
+STOPWORDS = frozenset("""
+a an the and or but if then so to of in on at by for with from as is are was were be been being
+it its it's this that these those i i'm im me my we our you your u ur he she they them their his her
+do does did doing have has had not just like get got go going gonna can could would should will
+what when where who how why all any some there here about up out into over than too very
+""".split()) | FILLER
+
+REPLY_WEIGHT = 0.5  # per log(1 + replies received)
+SHORT_MESSAGE_CHARS = 48
+
+
+def terms(text: str) -> list:
+    """Lowercased content words of a message"""
+    text = text.lower()
+    if "http" in text:
+        text = URL_RE.sub(" ", text)
+    return [w for w in WORD_RE.findall(text) if w not in STOPWORDS]
+
+
+def dedupe_key(text: str) -> str:
+    """Near-identical messages share a key: case, punctuation and stretched letters don't count"""
+    text = text.lower()
+    # stretched letters are a short-message thing ("nooooo"), skip the extra pass on long ones
+    if len(text) <= SHORT_MESSAGE_CHARS:
+        text = REPEAT_RE.sub(r"\1\1", text)
+    return NON_WORD_RE.sub("", text)
+
+
+def is_noise(msg: dict) -> bool:
+    """Messages with nothing to summarize (reactions, emoji only, 'lol')"""
+    if msg.get('has_attachments'):
+        return False
+    content = (msg.get('content') or "").lower()
+    if len(content) > SHORT_MESSAGE_CHARS:
+        # too long to be a few filler words, noise only if there's no word in it at all
+        return WORD_RE.search(content) is None
+    words = WORD_RE.findall(REPEAT_RE.sub(r"\1\1", content))
+    return not words or (len(words) <= 3 and all(w in FILLER for w in words))
+
+
+class NoiseFilter:
+    """Streaming filter for noise and repeats (keeps the first one seen)"""
+
+    def __init__(self):
+        self.seen = set()
+        self.dropped = 0
+
+    def keep(self, msg: dict) -> bool:
+        if is_noise(msg):
+            self.dropped += 1
+            return False
+        key = dedupe_key(msg.get('content') or "")
+        if key in self.seen:
+            self.dropped += 1
+            return False
+        # attachments with no text all have an empty key, they aren't repeats
+        if key:
+            self.seen.add(key)
+        return True
+
+
+def score_messages(messages: list) -> list:
+    """Informativeness score per message, same order as messages"""
+    docs = [Counter(terms(m.get('content') or "")) for m in messages]
+    df = Counter()
+    for doc in docs:
+        df.update(doc.keys())
+    n = len(docs)
+    idf = {t: math.log((1 + n) / (1 + c)) + 1 for t, c in df.items()}
+
+    vectors = []
+    centroid = Counter()
+    for doc in docs:
+        vec = {t: (1 + math.log(c)) * idf[t] for t, c in doc.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        vec = {t: v / norm for t, v in vec.items()}
+        vectors.append(vec)
+        centroid.update(vec)
+    centroid_norm = math.sqrt(sum(v * v for v in centroid.values())) or 1.0
+
+    replies = Counter(m['reply_to'] for m in messages if m.get('reply_to'))
+    scores = []
+    for msg, vec in zip(messages, vectors):
+        similarity = sum(v * centroid.get(t, 0.0) for t, v in vec.items()) / centroid_norm
+        # a little credit for saying something at all, so rare topics aren't zero
+        score = similarity + 0.05 * min(len(vec), 20) / 20
+        score *= 1 + REPLY_WEIGHT * math.log1p(replies.get(msg.get('message_id'), 0))
+        if msg.get('has_attachments'):
+            score += 0.02
+        scores.append(score)
+    return scores
+
+
+def select_messages(messages: list, budget_tokens: int, cost) -> list:
+    """Best-scoring messages whose cost(msg) in tokens fits the budget, in their original order"""
+    scores = score_messages(messages)
+    costs = [cost(msg) for msg in messages]
+    # by score per sqrt(token): long messages still win, but can't crowd out everything else
+    order = sorted(range(len(messages)), key=lambda i: scores[i] / math.sqrt(costs[i]), reverse=True)
+    chosen = []
+    used = 0
+    for i in order:
+        tokens = costs[i]
+        if used + tokens > budget_tokens:
+            continue
+        chosen.append(i)
+        used += tokens
+    return [messages[i] for i in sorted(chosen)]
+
+
+def highlights(messages: list, line, top: int = 8) -> str:
+    """'What stood out' list from messages (oldest first) for when the model is down, line(msg) renders one"""
+    noise = NoiseFilter()
+    kept = [m for m in messages if noise.keep(m)]
+    if not kept:
+        return "Nothing worth mentioning got said tbh."
+
+    scores = score_messages(kept)
+    best = sorted(sorted(range(len(kept)), key=lambda i: scores[i], reverse=True)[:top])
+    lines = [f"• {line(kept[i])}" for i in best]
+
+    talkers = Counter(m['author_name'] for m in messages).most_common(3)
+    lines.append("")
+    lines.append("**Most active:** " + ", ".join(f"{name} ({count})" for name, count in talkers))
+    return "\n".join(lines)
@@ -0,0 +1,223 @@
+"""
+Token-budgeted transcript builder.
+
+Streams message rows (newest first) and renders a compact transcript:
+consecutive messages from the same author are collapsed onto one line,
+timestamps are only printed when the minute changes and very long
+messages are cut short. Noise and repeated lines are dropped first. An
+oversized window is either cut down to its most informative messages
+(extractive), cut off once the budget is used up (keeping the most
+recent part) or split into chunks for map-reduce summarization.
+"""
+
+import logging
+import time
+from datetime import datetime
+from itertools import islice
+from config import (PROMPT_TOKEN_BUDGET, PROMPT_MAX_MESSAGE_CHARS, PROMPT_OVERFLOW, PROMPT_MAX_CHUNKS,
+                    PROMPT_DROP_NOISE, PROMPT_EXTRACTIVE_TOKENS, PROMPT_EXTRACTIVE_MAX_MESSAGES)
+from db.database import iter_messages_by_timeframe, get_topic_messages
+from summarizer.extractive import NoiseFilter, select_messages, highlights
+from utils.metrics import PROMPT_BUILD_SECONDS, PROMPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token for English chat text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer round trip)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_text(msg: dict, max_chars: int) -> str:
+    """Content of one message with attachment/reply markers, truncated to max_chars"""
+    content = (msg.get('content') or "[No text content]").strip() or "[No text content]"
+    if len(content) > max_chars:
+        content = content[:max_chars].rstrip() + "…"
+    if msg.get('has_attachments'):
+        content += " [Has attachments]"
+    if msg.get('reply_to'):
+        content = f"[Reply] {content}"
+    return content
+
+
+def minute_of(timestamp) -> str:
+    """HH:MM for a stored timestamp (falls back to the raw value)"""
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime('%H:%M')
+    try:
+        return datetime.fromisoformat(str(timestamp)).strftime('%H:%M')
+    except ValueError:
+        return str(timestamp)
+
+
+class PromptBuilder:
+    """Builds budgeted, compacted transcripts from message rows"""
+
+    def __init__(self, budget_tokens: int = PROMPT_TOKEN_BUDGET,
+                 max_message_chars: int = PROMPT_MAX_MESSAGE_CHARS,
+                 max_chunks: int = PROMPT_MAX_CHUNKS,
+                 drop_noise: bool = PROMPT_DROP_NOISE,
+                 extractive_tokens: int = PROMPT_EXTRACTIVE_TOKENS,
+                 extractive_max_messages: int = PROMPT_EXTRACTIVE_MAX_MESSAGES):
+        self.budget_tokens = budget_tokens
+        self.max_message_chars = max_message_chars
+        self.max_chunks = max_chunks
+        self.drop_noise = drop_noise
+        self.extractive_tokens = min(extractive_tokens, budget_tokens)
+        self.extractive_max_messages = extractive_max_messages
+
+    def line_cost(self, msg: dict) -> int:
+        """Estimated tokens one message adds to the transcript"""
+        # author + timestamp cost a few tokens per line, roughly
+        return estimate_tokens(message_text(msg, self.max_message_chars)) + 4
+
+    def build(self, rows_newest_first, overflow: str = PROMPT_OVERFLOW) -> dict:
+        """Consume rows (newest first) and return the transcript chunks plus usage stats.
+
+        overflow='truncate' keeps only what fits in one budget, 'mapreduce'
+        keeps up to max_chunks budgets worth of chunks and 'extractive'
+        keeps the highest ranked messages that fit extractive_tokens.
+        Chunks come back in chronological order.
+        """
+        started = time.perf_counter()
+        chunks = []          # each chunk is a list of (minute, author, text), newest first
+        current = []
+        current_tokens = 0
+        used = dropped = 0
+        dropped_tokens = 0
+        full = False
+
+        noise = None
+        if self.drop_noise:
+            noise = NoiseFilter()
+            rows_newest_first = (msg for msg in rows_newest_first if noise.keep(msg))
+        if overflow == 'extractive':
+            rows_newest_first, dropped, dropped_tokens = self.extract(rows_newest_first)
+            overflow = 'truncate'  # whatever is left fits
+
+        for msg in rows_newest_first:
+            if full:
+                # out of budget, just keep count of what we're leaving out
+                dropped += 1
+                dropped_tokens += estimate_tokens(msg.get('content') or "")
+                continue
+
+            text = message_text(msg, self.max_message_chars)
+            author = msg['author_name']
+            cost = estimate_tokens(text) + 4
+
+            if current and current_tokens + cost > self.budget_tokens:
+                chunks.append(current)
+                current, current_tokens = [], 0
+                if overflow != 'mapreduce' or len(chunks) >= self.max_chunks:
+                    full = True
+                    dropped += 1
+                    dropped_tokens += cost
+                    continue
+
+            current.append((minute_of(msg['timestamp']), author, text))
+            current_tokens += cost
+            used += 1
+
+        if current:
+            chunks.append(current)
+        if noise is not None:
+            dropped += noise.dropped
+
+        # rendered oldest chunk first, oldest line first
+        rendered = [self.render(list(reversed(chunk))) for chunk in reversed(chunks)]
+        tokens_used = sum(estimate_tokens(c) for c in rendered)
+        # includes reading the rows when they are streamed from sqlite
+        PROMPT_BUILD_SECONDS.observe(time.perf_counter() - started)
+        PROMPT_TOKENS.observe(tokens_used)
+        return {
+            'chunks': rendered,
+            'messages_used': used,
+            'messages_dropped': dropped,
+            'tokens_used': tokens_used,
+            'tokens_dropped': dropped_tokens,
+        }
+
+    def extract(self, rows_newest_first) -> tuple:
+        """Cut rows down to the best ones that fit extractive_tokens, returns (rows, dropped, dropped tokens)"""
+        rows_newest_first = iter(rows_newest_first)
+        rows = list(islice(rows_newest_first, self.extractive_max_messages))
+        # too far back to even rank
+        dropped_tokens = 0
+        dropped = 0
+        for msg in rows_newest_first:
+            dropped += 1
+            dropped_tokens += estimate_tokens(msg.get('content') or "")
+
+        if sum(self.line_cost(msg) for msg in rows) <= self.extractive_tokens:
+            return rows, dropped, dropped_tokens
+        selected = select_messages(rows, self.extractive_tokens, self.line_cost)
+        kept = {id(msg) for msg in selected}
+        for msg in rows:
+            if id(msg) not in kept:
+                dropped += 1
+                dropped_tokens += estimate_tokens(msg.get('content') or "")
+        logger.debug(f"Extractive ranking kept {len(selected)} of {len(rows)} message(s)")
+        return selected, dropped, dropped_tokens
+
+    def render(self, lines: list) -> str:
+        """Render (minute, author, text) tuples, oldest first, as compact transcript text"""
+        out = []
+        last_minute = None
+        author, group, group_minute = None, [], None
+
+        def emit():
+            nonlocal last_minute
+            # only print the time when it moved on since the last line
+            prefix = f"[{group_minute}] " if group_minute != last_minute else ""
+            last_minute = group_minute
+            out.append(f"{prefix}{author}: {' | '.join(group)}")
+
+        for minute, name, text in lines:
+            if name == author:
+                # same person still talking, glue it onto their line
+                group.append(text)
+                continue
+            if group:
+                emit()
+            author, group, group_minute = name, [text], minute
+        if group:
+            emit()
+
+        return "\n".join(out) + ("\n" if out else "")
+
+    def build_from_db(self, guild_id: int, channel_id: int, hours: int,
+                      overflow: str = PROMPT_OVERFLOW) -> dict:
+        """Stream a channel window straight out of sqlite (call from a DB thread)"""
+        return self.build(iter_messages_by_timeframe(guild_id, channel_id, hours, newest_first=True),
+                          overflow)
+
+    def build_topic_from_db(self, guild_id: int, channel_id: int, hours: int, topic: str,
+                            overflow: str = PROMPT_OVERFLOW) -> dict:
+        """Like build_from_db but only messages matching topic and their reply context"""
+        return self.build(get_topic_messages(guild_id, channel_id, hours, topic, self.extractive_max_messages),
+                          overflow)
+
+    def highlights_from_db(self, guild_id: int, channel_id: int, hours: int, top: int) -> str:
+        """Extractive 'what stood out' list for a channel window (call from a DB thread)"""
+        rows = list(islice(iter_messages_by_timeframe(guild_id, channel_id, hours, newest_first=True),
+                           self.extractive_max_messages))
+        rows.reverse()
+        return highlights(
+            rows,
+            lambda msg: f"**{msg['author_name']}** ({minute_of(msg['timestamp'])}): {message_text(msg, 200)}",
+            top
+        )
+
+
+def chunk_prompt(transcript: str, channel_name: str, part: int, parts: int) -> str:
+    """Map-step prompt for one chunk of an oversized window"""
+    return f"""This is part {part} of {parts} of a #{channel_name} Discord chat transcript, in time order.
+Summarize it as short factual bullet notes. Keep who said what, topics, decisions, announcements, jokes and drama.
+No intro or outro, just the notes.
+
+{transcript}
+"""
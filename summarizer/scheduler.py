@@ -0,0 +1,186 @@
+"""
+Fair scheduling of summary generation across guilds.
+
+Every summary that has to be generated (cache misses, not joiners of an
+identical request) asks the SummaryScheduler for a slot first:
+
+- at most `concurrency` generations run at once, the rest queue up
+- each guild has a token bucket (`per_hour` summaries, bursts of
+  `burst`), a guild that's out of tokens is told when to come back
+  instead of queueing, so one guild can't burn the Gemini quota
+- the queue is weighted fair across guilds: a job's virtual finish tag
+  is max(virtual time, the guild's previous tag) + cost / weight and the
+  smallest tag runs next, so a guild with 20 jobs queued gets its second
+  one after every other guild's first
+
+Waiters are told their position in line whenever it changes.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from utils.metrics import SUMMARY_QUEUE_SECONDS, SUMMARY_QUOTA_REJECTIONS
+from utils.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# forget idle guilds' buckets/tags once we track more than this many
+PRUNE_ABOVE = 1000
+
+
+class QuotaExceeded(Exception):
+    """A guild asked for more summaries than its quota allows"""
+
+    def __init__(self, guild_id: int, retry_after: float):
+        super().__init__(f"Guild {guild_id} is out of summary quota, retry in {retry_after:.0f}s")
+        self.guild_id = guild_id
+        self.retry_after = retry_after
+
+
+class Job:
+    """One queued generation, ordered by finish tag then arrival"""
+
+    __slots__ = ('tag', 'seq', 'guild_id', 'start', 'moved', 'started')
+
+    def __init__(self, tag: float, seq: int, guild_id: int, start: float):
+        self.tag = tag
+        self.seq = seq
+        self.guild_id = guild_id
+        self.start = start  # virtual start tag
+        self.moved = asyncio.Event()  # set when the job's position changed or it started
+        self.started = False
+
+    def __lt__(self, other):
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class SummaryScheduler:
+    """Global concurrency cap + per-guild quotas + weighted fair queuing"""
+
+    def __init__(self, concurrency: int, per_hour: float = 0, burst: int = 1, weights: dict = None):
+        self.concurrency = max(1, concurrency)
+        self.per_hour = per_hour  # 0 = no quota
+        self.burst = burst
+        self.weights = weights or {}  # guild_id -> weight, default 1
+        self.running = 0
+        self._queue = []  # heap of Jobs
+        self._virtual_time = 0.0
+        self._tags = {}  # guild_id -> finish tag of its last queued job
+        self._buckets = {}  # guild_id -> RateLimiter
+        self._seq = itertools.count()
+        self.stats = {'started': 0, 'queued': 0, 'rejected': 0}
+
+    def depth(self) -> int:
+        """Jobs waiting for a slot"""
+        return len(self._queue)
+
+    def check_quota(self, guild_id: int):
+        """Take one of the guild's tokens, raises QuotaExceeded if it has none left"""
+        if self.per_hour <= 0:
+            return
+        bucket = self._buckets.get(guild_id)
+        if bucket is None:
+            if len(self._buckets) > PRUNE_ABOVE:
+                self._buckets = {g: b for g, b in self._buckets.items() if not b.idle()}
+            bucket = self._buckets[guild_id] = RateLimiter(self.per_hour / 3600, self.burst)
+        retry_after = bucket.try_acquire()
+        if retry_after:
+            self.stats['rejected'] += 1
+            SUMMARY_QUOTA_REJECTIONS.inc()
+            raise QuotaExceeded(guild_id, retry_after)
+
+    def refund(self, guild_id: int):
+        """Give back the token check_quota took, for a generation that failed"""
+        bucket = self._buckets.get(guild_id)
+        if bucket is not None:
+            bucket.refund()
+
+    def position(self, job: Job) -> int:
+        """1-based place in line (1 = next to start)"""
+        return 1 + sum(1 for other in self._queue if other < job)
+
+    async def run(self, guild_id: int, factory, cost: float = 1.0, on_position=None, charge: bool = True):
+        """Await factory() once the guild's turn comes up.
+
+        charge=False skips the quota (scheduled work the guild didn't ask
+        for right now). on_position(n) is awaited with the place in line
+        while queued and with 0 once it starts, only if it had to queue.
+        The charge is refunded when factory() never runs or raises.
+        """
+        if charge:
+            self.check_quota(guild_id)
+
+        queued_at = time.perf_counter()
+        job = self._enqueue(guild_id, cost)
+        self._dispatch()
+        if not job.started:
+            self.stats['queued'] += 1
+        try:
+            shown = None
+            while not job.started:
+                job.moved.clear()
+                if on_position is not None:
+                    position = self.position(job)
+                    if position != shown:
+                        shown = position
+                        await on_position(position)
+                if not job.started:
+                    await job.moved.wait()
+        except BaseException:
+            if charge:
+                self.refund(guild_id)
+            if job.started:
+                self._release()
+            else:
+                # gave up waiting, everyone behind it moves up
+                self._queue.remove(job)
+                heapq.heapify(self._queue)
+                self._notify()
+            raise
+        SUMMARY_QUEUE_SECONDS.observe(time.perf_counter() - queued_at)
+
+        try:
+            if shown is not None:
+                await on_position(0)
+            return await factory()
+        except BaseException:
+            if charge:
+                self.refund(guild_id)
+            raise
+        finally:
+            self._release()
+
+    def _enqueue(self, guild_id: int, cost: float) -> Job:
+        if len(self._tags) > PRUNE_ABOVE:
+            # a tag at or behind virtual time changes nothing, the guild starts from virtual time anyway
+            self._tags = {g: t for g, t in self._tags.items() if t > self._virtual_time}
+        start = max(self._virtual_time, self._tags.get(guild_id, 0.0))
+        tag = start + cost / self.weights.get(guild_id, 1.0)
+        self._tags[guild_id] = tag
+        job = Job(tag, next(self._seq), guild_id, start)
+        heapq.heappush(self._queue, job)
+        return job
+
+    def _dispatch(self):
+        """Start queued jobs while slots are free and tell everyone still waiting they moved"""
+        moved = False
+        while self._queue and self.running < self.concurrency:
+            job = heapq.heappop(self._queue)
+            moved = True
+            self._virtual_time = max(self._virtual_time, job.start)
+            self.running += 1
+            self.stats['started'] += 1
+            job.started = True
+            job.moved.set()
+        if moved:
+            self._notify()
+
+    def _notify(self):
+        for job in self._queue:
+            job.moved.set()
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
@@ -0,0 +1 @@
+# small helpers shared by the bot, cogs and db layer
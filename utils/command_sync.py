@@ -0,0 +1,53 @@
+"""
+Change-aware slash command sync.
+
+Syncing the global command tree costs a few API round trips, is rate
+limited, and used to run on every on_ready (reconnects included). The
+tree is hashed instead and only synced when the hash differs from the
+one stored after the last successful sync.
+"""
+
+import hashlib
+import json
+import logging
+from db.aio import get_bot_state, set_bot_state
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = 'command_tree_hash'
+
+
+def command_payload(command, tree) -> dict:
+    """The JSON Discord gets for a command"""
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        # discord.py < 2.4 doesn't take the tree
+        return command.to_dict()
+
+
+def tree_hash(tree) -> str:
+    """Stable hash of every global command as it would be synced"""
+    payload = sorted((command_payload(c, tree) for c in tree.get_commands()),
+                     key=lambda c: (c['name'], c.get('type', 1)))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def sync_commands(tree, mode: str = 'auto') -> bool:
+    """Sync the global command tree unless it's unchanged, returns whether it synced.
+
+    mode 'always' syncs regardless of the hash, 'never' doesn't sync at all.
+    """
+    if mode == 'never':
+        logger.info("Command sync turned off, skipping it")
+        return False
+
+    digest = tree_hash(tree)
+    if mode != 'always' and await get_bot_state(STATE_KEY) == digest:
+        logger.info("Command tree unchanged since the last sync, skipping it")
+        return False
+
+    synced = await tree.sync()
+    await set_bot_state(STATE_KEY, digest)
+    logger.info(f"Synced {len(synced)} command(s)")
+    return True
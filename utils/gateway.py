@@ -0,0 +1,52 @@
+"""
+Gateway / cache settings for commands.Bot.
+
+The bot never reads discord.py's message or member caches (messages go
+straight to sqlite and slash commands carry their own user/permission
+data), so the 'lean' profile turns them off and only subscribes to the
+events we handle. Memory per guild is what limits how many guilds one
+process can hold.
+"""
+
+import discord
+from config import GATEWAY_PROFILE, MESSAGE_CACHE_SIZE
+
+PROFILES = ('default', 'lean')
+
+
+def build_intents(profile: str = GATEWAY_PROFILE) -> discord.Intents:
+    """Intents for a profile"""
+    if profile == 'lean':
+        # guilds for the channel cache, guild_messages + message_content for on_message
+        intents = discord.Intents.none()
+    else:
+        intents = discord.Intents.default()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return intents
+
+
+def gateway_options(profile: str = GATEWAY_PROFILE, message_cache: int = MESSAGE_CACHE_SIZE) -> dict:
+    """Keyword arguments for commands.Bot for a profile"""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown gateway profile {profile!r}, expected one of {PROFILES}")
+
+    options = {'intents': build_intents(profile)}
+    if profile == 'lean':
+        options.update(
+            # None turns the message cache off entirely
+            max_messages=message_cache if message_cache > 0 else None,
+            member_cache_flags=discord.MemberCacheFlags.none(),
+            chunk_guilds_at_startup=False,
+        )
+    return options
+
+
+def describe(options: dict) -> str:
+    """One-line summary of gateway options for the startup log"""
+    intents = [name for name, enabled in options['intents'] if enabled]
+    cache = options.get('max_messages', 1000)
+    return (f"intents={','.join(intents)} message_cache={cache or 'off'} "
+            f"member_cache={'off' if 'member_cache_flags' in options else 'default'} "
+            f"chunking={'off' if options.get('chunk_guilds_at_startup') is False else 'default'}")
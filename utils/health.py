@@ -0,0 +1,63 @@
+"""
+Per-shard health.
+
+Combines what discord.py knows about each shard (latency, closed,
+rate limited) with our own connect/disconnect/resume counters and the
+ingestion queue depth of the messages that came in on that shard.
+"""
+
+import math
+import time
+from collections import defaultdict
+
+
+class ShardHealth:
+    """Tracks gateway events per shard and builds health snapshots"""
+
+    def __init__(self, bot, ingestor):
+        self.bot = bot
+        self.ingestor = ingestor
+        self.events = defaultdict(lambda: {'connects': 0, 'disconnects': 0, 'resumes': 0,
+                                           'last_event': None, 'last_event_at': None})
+
+    def record(self, shard_id: int, event: str):
+        """Count a gateway event ('connect', 'disconnect', 'resume', 'ready')"""
+        info = self.events[shard_id]
+        if event in ('connect', 'disconnect', 'resume'):
+            info[event + 's'] += 1
+        info['last_event'] = event
+        info['last_event_at'] = time.time()
+
+    def snapshot(self) -> list:
+        """One dict per shard this process runs"""
+        guilds = defaultdict(int)
+        for guild in self.bot.guilds:
+            guilds[guild.shard_id] += 1
+
+        shards = []
+        for shard_id, shard in sorted(self.bot.shards.items()):
+            latency = shard.latency
+            info = self.events[shard_id]
+            shards.append({
+                'shard_id': shard_id,
+                'up': not shard.is_closed(),
+                'latency_ms': round(latency * 1000) if math.isfinite(latency) else None,
+                'rate_limited': shard.is_ws_ratelimited(),
+                'guilds': guilds[shard_id],
+                'queue_depth': self.ingestor.depth_for(shard_id),
+                'connects': info['connects'],
+                'disconnects': info['disconnects'],
+                'resumes': info['resumes'],
+                'last_event': info['last_event'],
+                'last_event_age': round(time.time() - info['last_event_at']) if info['last_event_at'] else None,
+            })
+        return shards
+
+
+def format_shard(shard: dict) -> str:
+    """One log/embed line for a shard snapshot"""
+    latency = f"{shard['latency_ms']}ms" if shard['latency_ms'] is not None else "n/a"
+    return (f"shard {shard['shard_id']}: {'up' if shard['up'] else 'DOWN'} latency={latency} "
+            f"guilds={shard['guilds']} queue={shard['queue_depth']} "
+            f"disconnects={shard['disconnects']} resumes={shard['resumes']}"
+            f"{' RATE LIMITED' if shard['rate_limited'] else ''}")
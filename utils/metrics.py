@@ -0,0 +1,254 @@
+"""
+In-process metrics: counters, histograms and callback gauges.
+
+Cheap enough to leave on (an observation is a bisect and two additions
+under an uncontended lock). Everything registers itself in REGISTRY,
+which render() turns into Prometheus text for the /metrics endpoint and
+/botstats reads directly.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# seconds, from a fast sqlite read up to a slow Gemini call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+# prompt/response sizes in tokens
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# name -> metric, registering a name again replaces the old one (cog reloads)
+REGISTRY = {}
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def samples(self) -> list:
+        """(suffix, {label: value}, number) tuples for the text format"""
+        raise NotImplementedError
+
+    def label_dict(self, values: tuple) -> dict:
+        return dict(zip(self.labels, values))
+
+
+class Counter(Metric):
+    """Monotonic count, optionally split by label values"""
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self.values.get(label_values, 0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def samples(self) -> list:
+        return [('_total', self.label_dict(k), v) for k, v in sorted(self.values.items())]
+
+
+class Histogram(Metric):
+    """Bucketed distribution (Prometheus style, cumulative on export)"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [per-bucket counts (+inf last), sum, count]
+
+    def observe(self, value: float, *label_values):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Observe how long the block took, in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def count(self, *label_values) -> int:
+        series = self.series.get(label_values)
+        return series[2] if series else 0
+
+    def sum(self, *label_values) -> float:
+        series = self.series.get(label_values)
+        return series[1] if series else 0.0
+
+    def quantile(self, q: float, *label_values) -> float:
+        """Estimate a quantile from the buckets (linear inside a bucket), None if empty"""
+        series = self.series.get(label_values)
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        seen = 0
+        for i, n in enumerate(series[0]):
+            if seen + n >= rank and n:
+                low = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return low  # beyond the last bucket, all we know is the lower bound
+                return low + (self.buckets[i] - low) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def samples(self) -> list:
+        out = []
+        for key, (counts, total, count) in sorted(self.series.items()):
+            labels = self.label_dict(key)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                out.append(('_bucket', {**labels, 'le': le}, cumulative))
+            out.append(('_sum', labels, total))
+            out.append(('_count', labels, count))
+        return out
+
+
+class Gauge(Metric):
+    """Current value read from a callback at scrape time.
+
+    fn() returns a number, or {label values tuple: number} for labelled gauges.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, fn, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def read(self) -> dict:
+        try:
+            value = self.fn()
+        except Exception as e:
+            logger.debug(f"Gauge {self.name} failed: {e}")
+            return {}
+        return value if isinstance(value, dict) else {(): value}
+
+    def samples(self) -> list:
+        return [('', self.label_dict(k), v) for k, v in sorted(self.read().items())]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in list(REGISTRY.values()):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        with metric._lock:
+            samples = metric.samples()
+        for suffix, labels, value in samples:
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{metric.name}{suffix}{{{label_text}}} {value}" if label_text
+                         else f"{metric.name}{suffix} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves render() at /metrics over HTTP (aiohttp comes with discord.py)"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> bool:
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(body=render().encode(),
+                                headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            # a busy port shouldn't take the bot down with it
+            logger.error(f"Could not serve metrics on {self.host}:{self.port}: {e}")
+            await self.stop()
+            return False
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        return True
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# --- the bot's metrics ---
+
+INGEST_MESSAGES = Counter('discordsum_ingest_messages', "Messages through the ingest queue by result",
+                          ('result',))
+INGEST_FLUSH_SECONDS = Histogram('discordsum_ingest_flush_seconds', "Time to write one ingest batch")
+INGEST_BATCH_MESSAGES = Histogram('discordsum_ingest_batch_size', "Messages per ingest batch",
+                                 buckets=SIZE_BUCKETS)
+ON_MESSAGE_SECONDS = Histogram('discordsum_on_message_seconds',
+                               "Time on_message spends on a message (includes backpressure waits)")
+
+DB_CALL_SECONDS = Histogram('discordsum_db_call_seconds', "db.database call run time by function",
+                            ('function',))
+DB_WAIT_SECONDS = Histogram('discordsum_db_wait_seconds', "Time a DB call waited for a thread",
+                            ('pool',))
+DB_ERRORS = Counter('discordsum_db_errors', "db.database calls that raised", ('function',))
+
+PROMPT_BUILD_SECONDS = Histogram('discordsum_prompt_build_seconds', "Time to build a transcript")
+PROMPT_TOKENS = Histogram('discordsum_prompt_tokens', "Estimated transcript tokens per build",
+                          buckets=TOKEN_BUCKETS)
+
+LLM_SECONDS = Histogram('discordsum_llm_seconds', "Gemini call latency by outcome", ('outcome',))
+LLM_FIRST_TOKEN_SECONDS = Histogram('discordsum_llm_first_token_seconds',
+                                   "Time until a streamed Gemini call returned its first text")
+LLM_TOKENS = Histogram('discordsum_llm_tokens', "Gemini tokens per call", ('direction',),
+                       buckets=TOKEN_BUCKETS)
+
+SUMMARY_CACHE = Counter('discordsum_summary_cache', "Summary cache lookups by result", ('result',))
+COALESCED = Counter('discordsum_summarize_requests', "Summary requests, started vs joined in flight",
+                    ('result',))
+SUMMARY_FIRST_CONTENT_SECONDS = Histogram('discordsum_summary_first_content_seconds',
+                                         "Time from /summarize until the user saw summary text")
+SUMMARY_QUEUE_SECONDS = Histogram('discordsum_summary_queue_seconds',
+                                  "Time a summary waited for a generation slot")
+SUMMARY_QUOTA_REJECTIONS = Counter('discordsum_summary_quota_rejections',
+                                   "Summaries refused because the guild was out of quota")
+
+LOOP_LAG_SECONDS = Histogram('discordsum_loop_lag_seconds', "How late the event loop heartbeat ran")
+LOOP_STALLS = Counter('discordsum_loop_stalls', "Times the event loop was blocked past the stall threshold")
@@ -0,0 +1,99 @@
+"""
+On-demand profiling of the event loop thread.
+
+'sampling' grabs the loop thread's stack every few milliseconds from
+another thread and counts where it is. Overhead is tiny, so it's safe on
+a busy bot, and time spent idle in select() is reported separately.
+'cprofile' runs cProfile on the loop thread, which is exact per call but
+slows the bot down while it runs.
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+_active = False
+
+
+def frame_name(frame) -> str:
+    """'dir/file.py:42 function' for a frame"""
+    code = frame.f_code
+    path = os.sep.join(code.co_filename.split(os.sep)[-2:])
+    return f"{path}:{code.co_firstlineno} {code.co_name}"
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005) -> dict:
+    """Sample one thread's stack for `seconds` (call from a different thread)"""
+    own = Counter()    # innermost frame
+    total = Counter()  # anywhere on the stack
+    samples = idle = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            samples += 1
+            # the loop waiting for I/O (the selector's poll is C, so select() is the top Python frame)
+            if frame.f_code.co_name == 'select' and frame.f_code.co_filename.endswith('selectors.py'):
+                idle += 1
+            else:
+                own[frame_name(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    name = frame_name(frame)
+                    if name not in seen:
+                        seen.add(name)
+                        total[name] += 1
+                    frame = frame.f_back
+        del frame
+        time.sleep(interval)
+    return {'samples': samples, 'idle': idle, 'own': own, 'total': total}
+
+
+def format_samples(result: dict, top: int) -> str:
+    samples = result['samples'] or 1
+    lines = [f"{result['samples']} samples, {result['idle'] / samples:.0%} idle in select()",
+             "", f"{'self':>6} {'total':>6}  function"]
+    for name, count in result['own'].most_common(top):
+        lines.append(f"{count / samples:>6.1%} {result['total'][name] / samples:>6.1%}  {name}")
+    lines += ["", "Busiest on the stack (self + callees):", f"{'total':>6}  function"]
+    # the loop's own frames are under everything, they'd just fill the top of the list
+    ours = [(name, count) for name, count in result['total'].most_common()
+            if not name.startswith(('asyncio' + os.sep, 'python3'))]
+    for name, count in ours[:top]:
+        lines.append(f"{count / samples:>6.1%}  {name}")
+    return "\n".join(lines) + "\n"
+
+
+def format_cprofile(profile: cProfile.Profile, top: int) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out).strip_dirs()
+    stats.sort_stats('tottime').print_stats(top)
+    stats.sort_stats('cumulative').print_stats(top)
+    return out.getvalue()
+
+
+async def profile_loop(seconds: float, mode: str = 'sampling', top: int = 25) -> str:
+    """Profile the running event loop's thread for `seconds`, returns a text report"""
+    global _active
+    if _active:
+        raise RuntimeError("A profile is already running")
+    _active = True
+    try:
+        if mode == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+            return format_cprofile(profile, top)
+        result = await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds)
+        return format_samples(result, top)
+    finally:
+        _active = False
@@ -0,0 +1,65 @@
+"""
+Async token bucket.
+
+Shared by everything that pages through the Discord API in bulk so the
+combined request rate stays under a fixed budget, however many tasks are
+pulling from it.
+"""
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Allows `rate` acquisitions per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0  # total seconds spent waiting, for stats
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it (waiters are served in order)"""
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= 1
+
+    def try_acquire(self) -> float:
+        """Take a token without waiting, returns 0 or the seconds until one is available (taking nothing)"""
+        self._refill()
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        self._tokens -= 1
+        return 0.0
+
+    def refund(self):
+        """Give back a token that was taken for work that didn't happen"""
+        self._refill()
+        self._tokens = min(self.burst, self._tokens + 1)
+
+    def idle(self) -> bool:
+        """True when the bucket has refilled completely (nobody used it lately)"""
+        self._refill()
+        return self._tokens >= self.burst
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
@@ -0,0 +1,60 @@
+"""
+Startup phase timing.
+
+StartupTimer records how long each step of bringing the bot up took
+(imports, schema, cogs, login, gateway ready), logs them as one line once
+the bot is ready and exports them as a gauge, so a deploy restart that
+got slow shows which phase is to blame.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from utils.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Seconds per named startup phase, in the order they ran"""
+
+    def __init__(self, started: float = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = {}
+        self.reported = False
+        self._open = {}  # name -> when a start()ed phase began
+        Gauge('discordsum_startup_seconds', "How long each startup phase took",
+              lambda: {(name,): seconds for name, seconds in self.phases.items()}, ('phase',))
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = seconds
+
+    def since_start(self, name: str):
+        """Record the time from process start until now as phase `name`"""
+        self.record(name, time.perf_counter() - self.started)
+
+    def start(self, name: str):
+        """Begin a phase that ends somewhere else (a later callback calls stop())"""
+        self._open[name] = time.perf_counter()
+
+    def stop(self, name: str):
+        """End a start()ed phase, does nothing if it isn't running"""
+        started = self._open.pop(name, None)
+        if started is not None:
+            self.record(name, time.perf_counter() - started)
+
+    @contextmanager
+    def phase(self, name: str):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def report(self):
+        """Log the total and every phase, once"""
+        if self.reported:
+            return
+        self.reported = True
+        parts = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        logger.info(f"Started in {time.perf_counter() - self.started:.2f}s ({parts})")
@@ -0,0 +1,124 @@
+"""
+Progressive embed delivery for long generations.
+
+EmbedStream shows text as it grows by editing the messages it already
+sent. Edits are throttled to one render per interval (Discord allows
+about 5 edits per 5s per channel), with the newest text always winning,
+and update() never waits on Discord so it can't slow the model stream
+down. Text past the 4096 character embed description limit continues in
+a new message.
+"""
+
+import asyncio
+import logging
+import time
+import discord
+
+logger = logging.getLogger(__name__)
+
+EMBED_DESCRIPTION_LIMIT = 4096
+
+
+def split_pages(text: str, limit: int = EMBED_DESCRIPTION_LIMIT) -> list:
+    """Split text into pages of at most `limit` characters, at a line break when there is one.
+
+    Page boundaries only depend on the text before them, so they stay put
+    while more text is appended.
+    """
+    pages = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        pages.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    pages.append(text)
+    return pages
+
+
+class EmbedStream:
+    """Sends and edits embeds as text arrives, one message per page"""
+
+    def __init__(self, send, title: str, color: discord.Color = None, interval: float = 1.0):
+        self.send = send  # coroutine function embed -> message that can be .edit()ed
+        self.title = title
+        self.color = color or discord.Color.blue()
+        self.interval = interval
+        self.messages = []
+        self.edits = 0
+        self.first_shown = None  # perf_counter when the first text went out
+        self._shown = []  # what each message currently shows
+        self._latest = ""
+        self._last_render = 0.0
+        self._flusher = None
+        self._flusher_rendering = False  # past its sleep, sending/editing
+        self._lock = asyncio.Lock()
+
+    def make_embed(self, text: str, page: int, pages: int, done: bool, fields: tuple, footer: str) -> discord.Embed:
+        title = self.title if pages == 1 else f"{self.title} ({page + 1}/{pages})"
+        embed = discord.Embed(title=title, description=text, color=self.color)
+        last = page == pages - 1
+        if not done:
+            if last:
+                embed.set_footer(text="✍️ Still writing...")
+        elif last:
+            for name, value in fields:
+                embed.add_field(name=name, value=value, inline=True)
+            if footer:
+                embed.set_footer(text=footer)
+        return embed
+
+    async def update(self, text: str):
+        """Show `text` (the whole text so far) soon, without waiting for Discord"""
+        self._latest = text
+        if text.strip() and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def finish(self, text: str, fields: tuple = (), footer: str = None):
+        """Render the final text with its fields and footer on the last page"""
+        if self._flusher is not None:
+            if self._flusher_rendering:
+                # cancelling mid-send would lose the message being posted, let it land first
+                await asyncio.wait([self._flusher])
+            else:
+                self._flusher.cancel()
+            self._flusher = None
+        self._latest = text
+        await self._render(done=True, fields=fields, footer=footer)
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(max(0.0, self._last_render + self.interval - time.monotonic()))
+            self._flusher_rendering = True
+            await self._render(done=False)
+        except discord.HTTPException as e:
+            # the final render will try again
+            logger.warning(f"Could not update streamed message: {e}")
+        except Exception as e:
+            logger.error(f"Streamed message update failed: {e}", exc_info=True)
+        finally:
+            self._flusher_rendering = False
+            self._flusher = None
+
+    async def _render(self, done: bool, fields: tuple = (), footer: str = None):
+        async with self._lock:
+            pages = split_pages(self._latest)
+            for i, page in enumerate(pages):
+                state = (page, len(pages), done)
+                if i < len(self._shown) and self._shown[i] == state:
+                    continue
+                embed = self.make_embed(page, i, len(pages), done, fields, footer)
+                if i < len(self.messages):
+                    await self.messages[i].edit(embed=embed)
+                    self.edits += 1
+                else:
+                    self.messages.append(await self.send(embed))
+                    self._shown.append(None)
+                    if self.first_shown is None:
+                        self.first_shown = time.perf_counter()
+                self._shown[i] = state
+            # the final text can be shorter than what was streamed (an error replacing a partial answer)
+            while done and len(self.messages) > len(pages):
+                self._shown.pop()
+                await self.messages.pop().delete()
+            self._last_render = time.monotonic()
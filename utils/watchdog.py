@@ -0,0 +1,91 @@
+"""
+Event loop lag watchdog.
+
+A heartbeat coroutine sleeps for a short interval and records how late
+it woke up (that's the loop lag). A separate thread watches the
+heartbeat, and when it stops for longer than the stall threshold it
+grabs the loop thread's current stack, which is the sync call that's
+blocking everything. The stack is logged right away, and the total stall
+time is logged once the loop gets going again.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from config import LOOP_LAG_INTERVAL, LOOP_STALL_THRESHOLD
+from utils.metrics import LOOP_LAG_SECONDS, LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    """Measures event loop lag and captures the stack of whatever blocks it"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_STALL_THRESHOLD,
+                 keep: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        # recent stalls, newest last: {'at', 'blocked', 'duration', 'stack'}
+        self.stalls = deque(maxlen=keep)
+        self.max_lag = 0.0
+        self._current = None  # stall the watcher caught that hasn't ended yet
+        self._last_beat = None
+        self._loop_thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        """Start the heartbeat on the running loop and the watcher thread"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, daemon=True, name="loop-watchdog")
+        self._thread.start()
+        logger.info(f"Loop watchdog started (interval={self.interval}s, stall threshold={self.threshold}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _beat(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - before - self.interval)
+            self._last_beat = now
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+            with self._lock:
+                stall, self._current = self._current, None
+            if stall is not None:
+                stall['duration'] = lag
+                logger.warning(f"Event loop was blocked for {lag:.2f}s "
+                               f"(stack captured after {stall['blocked']:.2f}s, see above)")
+
+    def _watch(self):
+        while not self._stop.wait(self.interval / 2):
+            blocked = time.perf_counter() - self._last_beat - self.interval
+            if blocked < self.threshold or self._current is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(loop thread not found)\n"
+            stall = {'at': time.time(), 'blocked': blocked, 'duration': None, 'stack': stack}
+            with self._lock:
+                self._current = stall
+                self.stalls.append(stall)
+            LOOP_STALLS.inc()
+            logger.warning(f"Event loop blocked for {blocked:.2f}s so far, it's stuck in:\n{stack}")